@@ -0,0 +1,256 @@
+"""
+A synthetic feed farm, with Slack and SMTP stand-ins, for benchmarking.
+
+The farm serves generated RSS and Atom feeds over HTTP at
+``/feeds/<n>.xml``, with a configurable size, number of entries, latency
+and error rate.  Feeds have an ``ETag`` and ``Last-Modified``, and answer
+conditional requests with ``304 Not Modified``.
+
+The same web server answers Slack's ``chat.postMessage`` at
+``/api/chat.postMessage``, and there's a minimal SMTP server which accepts
+and discards everything.  Both count what they receive.
+"""
+
+import asyncio
+import hashlib
+import random
+import time
+from email.utils import formatdate
+
+from aiohttp import web
+
+LOREM = (
+    "We are investigating elevated error rates for API requests in the "
+    "us-east-1 region. Customers may see increased latency or failed "
+    "requests. <b>Update:</b> a fix has been identified and is being "
+    "rolled out. <a href=\"https://status.example.com\">More details</a>. "
+)
+
+
+class FarmConfig:
+    """
+    What the farm serves.
+
+    Args:
+        feeds (int):          number of feeds
+        entries (int):        entries per feed
+        size (int):           approximate size of each entry's description, in bytes
+        latency (float):      delay before each response, in seconds
+        error_rate (float):   fraction of feeds which answer with a 500
+        atom_rate (float):    fraction of feeds which are Atom, not RSS
+        new_entries (int):    entries per feed published in the last hour,
+                              which are new to a fresh bot
+        not_modified (bool):  answer conditional requests with a 304
+        seed (int):           random seed, so runs are repeatable
+    """
+
+    def __init__(self, feeds=1000, entries=20, size=500, latency=0.0, error_rate=0.0,
+                 atom_rate=0.2, new_entries=1, not_modified=True, seed=1):
+        self.feeds = feeds
+        self.entries = entries
+        self.size = size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.atom_rate = atom_rate
+        self.new_entries = new_entries
+        self.not_modified = not_modified
+        self.seed = seed
+
+
+def _description(rng, size):
+    text = LOREM * (size // len(LOREM) + 1)
+    start = rng.randrange(len(LOREM))
+    return text[start:start + size]
+
+
+def make_feed(n, cfg, now=None):
+    """
+    Generate feed ``n``.
+
+    Returns:
+        tuple: ``(content_type, body)``
+    """
+    rng = random.Random(cfg.seed * 1000003 + n)
+    now = now or time.time()
+    atom = rng.random() < cfg.atom_rate
+
+    items = []
+    for i in range(cfg.entries):
+        if i < cfg.new_entries:
+            published = now - rng.randrange(60, 3600)
+        else:
+            # well before anything a fresh bot looks at
+            published = now - 3 * 86400 - i * 3600
+        title = f"Incident {n}-{i}: {rng.choice(('Investigating', 'Monitoring', 'Resolved'))} API errors"
+        items.append((title, _description(rng, cfg.size), published, f'https://status.example.com/{n}/{i}'))
+
+    if atom:
+        entries = ''.join(
+            f"<entry><title>{title}</title><id>{link}</id><link href=\"{link}\"/>"
+            f"<updated>{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(published))}</updated>"
+            f"<published>{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(published))}</published>"
+            f"<summary type=\"html\"><![CDATA[{desc}]]></summary></entry>"
+            for title, desc, published, link in items)
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom">'
+            f'<title>Feed {n}</title><id>urn:feed:{n}</id>'
+            f"<updated>{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now))}</updated>"
+            f'{entries}</feed>')
+        return 'application/atom+xml', body
+
+    entries = ''.join(
+        f"<item><title>{title}</title><link>{link}</link><guid>{link}</guid>"
+        f"<pubDate>{formatdate(published, usegmt=True)}</pubDate>"
+        f"<description><![CDATA[{desc}]]></description></item>"
+        for title, desc, published, link in items)
+    body = (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<rss version="2.0"><channel>'
+        f'<title>Feed {n}</title><link>https://status.example.com/{n}</link>'
+        f'<description>Status of system {n}</description>'
+        f'{entries}</channel></rss>')
+    return 'application/rss+xml', body
+
+
+class Farm:
+    """
+    The feed farm and stand-ins.
+
+    Args:
+        cfg (FarmConfig): what to serve
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.feeds = {}
+        self.stats = {
+            'requests':     0,
+            'not_modified': 0,
+            'errors':       0,
+            'slack':        0,
+            'smtp':         0,
+        }
+
+        rng = random.Random(cfg.seed)
+        self.failing = {n for n in range(cfg.feeds) if rng.random() < cfg.error_rate}
+        self.generated = time.time()
+        self.last_modified = formatdate(self.generated, usegmt=True)
+
+
+    def _feed(self, n):
+        if n not in self.feeds:
+            content_type, body = make_feed(n, self.cfg, self.generated)
+            body = body.encode()
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            self.feeds[n] = (content_type, body, etag)
+        return self.feeds[n]
+
+
+    async def handle_feed(self, request):
+        self.stats['requests'] += 1
+        if self.cfg.latency:
+            await asyncio.sleep(self.cfg.latency)
+
+        try:
+            n = int(request.match_info['n'])
+        except ValueError:
+            raise web.HTTPNotFound()
+        if not 0 <= n < self.cfg.feeds:
+            raise web.HTTPNotFound()
+
+        if n in self.failing:
+            self.stats['errors'] += 1
+            return web.Response(status=500, text="Internal Server Error")
+
+        content_type, body, etag = self._feed(n)
+        headers = {'ETag': etag, 'Last-Modified': self.last_modified}
+
+        if self.cfg.not_modified and (
+                request.headers.get('If-None-Match') == etag
+                or request.headers.get('If-Modified-Since') == self.last_modified):
+            self.stats['not_modified'] += 1
+            return web.Response(status=304, headers=headers)
+
+        headers['Content-Type'] = f'{content_type}; charset=utf-8'
+        return web.Response(body=body, headers=headers)
+
+
+    async def handle_slack(self, request):
+        self.stats['slack'] += 1
+        await request.read()
+        return web.json_response({'ok': True, 'channel': 'C0000000', 'ts': str(time.time())})
+
+
+    async def handle_smtp(self, reader, writer):
+        """Just enough SMTP to accept messages."""
+
+        writer.write(b'220 localhost ESMTP farm\r\n')
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command in (b'EHLO', b'HELO'):
+                    writer.write(b'250-localhost\r\n250 8BITMIME\r\n' if command == b'EHLO' else b'250 localhost\r\n')
+                elif command == b'DATA':
+                    writer.write(b'354 go ahead\r\n')
+                    await writer.drain()
+                    while (await reader.readline()) not in (b'.\r\n', b''):
+                        pass
+                    self.stats['smtp'] += 1
+                    writer.write(b'250 OK\r\n')
+                elif command == b'QUIT':
+                    writer.write(b'221 bye\r\n')
+                    break
+                else:
+                    writer.write(b'250 OK\r\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+    async def start(self, host='127.0.0.1', port=0, smtp_port=0):
+        """
+        Start serving.
+
+        Returns:
+            tuple: ``(http_port, smtp_port)``
+        """
+        app = web.Application()
+        app.router.add_get('/feeds/{n}.xml', self.handle_feed)
+        app.router.add_post('/api/chat.postMessage', self.handle_slack)
+        app.router.add_get('/stats', lambda request: web.json_response(self.stats))
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port, backlog=1024)
+        await site.start()
+        http_port = site._server.sockets[0].getsockname()[1]
+
+        self.smtp = await asyncio.start_server(self.handle_smtp, host, smtp_port)
+        smtp_port = self.smtp.sockets[0].getsockname()[1]
+        return http_port, smtp_port
+
+
+    async def stop(self):
+        self.smtp.close()
+        await self.smtp.wait_closed()
+        await self.runner.cleanup()
+
+
+def serve(cfg, conn):
+    """
+    Run the farm until told to stop, for running in its own process.  The
+    ports are sent down ``conn``, and it stops when anything is sent back.
+    """
+    async def main():
+        farm = Farm(cfg)
+        conn.send(await farm.start())
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, conn.recv)
+        conn.send(farm.stats)
+        await farm.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks for the per-entry hot path.
+
+Times the functions every feed entry goes through - date parsing, the
+event id, HTML conversion, alert level guessing and the slack attachments -
+plus config lookups and merging, over the sample status page entries in
+``corpus/`` and a large generated config.  Nothing touches the network.
+
+Save a baseline, then compare against it after making changes::
+
+    python benchmarks/micro.py --save
+    python benchmarks/micro.py --compare
+
+Times are per item, the best of several repeats.  Comparing exits non-zero
+if anything got slower by more than ``--threshold`` percent.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+from hashlib import md5
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dateutil.parser                                  # noqa: E402
+
+import rssalertbot                                      # noqa: E402
+from rssalertbot import util                            # noqa: E402
+from rssalertbot.alerts import _make_blocks             # noqa: E402
+from rssalertbot.config import Config, freeze           # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(HERE, 'corpus')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+# percent slower than the baseline which counts as a regression
+THRESHOLD = 10.0
+
+# how many times to time each benchmark
+REPEAT = 5
+
+
+def load_corpus(name):
+    with open(os.path.join(CORPUS, name + '.json')) as f:
+        return json.load(f)
+
+
+def make_config(groups=500, feeds=10):
+    """
+    A config the size of a large deployment, with per-group outputs.
+    """
+    return {
+        'timeout':  10,
+        're_alert': 24,
+        'storage':  {'file': {'path': '/var/lib/rssalertbot'}},
+        'outputs':  {
+            'log':      {'enabled': True},
+            'email':    {
+                'enabled':  True,
+                'server':   'smtp.example.com',
+                'from':     'rssalertbot@example.com',
+                'to':       ['ops@example.com'],
+                'digest':   {'enabled': False, 'window': 300},
+            },
+            'slack':    {
+                'enabled':  True,
+                'token':    'xoxb-example',
+                'channel':  '#status',
+                'levels':   {'resolved': 'good', 'outage': 'alert'},
+            },
+        },
+        'feedgroups': [
+            {
+                'name':     f'group{g}',
+                'outputs':  {
+                    'slack':    {'channel': [f'#status-{g}', '#status-all']},
+                    'email':    {'to': f'team{g}@example.com'},
+                },
+                'feeds':    [
+                    {'name': f'feed{g}-{n}', 'url': f'https://status{g}.example.com/history{n}.rss'}
+                    for n in range(feeds)
+                ],
+            }
+            for g in range(groups)
+        ],
+    }
+
+
+CONFIG_KEYS = (
+    'timeout',
+    'storage.file.path',
+    'outputs.slack.channel',
+    'outputs.email.digest.window',
+    'outputs.slack.digest.enabled',     # missing
+    'metrics.port',                     # missing
+)
+
+
+def get_benchmarks():
+    """
+    Returns:
+        list: ``(name, items, func)``, where ``func()`` runs the benchmark
+        once over ``items`` items
+    """
+    descriptions = load_corpus('descriptions')
+    dates = load_corpus('dates')
+    titles = load_corpus('titles')
+    messages = [f'{title}\n{util.strip_html(desc)}' for title, desc in zip(titles, descriptions)]
+    mrkdwn = [util.html_to_mrkdwn.__wrapped__(desc) for desc in descriptions]
+
+    data = make_config()
+    box = Config(data)
+    frozen = freeze(data)
+    global_outputs = data['outputs']
+    group_outputs = [group['outputs'] for group in data['feedgroups'][:50]]
+
+    def parse_dates():
+        for date in dates:
+            dateutil.parser.parse(date, tzinfos=rssalertbot.BOGUS_TIMEZONES)
+
+    def event_ids():
+        for title, desc in zip(titles, descriptions):
+            md5((title + desc).encode()).hexdigest()
+
+    def strip_html():
+        for desc in descriptions:
+            util.strip_html(desc)
+
+    def html_to_mrkdwn():
+        # without the conversion cache, as for an entry not seen before
+        for desc in descriptions:
+            util.html_to_mrkdwn.__wrapped__(desc)
+
+    def html_to_mrkdwn_cached():
+        for desc in descriptions:
+            util.html_to_mrkdwn(desc)
+
+    def guess_level():
+        for message in messages:
+            util.guess_level(message)
+
+    def make_blocks():
+        for title, desc in zip(titles, mrkdwn):
+            _make_blocks(None, title, desc, 'warning', 'Tue, 14 Oct 2025 17:42:10 +0000')
+
+    def config_get(cfg):
+        def config_get():
+            for key in CONFIG_KEYS:
+                cfg.get(key)
+        return config_get
+
+    def deepmerge():
+        for outputs in group_outputs:
+            util.deepmerge(global_outputs, outputs)
+
+    return [
+        ('dateutil_parse',          len(dates),         parse_dates),
+        ('event_id_md5',            len(titles),        event_ids),
+        ('strip_html',              len(descriptions),  strip_html),
+        ('html_to_mrkdwn',          len(descriptions),  html_to_mrkdwn),
+        ('html_to_mrkdwn_cached',   len(descriptions),  html_to_mrkdwn_cached),
+        ('guess_level',             len(messages),      guess_level),
+        ('make_blocks',             len(titles),        make_blocks),
+        ('config_get_box',          len(CONFIG_KEYS),   config_get(box)),
+        ('config_get_frozen',       len(CONFIG_KEYS),   config_get(frozen)),
+        ('deepmerge_outputs',       len(group_outputs), deepmerge),
+        ('deepmerge_config',        1,                  lambda: util.deepmerge(data, {'timeout': 5})),
+    ]
+
+
+def measure(func, items, repeat=REPEAT):
+    """
+    Time ``func``, returning the best time per item in seconds.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number / items
+
+
+def _format_time(seconds):
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.2f}us'
+    return f'{seconds * 1e3:.2f}ms'
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('benchmarks', nargs='*', help="only run these benchmarks")
+    parser.add_argument('--save', nargs='?', const=BASELINE, metavar='FILE',
+                        help="save the results as a baseline (default file: benchmarks/baseline.json)")
+    parser.add_argument('--compare', nargs='?', const=BASELINE, metavar='FILE',
+                        help="compare with a saved baseline (default file: benchmarks/baseline.json)")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="percent slower which counts as a regression (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="repeats of each benchmark (default: %(default)s)")
+    parser.add_argument('--list', action='store_true', help="list the benchmarks")
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    benchmarks = get_benchmarks()
+
+    if args.list:
+        for name, items, _ in benchmarks:
+            print(name)
+        return 0
+
+    if args.benchmarks:
+        unknown = set(args.benchmarks) - {name for name, _, _ in benchmarks}
+        if unknown:
+            sys.exit(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        benchmarks = [b for b in benchmarks if b[0] in args.benchmarks]
+
+    baseline = None
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print(f"No baseline at {args.compare}, run with --save first")
+            return 0
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    regressions = 0
+    for name, items, func in benchmarks:
+        seconds = results[name] = measure(func, items, args.repeat)
+        line = f'{name:<24} {_format_time(seconds):>10}'
+        before = baseline.get(name) if baseline else None
+        if before:
+            change = 100 * (seconds - before) / before
+            line += f'  {_format_time(before):>10}  {change:+6.1f}%'
+            if change > args.threshold:
+                line += '  REGRESSION'
+                regressions += 1
+        print(line)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python':   platform.python_version(),
+                'machine':  platform.machine(),
+                'saved':    time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'results':  results,
+            }, f, indent=2)
+            f.write('\n')
+        print(f"Baseline saved to {args.save}")
+
+    if regressions:
+        print(f"{regressions} regression(s) over {args.threshold:g}%")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+End-to-end throughput benchmark.
+
+Starts the synthetic feed farm (see ``farm.py``) in its own process, then
+runs the bot against it with ``main.run``, sending alerts to the farm's
+Slack and SMTP stand-ins, and reports feeds/sec, wall time, CPU time and
+peak RSS for each run.
+
+The first run sees every feed's new entries and alerts on them; later runs
+have nothing new, like most cron runs::
+
+    python benchmarks/throughput.py --feeds 2000 --latency 0.05 --runs 3
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import farm                                             # noqa: E402
+from rssalertbot import metrics                         # noqa: E402
+from rssalertbot.config import Config, freeze           # noqa: E402
+from rssalertbot.main import get_argparser, run         # noqa: E402
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--feeds', type=int, default=1000, help="number of feeds (default: %(default)s)")
+    parser.add_argument('--entries', type=int, default=20, help="entries per feed (default: %(default)s)")
+    parser.add_argument('--new-entries', type=int, default=1,
+                        help="new entries per feed on the first run (default: %(default)s)")
+    parser.add_argument('--size', type=int, default=500,
+                        help="bytes per entry description (default: %(default)s)")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="server latency in seconds (default: %(default)s)")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="fraction of feeds answering 500 (default: %(default)s)")
+    parser.add_argument('--atom-rate', type=float, default=0.2,
+                        help="fraction of feeds which are Atom (default: %(default)s)")
+    parser.add_argument('--no-304', action='store_true', help="never answer 304 Not Modified")
+    parser.add_argument('--group-size', type=int, default=50, help="feeds per group (default: %(default)s)")
+    parser.add_argument('--runs', type=int, default=2, help="number of runs (default: %(default)s)")
+    parser.add_argument('--timeout', type=int, default=30, help="feed timeout (default: %(default)s)")
+    parser.add_argument('--no-slack', action='store_true', help="don't alert to the slack stand-in")
+    parser.add_argument('--email', action='store_true', help="also alert to the SMTP stand-in")
+    parser.add_argument('--json', metavar='FILE', help="write the results as JSON to FILE")
+    parser.add_argument('-v', action='store_true', help="show the bot's logging")
+    return parser.parse_args()
+
+
+def make_config(args, state, http_port, smtp_port):
+    base = f'http://127.0.0.1:{http_port}'
+    groups = []
+    for start in range(0, args.feeds, args.group_size):
+        groups.append({
+            'name':  f'group{start // args.group_size}',
+            'feeds': [
+                {'name': f'feed{n}', 'url': f'{base}/feeds/{n}.xml'}
+                for n in range(start, min(start + args.group_size, args.feeds))
+            ],
+        })
+
+    return freeze(Config({
+        'storage':  {'file': {'path': state}},
+        'locking':  {'file': {'path': state}},
+        'timeout':  args.timeout,
+        'outputs':  {
+            'log':      {'enabled': False},
+            'slack':    {
+                'enabled':  not args.no_slack,
+                'token':    'xoxb-benchmark',
+                'channel':  '#benchmark',
+                'interval': 0,
+                'base_url': f'{base}/api/',
+            },
+            'email':    {
+                'enabled':      args.email,
+                'server':       '127.0.0.1',
+                'port':         smtp_port,
+                'connections':  4,
+                'from':         'rssalertbot@example.com',
+                'to':           'alerts@example.com',
+            },
+        },
+        'feedgroups': groups,
+    }))
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main():
+    args = get_args()
+    logging.basicConfig(level=logging.INFO)
+    if not args.v:
+        logging.disable(logging.CRITICAL)
+
+    farm_cfg = farm.FarmConfig(
+        feeds        = args.feeds,
+        entries      = args.entries,
+        size         = args.size,
+        latency      = args.latency,
+        error_rate   = args.error_rate,
+        atom_rate    = args.atom_rate,
+        new_entries  = args.new_entries,
+        not_modified = not args.no_304,
+    )
+    conn, child_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=farm.serve, args=(farm_cfg, child_conn), daemon=True)
+    server.start()
+    http_port, smtp_port = conn.recv()
+
+    state = tempfile.mkdtemp(prefix='rssalertbot-bench-')
+    report_file = os.path.join(state, 'report.json')
+    cfg = make_config(args, state, http_port, smtp_port)
+    opts = get_argparser().parse_args(['--report', report_file])
+
+    results = []
+    try:
+        for i in range(args.runs):
+            metrics.REGISTRY.clear()
+            cpu = cpu_time()
+            start = time.perf_counter()
+            asyncio.run(run(opts, cfg))
+            wall = time.perf_counter() - start
+            cpu = cpu_time() - cpu
+
+            with open(report_file) as f:
+                totals = json.load(f)['totals']
+            result = {
+                'run':          i + 1,
+                'feeds':        args.feeds,
+                'wall':         wall,
+                'feeds_sec':    args.feeds / wall,
+                'cpu':          cpu,
+                'peak_rss_mb':  resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                'totals':       totals,
+            }
+            results.append(result)
+            print(f"run {i + 1}: {args.feeds} feeds in {wall:.2f}s, {result['feeds_sec']:.0f} feeds/sec, "
+                  f"cpu {cpu:.2f}s ({100 * cpu / wall:.0f}%), peak rss {result['peak_rss_mb']:.0f}MB, "
+                  f"ok {totals['ok']}, failed {totals['failed']}, timeout {totals['timeout']}, "
+                  f"new entries {totals['entries_new']}, alerts {totals['alerts_sent']}")
+    finally:
+        conn.send('stop')
+        farm_stats = conn.recv()
+        server.join()
+        shutil.rmtree(state)
+
+    print(f"farm: {farm_stats}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'runs': results, 'farm': farm_stats}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,20 @@
 """
 Alerts
 """
+import asyncio
+import functools
 import logging
-import re
-import html2text
 import pendulum
-from mailer import Mailer, Message
+import weakref
+from email.message import EmailMessage
 
 import rssalertbot
-from .util import guess_level, strip_html
+from .classify import get_classifier
+from .digest import Digest, DIGEST_MAX_ENTRIES, all_sent
+from .outbox import current_outbox
+from .senders import get_sender
+from .senders.smtp import SMTPSender, SMTP_CONNECTIONS, SMTP_PORT
+from .util import LRUCache, html_to_mrkdwn, html_to_text
 
 log = logging.getLogger(__name__)
 
@@ -23,34 +29,115 @@ SLACK_ICONS = {
     'alert':    'fire',
 }
 
+# rendered slack attachments, shared by every channel and group
+# getting the same entry - don't modify these!
+_blocks_cache = LRUCache()
 
-def alert_email(feed, cfg, entry):
+# log adapters for each feed, made the first time it alerts
+_feed_loggers = weakref.WeakKeyDictionary()
+
+
+def feed_logger(feed):
+    """
+    Get the log adapter for alerts from this feed, adding its name and group
+    to the records.
+
+    Args:
+        feed (:py:class:`Feed`): the feed
+    """
+    logger = _feed_loggers.get(feed)
+    if logger is None:
+        logger = _feed_loggers[feed] = logging.LoggerAdapter(log, extra = {
+            'feed':  feed.name,
+            'group': feed.group['name'],
+        })
+    return logger
+
+
+async def alert_email(feed, cfg, entry):
     """Sends alert via email.
 
     Args:
         feed (:py:class:`Feed`): the feed
         cfg (dict):              output config
         entry (dict):            the feed entry
+
+    Returns:
+        bool: whether the alert was sent, or if it was added to a digest,
+        an :py:class:`asyncio.Future` resolving to whether the digest was
     """
-    logger = logging.LoggerAdapter(log, extra = {
-        'feed':  feed.name,
-        'group': feed.group['name'],
-    })
+    logger = feed_logger(feed)
 
     logger.debug("[%s]] Alerting email: %s", feed.name, entry.title)
 
-    description = strip_html(entry.description)
+    description = html_to_text(entry.description)
+
+    recipients = cfg['to']
+    if isinstance(recipients, (list, tuple)):
+        recipients = ', '.join(recipients)
+
+    # collect this into a digest, if we've been asked to - one per sender
+    # too, as groups going to the same recipients may send from their own
+    digest = _digest(cfg, ('email', cfg['server'], cfg['from'], recipients),
+                     functools.partial(_send_email_digest, cfg, recipients))
+    if digest:
+        return digest.add(f"{feed.group['name']} Alert: ({feed.name}) {entry.title}\n"
+                          f"Date: {entry.datestring}\n\n{description}")
+
+    message = _email_message(
+        cfg, recipients,
+        subject = f"{feed.group['name']} Alert: ({feed.name}) {entry.title}",
+        body    = f"Feed: {feed.name}\nDate: {entry.datestring}\n\n{description}")
 
     try:
-        smtp = Mailer(host=cfg['server'])
-        message = Message(charset="utf-8", From=cfg['from'], To=cfg['to'],
-                          Subject = f"{feed.group['name']} Alert: ({feed.name}) {entry.title}")
-        message.Body = f"Feed: {feed.name}\nDate: {entry.datestring}\n\n{description}"
-        message.header('X-Mailer', 'rssalertbot')
-        smtp.send(message)
+        await _send_email(cfg, message)
+        return True
 
     except Exception:
         logger.exception("[%s] Error sending mail", feed.name)
+        return False
+
+
+async def _send_email_digest(cfg, recipients, items):
+    """Sends a digest of alerts as one email"""
+
+    log.debug("Sending email digest of %d entries to %s", len(items), recipients)
+    message = _email_message(
+        cfg, recipients,
+        subject = f"Feed Alerts: {len(items)} new entries",
+        body    = f"\n\n{'-' * 72}\n\n".join(items))
+    await _send_email(cfg, message)
+
+
+async def _send_email(cfg, message):
+    """Sends the email, or puts it in the outbox if we have one"""
+
+    outbox = current_outbox.get()
+    if outbox:
+        await outbox.put_email(cfg, message)
+    else:
+        await smtp_sender(cfg).send(message)
+
+
+def _email_message(cfg, recipients, subject, body):
+    """Makes the email message"""
+
+    message = EmailMessage()
+    message['From'] = cfg['from']
+    message['To'] = recipients
+    message['Subject'] = subject
+    message['X-Mailer'] = 'rssalertbot'
+    message.set_content(body, charset='utf-8')
+    return message
+
+
+def smtp_sender(cfg):
+    """Gets the shared SMTP sender for this output config"""
+
+    return get_sender(SMTPSender, (cfg['server'], cfg.get('port', SMTP_PORT)),
+                      server      = cfg['server'],
+                      port        = cfg.get('port', SMTP_PORT),
+                      connections = cfg.get('connections', SMTP_CONNECTIONS))
 
 
 def alert_log(feed, cfg, entry):
@@ -62,11 +149,7 @@ def alert_log(feed, cfg, entry):
         cfg (dict):              output config
         entry (dict):            the feed entry
     """
-    logger = logging.LoggerAdapter(log, extra = {
-        'feed':  feed.name,
-        'group': feed.group['name'],
-    })
-    logger.setLevel(logging.DEBUG)
+    logger = feed_logger(feed)
 
     logger.warning("[%s] %s: %s", feed.name, entry.published, entry.title)
     if entry.description:
@@ -82,12 +165,12 @@ async def alert_slack(feed, cfg, entry, level=None):
         cfg (dict):              output config
         entry (dict):            the feed entry
         level (str):             forced level for this alert
+
+    Returns:
+        bool: whether the alert was sent to all channels, or if it was added
+        to digests, an :py:class:`asyncio.Future` resolving to whether they were
     """
-    logger = logging.LoggerAdapter(log, extra = {
-        'feed':  feed.name,
-        'group': feed.group['name'],
-    })
-    logger.setLevel(logging.DEBUG)
+    logger = feed_logger(feed)
     logger.debug("[%s] Alerting slack: %s", feed.name, entry.title)
 
     # load this here to nicely deal with pip extras
@@ -95,77 +178,151 @@ async def alert_slack(feed, cfg, entry, level=None):
         import slack
     except ImportError:
         logger.error("Python package 'slackclient' not installed!")
-        return
-
-    # attempt to match keywords in the title
-    matchstring = entry.title
-
-    # also attempt to match keywords in the body, if requested
-    if cfg.get('match_body'):
-        matchstring += entry.description
+        return False
 
     # use the provided level if we've got a force
     if cfg.get('force_level'):
         level = cfg.get('force_level')
 
-    # try to guess the level
-    elif cfg.get('levels'):
-        levels = cfg.get('levels')
-        matches = '(' + '|'.join(levels.keys()) + ')'
-        m = re.search(matches, matchstring)
-        if m:
-            for (s, c) in levels.items():
-                if s in m.groups(1):
-                    level = c
-                    break
-
-    # if the level isn't set already, try some defaults
-    if not level:
-        level = guess_level(matchstring)
-
-    # cleanup description to get it supported by slack - might figure out
-    # something more elegant later
-
-    desc = html2text.html2text(entry.description)
-    desc = desc.replace('**', '*')
-    desc = desc.replace('\\', '')
-    desc = desc.replace('<', '&lt;')
-    desc = desc.replace('>', '&gt;')
-    desc = desc.replace('&', '&amp;')
-
-    blocks = _make_blocks(
-        feed        = feed.name,
+    # otherwise, one we've already worked out, else classify it now,
+    # also matching keywords in the body if requested
+    elif not level:
+        level = entry.get('level') or get_classifier(cfg.get('levels')).classify(
+            entry.title, entry.description if cfg.get('match_body') else None)
+
+    desc = html_to_mrkdwn(entry.description)
+
+    channels = cfg.get('channel')
+    if not isinstance(channels, (list, tuple)):
+        channels = [channels]
+
+    # collect this into a digest per channel, if we've been asked to
+    if (cfg.get('digest') or {}).get('enabled'):
+        blocks = _cached_blocks(
+            title       = f"{feed.name}: {entry.title}",
+            message     = desc,
+            alert_class = level,
+            date        = entry.datestring)
+
+        return all_sent([
+            _digest(cfg, ('slack', cfg.get('token'), channel),
+                    functools.partial(_send_slack_digest, cfg, channel)).add(blocks)
+            for channel in channels
+        ])
+
+    blocks = _cached_blocks(
         title       = entry.title,
         message     = desc,
         alert_class = level,
         date        = entry.datestring)
 
-
-    def on_result(channel, future):
-        response = future.result()
-        if response['ok']:
-            logger.debug("Sent message to slack channel %s", channel)
+    # send to all the channels at once, the sender paces each channel
+    results = await asyncio.gather(
+        *(_send_slack(cfg, channel, {
+            'user':        rssalertbot.BOT_USERNAME,
+            'mrkdwn':      True,
+            'as_user':     True,
+            'text':        f"*{feed.name}*",
+            'attachments': blocks,
+        }) for channel in channels),
+        return_exceptions = True,
+    )
+
+    for channel, result in zip(channels, results):
+        if isinstance(result, Exception):
+            logger.error("[%s] Error sending to Slack channel %s", feed.name, channel, exc_info=result)
         else:
-            logger.warning("Slack error: %s", response['response_metadata'])
+            logger.debug("Sent message to slack channel %s", channel)
 
+    return not any(isinstance(result, Exception) for result in results)
 
-    try:
-        sc = slack.WebClient(cfg.get('token'), run_async = True)
-        channels = cfg.get('channel')
-        if not isinstance(channels, list):
-            channels = [channels]
-        for channel in channels:
-            await sc.chat_postMessage(
-                user        = rssalertbot.BOT_USERNAME,
-                channel     = channel,
-                mrkdwn      = True,
-                as_user     = True,
-                text        = f"*{feed.name}*",
-                attachments = blocks,
-            )
 
-    except Exception:
-        logger.exception("[%s] Error contacting Slack", feed.name)
+async def _send_slack_digest(cfg, channel, items):
+    """Sends a digest of alerts as one slack message"""
+
+    log.debug("Sending slack digest of %d entries to %s", len(items), channel)
+    await _send_slack(cfg, channel, {
+        'user':        rssalertbot.BOT_USERNAME,
+        'mrkdwn':      True,
+        'as_user':     True,
+        'text':        f"*{len(items)} new feed entries*",
+        'attachments': [attachment for blocks in items for attachment in blocks],
+    })
+
+
+async def _send_slack(cfg, channel, message):
+    """Sends the slack message, or puts it in the outbox if we have one"""
+
+    outbox = current_outbox.get()
+    if outbox:
+        await outbox.put_slack(cfg, channel, message)
+    else:
+        await slack_sender(cfg).send(channel, **message)
+
+
+def slack_sender(cfg):
+    """Gets the shared slack sender for this output config"""
+
+    from .senders.slack import SlackSender, SLACK_INTERVAL
+
+    return get_sender(SlackSender, cfg.get('token'),
+                      token    = cfg.get('token'),
+                      interval = cfg.get('interval', SLACK_INTERVAL),
+                      base_url = cfg.get('base_url'))
+
+
+def _digest(cfg, key, send):
+    """
+    Gets the digest for this destination, if digests are enabled in
+    the output config.
+
+    Args:
+        cfg (dict):      output config
+        key (tuple):     identifies the destination
+        send (callable): coroutine function to send the collected items
+
+    Returns:
+        Digest: the digest, or None if disabled
+    """
+    digest_cfg = cfg.get('digest') or {}
+    if not digest_cfg.get('enabled'):
+        return None
+
+    return get_sender(Digest, key,
+                      send        = send,
+                      window      = digest_cfg.get('window'),
+                      max_entries = digest_cfg.get('max_entries', DIGEST_MAX_ENTRIES))
+
+
+def classify_entries(cfg, entries):
+    """
+    Work out the slack alert levels for a batch of entries in one go,
+    saving them as ``entry['level']`` for :py:func:`alert_slack`.
+
+    Args:
+        cfg (dict):     slack output config
+        entries (list): the feed entries
+    """
+    if cfg.get('force_level'):
+        return
+
+    classifier = get_classifier(cfg.get('levels'))
+    for entry, level in zip(entries, classifier.classify_all(entries, cfg.get('match_body'))):
+        # a key, not an attribute: feedparser's entries keep those apart
+        entry['level'] = level
+
+
+def _cached_blocks(title, message, alert_class, date):
+    """
+    Makes the attachments for the slack message, reusing them if we've
+    already made the same ones for another channel or group.
+    """
+    key = (title, message, alert_class, date)
+    blocks = _blocks_cache.get(key)
+    if blocks is None:
+        blocks = _make_blocks(None, title, message, alert_class, date)
+        _blocks_cache.set(key, blocks)
+    return blocks
 
 
 def _make_blocks(feed, title, message, alert_class = 'warning', date=None):
@@ -0,0 +1,93 @@
+"""
+A Bloom filter, for skipping storage lookups of things we know aren't there.
+"""
+
+import hashlib
+import math
+import struct
+import zlib
+
+BLOOM_CAPACITY   = 100000
+BLOOM_ERROR_RATE = 0.01
+
+# version, number of bits, number of hashes, items added
+_HEADER = struct.Struct('>BQBQ')
+_VERSION = 1
+
+
+class BloomFilter:
+    """
+    A set which can say an item is definitely not in it, or probably is.
+    Items can't be removed.
+
+    Args:
+        capacity (int):     how many items it's sized for; past this the
+                            false positive rate goes up
+        error_rate (float): false positive rate at capacity
+    """
+
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        self.size = max(int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+
+    def _positions(self, item):
+        # double hashing, from one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+
+    def add(self, item):
+        """Add an item."""
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+    @property
+    def full(self) -> bool:
+        """Whether more items have been added than it's sized for."""
+        return self.count > self.capacity
+
+
+    def to_bytes(self) -> bytes:
+        """Serialize the filter, compressed."""
+        return zlib.compress(_HEADER.pack(_VERSION, self.size, self.hashes, self.count) + self.bits)
+
+
+    @classmethod
+    def from_bytes(cls, data, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        """
+        Load a filter serialized with :py:meth:`to_bytes`.
+
+        Args:
+            data (bytes):       the serialized filter
+            capacity (int):     what it should be sized for
+            error_rate (float): what it should be sized for
+
+        Returns:
+            BloomFilter: the filter, or None if it's not sized the same
+        """
+        data = zlib.decompress(data)
+        version, size, hashes, count = _HEADER.unpack_from(data)
+        bloom = cls(capacity, error_rate)
+        if version != _VERSION or (size, hashes) != (bloom.size, bloom.hashes):
+            return None
+        bits = data[_HEADER.size:]
+        if len(bits) != len(bloom.bits):
+            return None
+        bloom.bits[:] = bits
+        bloom.count = count
+        return bloom
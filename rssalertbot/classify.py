@@ -0,0 +1,186 @@
+"""
+Alert level classification.
+"""
+
+import bisect
+import functools
+import re
+
+import rssalertbot
+
+
+def keyword_pattern(keywords) -> str:
+    """
+    Make a regular expression matching any of the given keywords.
+
+    The keywords are arranged as a trie, ex: ``complete`` and ``completed``
+    become ``complete(?:d)?``, so the regex engine doesn't have to try each
+    keyword in turn at every position - this matters with lots of keywords.
+    At any position, the longest keyword wins.
+
+    Args:
+        keywords (list): keywords, matched literally
+
+    Returns:
+        str: regular expression
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        alternatives = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ''
+        pattern = '(?:' + '|'.join(alternatives) + ')'
+        if '' in node:
+            pattern += '?'
+        return pattern
+
+    return build(trie)
+
+
+# the lookahead lets us see every keyword, even overlapping ones
+DEFAULT_REGEX = re.compile(
+    f'(?=(?P<good>{keyword_pattern(rssalertbot.KEYS_GREEN)})'
+    f'|(?P<warning>{keyword_pattern(rssalertbot.KEYS_YELLOW)}))',
+    re.IGNORECASE)
+
+
+class Classifier:
+    """
+    Works out the alert level of messages by looking for keywords.
+
+    All the keywords are compiled into a single regular expression up front,
+    so classifying a message is one pass over the text, however many
+    keywords there are.
+
+    With ``levels``, the first keyword found in the message sets the level,
+    these are case-sensitive.  If none are found (or there are no
+    ``levels``), we fall back to the default keywords, case-insensitively:
+    any of :py:data:`rssalertbot.KEYS_GREEN` means 'good', otherwise any of
+    :py:data:`rssalertbot.KEYS_YELLOW` means 'warning', otherwise it's an
+    'alert'.
+
+    Args:
+        levels (dict): map of keyword to level
+    """
+
+    def __init__(self, levels=None):
+
+        keywords = {}
+        for keyword, level in (levels or {}).items():
+            if keyword:
+                keywords.setdefault(level, []).append(keyword)
+
+        # one named group per level, so the match tells us the level
+        self.levels = list(keywords)
+        self.regex = None
+        if keywords:
+            self.regex = re.compile('|'.join(
+                f'(?P<l{i}>{keyword_pattern(k)})' for i, k in enumerate(keywords.values())))
+
+
+    def classify(self, title, body=None) -> str:
+        """
+        Classify a message.
+
+        Args:
+            title (str): the message title
+            body (str):  the message body, if we should look in there too
+
+        Returns:
+            str: the level
+        """
+        texts = (title, body)
+
+        if self.regex:
+            for text in texts:
+                if text:
+                    m = self.regex.search(text)
+                    if m:
+                        return self.levels[int(m.lastgroup[1:])]
+
+        level = 'alert'
+        for text in texts:
+            if text:
+                for m in DEFAULT_REGEX.finditer(text):
+                    if m.lastgroup == 'good':
+                        return 'good'
+                    level = 'warning'
+        return level
+
+
+    def classify_all(self, entries, match_body=False) -> list:
+        """
+        Classify a batch of feed entries at once.
+
+        The entries are joined up and searched in a single pass for each
+        of the regexes, rather than one search per entry.
+
+        Args:
+            entries (list):    feed entries
+            match_body (bool): look in the entry descriptions, too
+
+        Returns:
+            list: the level for each entry
+        """
+        if not entries:
+            return []
+
+        texts = []
+        for entry in entries:
+            texts.append(entry.title)
+            texts.append(entry.description if match_body else '')
+        text = '\0'.join(texts)
+
+        # where each entry starts in the big string
+        starts = []
+        pos = 0
+        for i in range(0, len(texts), 2):
+            starts.append(pos)
+            pos += len(texts[i]) + len(texts[i + 1]) + 2
+
+        levels = [None] * len(entries)
+
+        if self.regex:
+            for m in self.regex.finditer(text):
+                i = bisect.bisect_right(starts, m.start()) - 1
+                if levels[i] is None:
+                    levels[i] = self.levels[int(m.lastgroup[1:])]
+
+        warning = set()
+        for m in DEFAULT_REGEX.finditer(text):
+            i = bisect.bisect_right(starts, m.start()) - 1
+            if levels[i] is None:
+                if m.lastgroup == 'good':
+                    levels[i] = 'good'
+                else:
+                    warning.add(i)
+
+        return [
+            level or ('warning' if i in warning else 'alert')
+            for i, level in enumerate(levels)
+        ]
+
+
+@functools.lru_cache(maxsize=128)
+def _get_classifier(levels):
+    return Classifier(dict(levels) if levels else None)
+
+
+def get_classifier(levels=None) -> Classifier:
+    """
+    Get a classifier for this set of levels, compiling it only once
+    for each distinct output config.
+
+    Args:
+        levels (dict): map of keyword to level
+    """
+    return _get_classifier(tuple(levels.items()) if levels else None)
+
+
+DEFAULT_CLASSIFIER = Classifier()
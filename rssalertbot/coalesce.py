@@ -0,0 +1,97 @@
+"""
+Coalescing feeds with the same URL.
+
+The same feed is often in several groups, ex: a vendor's status feed
+going to both an ops and a sales channel.  Feeds with the same URL and
+credentials are only fetched and parsed once per run, and every feed gets
+its own copy of the entries, keeping its own stored state and outputs.
+"""
+
+import asyncio
+import collections
+import copy
+
+
+def fetch_key(feed):
+    """What makes two feeds the same fetch."""
+    return (feed.url, feed.username, feed.password)
+
+
+class SharedFetches:
+    """
+    Shares fetches between feeds with the same URL and credentials, for
+    one run.  Feeds are added as they're set up, so we know which fetches
+    are shared before any start.
+    """
+
+    def __init__(self):
+        self.subscribers = collections.Counter()
+        self.fetches = {}
+
+
+    def add(self, feed):
+        """Add a feed which fetches through us."""
+        self.subscribers[fetch_key(feed)] += 1
+
+
+    def is_shared(self, feed) -> bool:
+        """Whether the feed's fetch is shared with other feeds."""
+        return self.subscribers[fetch_key(feed)] > 1
+
+
+    async def fetch_and_parse(self, feed, timeout):
+        """
+        Fetch and parse the feed, or wait for another feed with the same
+        URL to.
+
+        Args:
+            feed (:py:class:`rssalertbot.feed.Feed`): the feed
+            timeout (int): fetch timeout
+
+        Returns:
+            list: the feed's own copy of the entries
+        """
+        if not self.is_shared(feed):
+            return await feed._fetch_and_parse(timeout)
+
+        key = fetch_key(feed)
+
+        shared = self.fetches.get(key)
+        if shared is None:
+            return await self._fetch(feed, key, timeout)
+
+        # don't let our being cancelled cancel it for everyone
+        result = await asyncio.shield(shared)
+        if result is None:
+            # the feed doing the fetch didn't get to finish it
+            return await self._fetch(feed, key, timeout)
+
+        entries, stats, failure, fetched_by = result
+        for name, value in stats.items():
+            setattr(feed.stats, name, value)
+        feed.stats.shared_from = fetched_by
+        feed.log.debug("Feed %s shared the fetch of %s by feed %s", feed.name, feed.url, fetched_by)
+
+        if failure:
+            feed.log.error("Fetching feed %s failed: %s", feed.url, failure[1])
+            await feed._handle_fetch_failure(*failure)
+        return [copy.copy(entry) for entry in entries]
+
+
+    async def _fetch(self, feed, key, timeout):
+        shared = self.fetches[key] = asyncio.get_running_loop().create_future()
+        feed.fetch_failure = None
+        try:
+            entries = await feed._fetch_and_parse(timeout)
+        except BaseException:
+            # let the next feed have a go
+            del self.fetches[key]
+            shared.set_result(None)
+            raise
+
+        stats = {name: getattr(feed.stats, name)
+                 for name in ('status', 'fetch_seconds', 'response_bytes', 'entries_parsed')}
+        shared.set_result((entries, stats, feed.fetch_failure, feed.feed))
+
+        # everyone gets a copy, as processing changes the entries
+        return [copy.copy(entry) for entry in entries]
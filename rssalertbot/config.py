@@ -8,21 +8,19 @@ import os
 import yaml
 
 from box import Box
-from .util import deepmerge
+from .util import deepmerge, deepmerge_into
 
 log = logging.getLogger(__name__)
 
+# the C loader is much faster, when PyYAML has been built with libyaml
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 class Config(Box):
     """
     A class to deal with our config file in a nice way.
     """
 
-    def __init__(self, *args, **kwargs):
-        kwargs['box_it_up'] = True
-        super().__init__(*args, **kwargs)
-
-
     def get(self, key, default=None):
         """
         Works just like :py:meth:`dict.get` except it allows for
@@ -78,33 +76,32 @@ class Config(Box):
             self.merge_dict(dict_from_dotted_key(key, value))
 
 
+    @classmethod
+    def from_files(cls, cfgfiles, encoding='utf-8'):
+        """
+        Make a config from files and/or 'conf.d' directories, merged in order.
+
+        The files are all parsed and merged as plain data first, and the
+        config is only built once at the end, so this stays fast with
+        hundreds of files.
+
+        Args:
+            cfgfiles (list): file or directory paths
+            encoding (str):  File encoding option for open()
+        """
+        return cls(load_files(cfgfiles, encoding))
+
+
     def load(self, cfgfile, encoding='utf-8'):
         """
         Load configuration from file or 'conf.d' directory.
         """
-
-        if os.path.isdir(cfgfile):
-            self.load_dir(cfgfile, encoding)
-        else:
-            self.load_file(cfgfile, encoding)
+        self.merge_dict(load_files([cfgfile], encoding))
 
 
     def load_file(self, cfgfile, encoding='utf-8'):
         """Load a config file."""
-
-        if not os.path.isfile(cfgfile):
-            raise ValueError(f"Cannot read config file '{cfgfile}'")
-
-        log.debug("Loading config file %s", cfgfile)
-        with open(cfgfile, 'r', encoding=encoding) as f:
-            if cfgfile.endswith('.json'):
-                data_dict = json.load(f)
-            elif cfgfile.endswith('.yaml') or cfgfile.endswith('.yml'):
-                data_dict = yaml.safe_load(f.read())
-            else:
-                raise ValueError("unknown file format")
-
-            self.merge_dict(data_dict)
+        self.merge_dict(read_file(cfgfile, encoding))
 
 
     def load_dir(self, cfgdir, encoding='utf-8'):
@@ -118,16 +115,7 @@ class Config(Box):
             cfgdir (str):   directory path
             encoding (str): File encoding option for open()
         """
-
-        for f in sorted(os.listdir(cfgdir)):
-            # skip dot files
-            if f.startswith('.'):
-                continue
-
-            if not f.endswith('.yaml'):
-                continue
-
-            self.load_file(os.path.join(cfgdir, f), encoding=encoding)
+        self.merge_dict(load_files([cfgdir], encoding))
 
 
     def merge_dict(self, data):
@@ -141,6 +129,96 @@ class Config(Box):
         self.update(deepmerge(self.to_dict(), data))
 
 
+class FrozenConfig(dict):
+    """
+    A read-only config dictionary, which can be safely shared - ex: the
+    output config shared by all feeds in a group.  Supports the same
+    "dotted notation" as :py:meth:`Config.get`, and attribute access to
+    keys like :py:class:`Config`.
+
+    Use :py:func:`freeze` to make one.
+    """
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("FrozenConfig is read-only")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+
+    def __copy__(self):
+        return self
+
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+    def __reduce__(self):
+        return (FrozenConfig, (dict(self),))
+
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+
+    def to_dict(self):
+        """
+        Make a plain, mutable copy of the data.
+        """
+        return {k: _thaw(v) for k, v in self.items()}
+
+
+    def get(self, key, default=None):
+        """
+        Works just like :py:meth:`Config.get`.
+        """
+        if '.' not in key:
+            return super().get(key, default)
+
+        k, rest = key.split('.', 1)
+        v = super().get(k, default)
+
+        if isinstance(v, dict):
+            return v.get(rest, default)
+
+        elif v:
+            return v
+
+        else:
+            return default
+
+
+def freeze(data):
+    """
+    Make a read-only copy of config data: dicts become
+    :py:class:`FrozenConfig` and lists become tuples.
+
+    Args:
+        data: config data
+
+    Returns:
+        the frozen data
+    """
+    if isinstance(data, dict):
+        return FrozenConfig({k: freeze(v) for k, v in data.items()})
+    if isinstance(data, (list, tuple)):
+        return tuple(freeze(v) for v in data)
+    return data
+
+
+def _thaw(data):
+    if isinstance(data, FrozenConfig):
+        return data.to_dict()
+    if isinstance(data, tuple):
+        return [_thaw(v) for v in data]
+    return data
+
+
 def dict_from_dotted_key(key, value):
     """
     Make a dict from a dotted key::
@@ -171,3 +249,71 @@ def dict_from_dotted_key(key, value):
 
     leaf[last] = value
     return d
+
+
+def config_files(cfgfile):
+    """
+    List the config files to load for a path: the file itself, or for a
+    'conf.d' directory, its '.yaml' files in alphanumeric order, ignoring
+    dot files.
+
+    Args:
+        cfgfile (str): file or directory path
+
+    Returns:
+        list: file paths
+    """
+    if not os.path.isdir(cfgfile):
+        return [cfgfile]
+
+    return [
+        os.path.join(cfgfile, f)
+        for f in sorted(os.listdir(cfgfile))
+        if not f.startswith('.') and f.endswith('.yaml')
+    ]
+
+
+def read_file(cfgfile, encoding='utf-8'):
+    """
+    Parse a config file.
+
+    Args:
+        cfgfile (str):  file path, '.json', '.yaml' or '.yml'
+        encoding (str): File encoding option for open()
+
+    Returns:
+        dict: the data
+    """
+    if not os.path.isfile(cfgfile):
+        raise ValueError(f"Cannot read config file '{cfgfile}'")
+
+    log.debug("Loading config file %s", cfgfile)
+    with open(cfgfile, 'r', encoding=encoding) as f:
+        if cfgfile.endswith('.json'):
+            data = json.load(f)
+        elif cfgfile.endswith('.yaml') or cfgfile.endswith('.yml'):
+            data = yaml.load(f, Loader=YAML_LOADER)
+        else:
+            raise ValueError("unknown file format")
+
+    if not isinstance(data, dict):
+        raise TypeError(f"Config file '{cfgfile}' must contain a dict")
+    return data
+
+
+def load_files(cfgfiles, encoding='utf-8'):
+    """
+    Parse config files and/or 'conf.d' directories, and merge them in order.
+
+    Args:
+        cfgfiles (list): file or directory paths
+        encoding (str):  File encoding option for open()
+
+    Returns:
+        dict: the merged data
+    """
+    data = {}
+    for path in cfgfiles:
+        for cfgfile in config_files(path):
+            deepmerge_into(data, read_file(cfgfile, encoding))
+    return data
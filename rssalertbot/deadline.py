@@ -0,0 +1,53 @@
+"""
+Run deadlines.
+
+A run is given a total time budget, split into phases: processing the
+feeds, then delivering whatever alerts are still queued.  Feeds still
+going when their phase is up are cancelled (see
+:py:func:`rssalertbot.scheduler.run_feeds`), so a stuck feed can't keep
+the run - and the lock - going past the next one's start.
+"""
+
+import asyncio
+
+# share of the deadline kept for delivering queued alerts at the end
+DEADLINE_DELIVERY_SHARE = 0.2
+
+# how long cancelled feeds get to stop, in seconds
+CANCEL_GRACE = 5
+
+
+class Deadline:
+    """
+    A deadline for the run, starting now.
+
+    Args:
+        seconds (float):  total time for the run, or None for no deadline
+        delivery (float): seconds of it kept for delivering queued alerts
+                          once the feeds are done, default: a fifth
+    """
+
+    def __init__(self, seconds=None, delivery=None):
+        self.loop = asyncio.get_running_loop()
+        self.seconds = seconds
+        self.end = self.loop.time() + seconds if seconds else None
+        if delivery is None and seconds:
+            delivery = seconds * DEADLINE_DELIVERY_SHARE
+        self.delivery = min(delivery or 0, seconds or 0)
+
+
+    def remaining(self, reserve=0):
+        """
+        Seconds left, keeping back ``reserve`` seconds.
+
+        Returns:
+            float: time left, never negative, or None if there's no deadline
+        """
+        if self.end is None:
+            return None
+        return max(self.end - reserve - self.loop.time(), 0)
+
+
+    def feeds_remaining(self):
+        """Seconds left for processing feeds, or None if there's no deadline."""
+        return self.remaining(self.delivery)
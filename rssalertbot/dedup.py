@@ -0,0 +1,137 @@
+"""
+Deduplication of identical entries across feeds.
+"""
+
+import asyncio
+import logging
+import re
+
+import rssalertbot
+
+log = logging.getLogger(__name__)
+
+# how often to delete entries which have gone out of their window, in hours
+DEDUP_EXPIRE_INTERVAL = 24
+
+# when we last did
+DEDUP_EXPIRED = 'dedup-last-expired'
+
+# stored names are dedup-<scope>-<md5 digest>
+DEDUP_NAME = re.compile(r'dedup-(?P<scope>.+)-(?P<digest>[0-9a-f]{32})')
+
+
+class DedupIndex:
+    """
+    Keeps track of which entries have been alerted on, by content digest,
+    so that identical entries posted to several feeds are only alerted on
+    once.
+
+    Within a run the index is kept in memory, and delivered entries are
+    saved to storage so that we remember them on the next run, until
+    :py:meth:`expire` deletes them.
+
+    Args:
+        storage: Instantiated :py:class:`rssalertbot.storage.BaseStorage` subclass
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.deliveries = {}
+
+
+    def _name(self, scope):
+        return f'dedup-{scope}'
+
+
+    def check(self, scope, digest, now, window):
+        """
+        Has this entry already been alerted on?
+
+        Args:
+            scope (str):   what we're deduplicating across, ex: a group name
+            digest (str):  the entry's content digest
+            now (:py:class:`pendulum.DateTime`): the current time
+            window (int):  how long to remember entries for, in hours
+
+        Returns:
+            asyncio.Future: resolves to whether the first alert was delivered,
+            or None if we haven't seen the entry
+        """
+        delivery = self.deliveries.get((scope, digest))
+        if delivery:
+            return delivery
+
+        last_sent = self.storage.load_event(self._name(scope), digest)
+        if last_sent and now < last_sent.add(hours=window):
+            delivery = asyncio.get_running_loop().create_future()
+            delivery.set_result(True)
+            self.deliveries[(scope, digest)] = delivery
+            return delivery
+
+        return None
+
+
+    def claim(self, scope, digest, now, delivery):
+        """
+        Record that we're alerting on this entry.  Once it's delivered,
+        it's saved to storage.
+
+        Args:
+            scope (str):   what we're deduplicating across
+            digest (str):  the entry's content digest
+            now (:py:class:`pendulum.DateTime`): the current time
+            delivery (asyncio.Future): resolves to whether the alert was delivered
+        """
+        self.deliveries[(scope, digest)] = delivery
+
+        def on_delivery(future):
+            if not future.cancelled() and not future.exception() and future.result():
+                self.storage.save_event(self._name(scope), digest, now)
+            else:
+                # let someone else try
+                self.deliveries.pop((scope, digest), None)
+
+        delivery.add_done_callback(on_delivery)
+
+
+    def expire(self, now, windows, interval=DEDUP_EXPIRE_INTERVAL):
+        """
+        Delete stored entries which have gone out of their window.  This
+        means listing everything stored, so it's only done once every
+        ``interval`` hours.
+
+        Args:
+            now (:py:class:`pendulum.DateTime`): the current time
+            windows (dict): the window for each scope, in hours; entries
+                            for other scopes are kept for the longest
+            interval (int): hours between expiring entries
+
+        Returns:
+            int: how many entries were deleted
+        """
+        last_expired = self.storage.last_update(DEDUP_EXPIRED)
+        if last_expired and now < last_expired.add(hours=interval):
+            return 0
+
+        try:
+            names = self.storage.list_names()
+        except NotImplementedError:
+            log.warning("%s can't list entries, so deduplicated entries aren't expired",
+                        type(self.storage).__name__)
+            return 0
+
+        default = max(windows.values(), default=rssalertbot.RE_ALERT_DEFAULT)
+        deleted = 0
+        for name in names:
+            m = DEDUP_NAME.fullmatch(name)
+            if not m:
+                continue
+            scope, digest = m.group('scope', 'digest')
+            last_sent = self.storage.load_event(self._name(scope), digest)
+            if last_sent and now >= last_sent.add(hours=windows.get(scope, default)):
+                self.storage.delete_event(self._name(scope), digest)
+                deleted += 1
+
+        self.storage.save_date(DEDUP_EXPIRED, now)
+        log.info("Deleted %d deduplicated entries out of their window", deleted)
+        return deleted
@@ -0,0 +1,118 @@
+"""
+Digests, for coalescing alerts to one destination into a single message.
+"""
+
+import asyncio
+import logging
+
+from .senders import BaseSender
+
+log = logging.getLogger(__name__)
+
+DIGEST_MAX_ENTRIES = 20
+
+
+class Digest(BaseSender):
+    """
+    Collects items going to one destination, and sends them together.
+
+    The digest is sent ``window`` seconds after the first item arrived, or
+    at the end of the run if there's no window.  A digest that reaches
+    ``max_entries`` items is sent right away, and a new one started.
+
+    Use with :py:func:`rssalertbot.senders.get_sender`, keyed on the
+    destination, so that :py:func:`rssalertbot.senders.close_all` sends
+    whatever is left at the end of the run.
+
+    Adding an item gives a future for whether it was sent, so progress
+    is only saved once it has been.
+
+    Args:
+        send (callable):   coroutine function to send a list of items
+        window (int):      how long to collect items for, in seconds
+        max_entries (int): maximum number of items in one digest
+    """
+
+    def __init__(self, send, window=None, max_entries=DIGEST_MAX_ENTRIES):
+        self.send = send
+        self.window = window
+        self.max_entries = max(max_entries, 1)
+
+        self.items = []
+        self.futures = []
+        self.timer = None
+        self.tasks = set()
+
+
+    def add(self, item):
+        """
+        Add an item to the digest.
+
+        Returns:
+            asyncio.Future: resolves to whether the digest with the item was sent
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.items.append(item)
+        self.futures.append(future)
+
+        if len(self.items) >= self.max_entries:
+            self.flush()
+        elif self.window and not self.timer:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return future
+
+
+    def flush(self):
+        """
+        Send whatever we've collected so far, in the background.
+        """
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+
+        if not self.items:
+            return
+
+        items, self.items = self.items, []
+        futures, self.futures = self.futures, []
+        task = asyncio.get_running_loop().create_task(self._send(items, futures))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+    async def _send(self, items, futures):
+        sent = False
+        try:
+            await self.send(items)
+            sent = True
+        except Exception:
+            log.exception("Error sending digest of %d entries", len(items))
+        finally:
+            for future in futures:
+                if not future.done():
+                    future.set_result(sent)
+
+
+    async def close(self):
+        self.flush()
+        await asyncio.gather(*self.tasks)
+
+
+def all_sent(futures):
+    """
+    Combine the futures from :py:meth:`Digest.add`.
+
+    Args:
+        futures (list): the futures
+
+    Returns:
+        asyncio.Future: resolves to whether all the digests were sent
+    """
+    sent = asyncio.get_running_loop().create_future()
+
+    def on_sent(future):
+        if not sent.done():
+            sent.set_result(not future.cancelled() and not future.exception() and all(future.result()))
+
+    asyncio.gather(*futures).add_done_callback(on_sent)
+    return sent
@@ -0,0 +1,96 @@
+"""
+Alert dispatching.
+"""
+
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+DISPATCH_WORKERS    = 10
+DISPATCH_QUEUE_SIZE = 100
+
+
+class Dispatcher:
+    """
+    Delivers alerts in the background, with a pool of workers.
+
+    Feeds submit their alerts and carry on processing, the queue is bounded
+    so that a feed submitting faster than the outputs can deliver has to
+    wait for room.  Higher priority alerts are delivered first.
+
+    Args:
+        workers (int):    number of alerts to deliver at once
+        queue_size (int): maximum number of alerts waiting for a worker
+    """
+
+    def __init__(self, workers=DISPATCH_WORKERS, queue_size=DISPATCH_QUEUE_SIZE):
+        self.num_workers = max(workers, 1)
+        self.queue = asyncio.PriorityQueue(maxsize=queue_size)
+        self.workers = []
+        self.submitted = 0
+
+
+    async def submit(self, func, *args, priority=0):
+        """
+        Queue an alert for delivery, waiting for room in the queue if it's full.
+
+        Args:
+            func (callable): coroutine function which delivers the alert
+            args:            arguments for ``func``
+            priority (int):  higher is delivered sooner, else first come
+                             first served
+
+        Returns:
+            asyncio.Future: resolves to the result of ``func``
+        """
+        if not self.workers:
+            self.workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+        future = asyncio.get_running_loop().create_future()
+        self.submitted += 1
+        await self.queue.put((-priority, self.submitted, func, args, future))
+        return future
+
+
+    async def _worker(self):
+        while True:
+            _, _, func, args, future = await self.queue.get()
+            try:
+                # the feed gave up on it
+                if future.cancelled():
+                    continue
+
+                result = await func(*args)
+                if not future.done():
+                    future.set_result(result)
+
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+
+            finally:
+                self.queue.task_done()
+
+
+    async def close(self, timeout=None):
+        """
+        Wait for everything queued to be delivered, then stop the workers.
+
+        Args:
+            timeout (float): give up waiting after this many seconds,
+                             cancelling anything not yet delivered
+        """
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("Cancelling %d alerts not delivered in time", self.queue.qsize())
+            while not self.queue.empty():
+                *_, future = self.queue.get_nowait()
+                future.cancel()
+                self.queue.task_done()
+
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
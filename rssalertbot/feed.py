@@ -7,21 +7,138 @@ import async_timeout
 import asyncio
 import base64
 import concurrent.futures
-import copy
 import dateutil.parser
 import feedparser
 import logging
 import pendulum
+import time
+import urllib.parse
 from box import Box
 from hashlib import md5
 
 import rssalertbot
 import rssalertbot.alerts
-from .config import Config
+from . import looplag, metrics
+from .http2 import current_fetcher
+from .replay import current_archive, current_fetch_timeout
+from .report import FeedStats, current_stats
+from .config import FrozenConfig, freeze
+from .digest import all_sent
+from .filters import get_entry_filter
+from .util import deepmerge
 
 log = logging.getLogger(__name__)
 
 
+def resolve_outputs(cfg, group):
+    """
+    Work out the output config for a feed group: the global outputs merged
+    with the group's, with the notification and sanity checks applied.
+
+    This is done once per group, and the result is read-only, so every
+    feed in the group can share it rather than each taking its own copy.
+
+    Args:
+        cfg (Box):    full configuration
+        group (Box):  the group config
+
+    Returns:
+        :py:class:`rssalertbot.config.FrozenConfig`: the output config
+    """
+    group_outputs = group.get('outputs', {})
+    if not isinstance(group_outputs, dict):
+        raise TypeError(f"Outputs for group {group['name']} must be a dict")
+
+    # plain dicts, so merging doesn't touch the main config
+    outputs = deepmerge(_to_dict(cfg.get('outputs', {})), _to_dict(group_outputs))
+
+    # update the email 'from' to show the feed group name
+    if 'email' in outputs:
+        outputs['email']['from'] = f"{group['name']} Feeds <{outputs['email'].get('from')}>"
+
+    # do the global notification disable
+    if cfg.get('no_notify', False):
+        log.debug("Note: notifications disabled")
+        if 'email' in outputs:
+            outputs['email']['disabled'] = True
+        if 'slack' in outputs:
+            outputs['slack']['disabled'] = True
+
+    # sanity tests
+    for output, fields in (('slack', ('channel', 'token')), ('email', ('to', 'from'))):
+        settings = outputs.get(output)
+        if not (isinstance(settings, dict) and settings.get('enabled')):
+            continue
+        for field in fields:
+            if not settings.get(field):
+                log.error("%s enabled but %s.%s not set!", output.capitalize(), output, field)
+                settings['enabled'] = False
+
+    return freeze(outputs)
+
+
+def resolve_dedup(cfg, group):
+    """
+    Work out the ``dedup`` config for a feed group: the global settings
+    merged with the group's.  Like :py:func:`resolve_outputs`, this is done
+    once per group and shared by its feeds.
+
+    Args:
+        cfg (Box):    full configuration
+        group (Box):  the group config
+
+    Returns:
+        :py:class:`rssalertbot.config.FrozenConfig`: the dedup config
+    """
+    return freeze(deepmerge(_to_dict(cfg.get('dedup', {})), _to_dict(group.get('dedup', {}))))
+
+
+def resolve_groups(cfg):
+    """
+    Resolve the outputs of every feed group.
+
+    Args:
+        cfg (Box):    full configuration
+
+    Returns:
+        list: ``(group, outputs)`` for each group
+    """
+    return [(group, resolve_outputs(cfg, group)) for group in cfg.get('feedgroups', [])]
+
+
+def _to_dict(data):
+    return data.to_dict() if isinstance(data, (Box, FrozenConfig)) else dict(data)
+
+
+def _follow_digest(future):
+    """
+    Follow an alert's future through to its digest being sent, if the
+    alert was added to one.
+
+    Args:
+        future (asyncio.Future): resolves to what the alert returned
+
+    Returns:
+        asyncio.Future: resolves to whether the alert was delivered
+    """
+    delivery = asyncio.get_running_loop().create_future()
+
+    def on_done(done):
+        if delivery.done():
+            return
+        if done.cancelled():
+            delivery.cancel()
+        elif done.exception():
+            delivery.set_exception(done.exception())
+        elif asyncio.isfuture(done.result()):
+            done.result().add_done_callback(on_done)
+        else:
+            delivery.set_result(done.result())
+
+    future.add_done_callback(on_done)
+    return delivery
+
+
 class Feed:
     """
     A feed.
@@ -32,17 +149,40 @@ class Feed:
         group (Box):    the group config
         name (str):     Feed name
         url (str):      URL to fetch
+        dispatcher:     :py:class:`rssalertbot.dispatch.Dispatcher` to deliver
+                        alerts with, else alerts are delivered inline
+        dedup:          :py:class:`rssalertbot.dedup.DedupIndex` shared by all
+                        feeds, for the ``dedup`` option
+        outputs:        the group's output config, from :py:func:`resolve_outputs`,
+                        else it's resolved for this feed
+        priority (int): scheduling priority, higher first, else the group's
+        fetches:        :py:class:`rssalertbot.coalesce.SharedFetches` shared by
+                        all feeds, to fetch each URL only once
+        filters (dict): the feed's own ``filter`` rules, on top of the group's
+        dedup_cfg:      the group's dedup config, from :py:func:`resolve_dedup`,
+                        else it's resolved for this feed
     """
 
-    def __init__(self, cfg, storage, group, name, url):
+    def __init__(self, cfg, storage, group, name, url, dispatcher=None, dedup=None,
+                 outputs=None, priority=None, fetches=None, filters=None, dedup_cfg=None):
 
         self.cfg  = cfg
         self.storage = storage
         self.group = group
         self.name = name
         self.url  = url
+        self.dispatcher = dispatcher
+        self.dedup = dedup
+        self.priority = int(priority if priority is not None else group.get('priority', 0))
 
         self.feed = f'{self.group.name}-{self.name}'
+        self.stats = FeedStats()
+
+        # alerts handed to the dispatcher during processing
+        self.queued = []
+
+        # saving progress, when it has to wait for digests to be sent
+        self.progress = None
 
         self.log = logging.LoggerAdapter(
             log,
@@ -53,41 +193,37 @@ class Feed:
 
         self.log.debug("Setting up feed %s", self.name)
 
-        # start with the global outputs - note the copy so we don't mess
-        # with the main config dictionary
-        self.outputs = Config(copy.deepcopy(cfg.get('outputs', {})))
-
-        # then merge the group outputs
-        self.outputs.merge_dict(group.get('outputs', {}))
-
-        # update the email 'from' to show the feed group name
-        if 'email' in self.outputs:
-            self.outputs['email']['from'] = f"{group['name']} Feeds <{self.outputs['email']['from']}>"
-
-        # do the global notification disable
-        if cfg.get('no_notify', False):
-            self.log.debug("Note: notifications disabled")
-            if 'email' in self.outputs:
-                self.outputs['email']['disabled'] = True
-            if 'slack' in self.outputs:
-                self.outputs['slack']['disabled'] = True
+        # outputs are normally resolved once per group and shared
+        if outputs is None:
+            outputs = resolve_outputs(cfg, group)
+        self.outputs = outputs
+        self.digests = any(self.outputs.get(f'{output}.enabled') and self.outputs.get(f'{output}.digest.enabled')
+                           for output in ('email', 'slack'))
+
+        # deduplicate identical entries across the group, or all feeds
+        if dedup_cfg is None:
+            dedup_cfg = resolve_dedup(cfg, group)
+        self.dedup_cfg = dedup_cfg
+        if self.dedup_cfg.get('scope') == 'global':
+            self.dedup_scope = 'global'
+        else:
+            self.dedup_scope = f'group-{group.name}'
+
+        # which entries we care about
+        try:
+            self.entry_filter = get_entry_filter(group.get('filter'), filters)
+        except ValueError as e:
+            raise ValueError(f"Filter for feed {self.feed}: {e}") from e
 
         # configure fetch user/password
         self.username = group.get('username')
         self.password = group.get('password')
 
-        # sanity tests
-        if self.outputs.get('slack.enabled'):
-            for field in ('slack.channel', 'slack.token'):
-                if not self.outputs.get(field):
-                    self.log.error("Slack enabled but %s not set!", field)
-                    self.outputs.set('slack.enabled', False)
-
-        if self.outputs.get('email.enabled'):
-            for field in ('email.to', 'email.from'):
-                if not self.outputs.get(field):
-                    self.log.error("Email enabled but %s not set!", field)
-                    self.outputs.set('email.enabled', False)
+        # the last fetch failure, for feeds sharing our fetch
+        self.fetch_failure = None
+        self.fetches = fetches
+        if fetches:
+            fetches.add(self)
 
 
     def previous_date(self):
@@ -112,23 +248,49 @@ class Feed:
         """
 
         self.log.debug("Fetching url: %s", self.url)
-        with async_timeout.timeout(timeout):
+        host = urllib.parse.urlsplit(self.url).hostname or ''
+        status = 'error'
+        start = time.perf_counter()
+        with async_timeout.timeout(timeout) as fetch_timeout:
+            token = current_fetch_timeout.set(fetch_timeout)
             try:
                 async with session.get(self.url) as response:
+                    status = str(response.status)
                     if response.status != 200:
+                        self._fetched(host, status, start)
                         self.log.error("HTTP Error %s fetching feed %s", response.status, self.url)
                         return await self._handle_fetch_failure('no data', f"HTTP error {response.status}")
-                    return await response.text()
-
-            except asyncio.exceptions.CancelledError:
+                    # count the bytes as they come, rather than encoding the text again
+                    body = await response.read()
+                    self.stats.response_bytes = len(body)
+                    self._fetched(host, status, start)
+                    return body.decode(response.get_encoding())
+
+            except (asyncio.exceptions.CancelledError, asyncio.TimeoutError) as e:
+                # cancelled by something else, ex: the run deadline
+                if isinstance(e, asyncio.exceptions.CancelledError) and not fetch_timeout.expired:
+                    raise
+                self._fetched(host, 'timeout', start)
                 self.log.error("Timeout fetching feed %s", self.url)
                 await self._handle_fetch_failure('Timeout', "Timeout while fetching feed")
 
             except Exception as e:
+                self._fetched(host, status, start)
                 self.log.exception("Error fetching feed %s", self.url)
                 etype = '.'.join((type(e).__module__, type(e).__name__))
                 await self._handle_fetch_failure('Exception', f"{etype} fetching feed: {e}")
 
+            finally:
+                current_fetch_timeout.reset(token)
+
+
+    def _fetched(self, host, status, start):
+        seconds = time.perf_counter() - start
+        metrics.FETCHES.inc(host=host, status=status)
+        metrics.FETCH_SECONDS.observe(seconds, host=host)
+        self.stats.status = status
+        self.stats.fetch_seconds = seconds
+
 
     async def _handle_fetch_failure(self, title, description):
         """
@@ -139,6 +301,7 @@ class Feed:
             description (str): alert description
         """
 
+        self.fetch_failure = (title, description)
         if not self.group.get('alert_on_failure', False):
             return
 
@@ -155,7 +318,8 @@ class Feed:
 
     async def fetch_and_parse(self, timeout=10):
         """
-        Fetch and parse the data to return a list of entries.
+        Fetch and parse the data to return a list of entries, sharing the
+        fetch with any other feeds with the same URL.
 
         Args:
             timeout (int): fetch timeout
@@ -163,19 +327,38 @@ class Feed:
         Returns:
             list: entries as objects from feedparser
         """
+        if self.fetches:
+            return await self.fetches.fetch_and_parse(self, timeout)
+        return await self._fetch_and_parse(timeout)
+
 
+    async def _fetch_and_parse(self, timeout):
         headers = {}
         if self.username and self.password:
             creds = f'{self.username}:{self.password}'.encode('utf-8')
             headers['Authorization'] = f'Basic {base64.urlsafe_b64encode(creds)}'
 
-        async with aiohttp.ClientSession(headers=headers) as session:
+        # record or replay the fetch, if we've been asked to, else
+        # share the HTTP/2 connections if we have them
+        archive = current_archive.get()
+        fetcher = current_fetcher.get()
+        if archive:
+            session = archive.session(self.username, headers=headers)
+        elif fetcher:
+            session = fetcher.session(self.username, headers=headers)
+        else:
+            session = aiohttp.ClientSession(headers=headers)
+
+        async with session:
             rsp = await self._fetch(session, timeout)
 
             feed_entries = []
             if rsp:
-                data = feedparser.parse(rsp)
+                metrics.PARSE_BYTES.observe(self.stats.response_bytes)
+                with metrics.PARSE_SECONDS.time():
+                    data = feedparser.parse(rsp)
                 feed_entries = data.entries
+                self.stats.entries_parsed = len(feed_entries)
                 if data.bozo:
                     self.log.error(f"No valid RSS data from feed {self.url}: {data.bozo_exception}")
             return feed_entries
@@ -183,20 +366,49 @@ class Feed:
 
     async def process(self, timeout=60):
         """
-        Fetch and process this feed.
+        Fetch and process this feed, keeping stats in :py:attr:`stats`.
 
         Args:
             timeout (int): HTTP timeout
         """
+        self.stats = FeedStats()
+        self.stats.result = 'error'
+        self.queued = []
+        self.progress = None
+        token = current_stats.set(self.stats)
+        task = looplag.set_feed(self)
+        start = time.perf_counter()
+        try:
+            await self._process(timeout)
+            if self.stats.status == 'timeout':
+                self.stats.result = 'timeout'
+            elif self.stats.status not in (None, '200'):
+                self.stats.result = 'failed'
+            else:
+                self.stats.result = 'ok'
+        except asyncio.CancelledError:
+            # don't send what's still queued: the stored date hasn't moved
+            # past those entries, so the next run picks them up again
+            self.stats.result = 'cancelled'
+            for future in self.queued:
+                future.cancel()
+            raise
+        finally:
+            self.stats.seconds = time.perf_counter() - start
+            current_stats.reset(token)
+            looplag.clear_feed(task)
+
+
+    async def _process(self, timeout):
 
         previous_date = self.previous_date()
-        new_date = previous_date
-        last_sent_message_date = previous_date
         now = pendulum.now('UTC')
+        re_alert = self.cfg.get('re_alert', rssalertbot.RE_ALERT_DEFAULT)
 
         self.log.info("Begining processing feed %s, previous date %s",
                       self.name, previous_date)
 
+        new_entries = []
         for entry in await self.fetch_and_parse(timeout):
 
             pubdate = dateutil.parser.parse(entry.published, tzinfos=rssalertbot.BOGUS_TIMEZONES)
@@ -208,48 +420,201 @@ class Feed:
             if entry.published <= previous_date:
                 continue
 
+            # and anything we don't care about, before doing any more work
+            if self.entry_filter and not self.entry_filter(entry):
+                self.stats.entries_filtered += 1
+                continue
+
             event_id = md5((entry.title + entry.description).encode()).hexdigest()
             last_sent = self.storage.load_event(self.feed, event_id)
-            re_alert = self.cfg.get('re_alert', rssalertbot.RE_ALERT_DEFAULT)
-            should_delete_message = False
 
-            if entry.published > now:
-                if last_sent and now < last_sent.add(hours=re_alert):
-                    continue
-                self.storage.save_event(self.feed, event_id, now)
-            else:
-                if entry.published > new_date:
-                    new_date = entry.published
-                should_delete_message = last_sent
+            # skip future events we've alerted on recently
+            if entry.published > now and last_sent and now < last_sent.add(hours=re_alert):
+                continue
 
             self.log.debug("Found new entry %s", entry.published)
+            new_entries.append((entry, event_id, last_sent))
+
+        self.stats.entries_new = len(new_entries)
+
+        # alert oldest first, so the stored date only moves forward
+        # over entries which have been delivered
+        new_entries.sort(key=lambda e: e[0].published)
+
+        # work out the slack alert levels for all of them at once
+        if new_entries and self.outputs.get('slack.enabled'):
+            rssalertbot.alerts.classify_entries(self.outputs.get('slack'), [e[0] for e in new_entries])
+
+        deliveries = []
+        for entry, event_id, _ in new_entries:
+            deliveries.append(await self._dispatch_once(entry, event_id, now))
+
+        # don't wait for alerts still being sent here, which would hold up
+        # other feeds waiting for our scheduler slot, and digests may not be
+        # sent until the end of the run: see :py:meth:`save_progress`
+        if not all(delivery.done() for delivery in deliveries):
+            self.progress = asyncio.create_task(
+                self.save_progress(previous_date, now, new_entries, deliveries))
+            self.log.info("End processing feed %s, saving progress once alerts are sent", self.name)
+            return
+
+        await self.save_progress(previous_date, now, new_entries, deliveries)
 
-            # alert on it
-            await self.alert(entry)
-            if new_date > last_sent_message_date:
+
+    async def save_progress(self, previous_date, now, new_entries, deliveries):
+        """
+        Save our progress, as the alerts are delivered: the stored date
+        only moves past entries which were delivered.
+
+        Args:
+            previous_date (:py:class:`pendulum.DateTime`): the stored date
+            now (:py:class:`pendulum.DateTime`): when processing started
+            new_entries (list): ``(entry, event_id, last_sent)`` for each new entry
+            deliveries (list):  the :py:class:`asyncio.Future` for each one's alert
+        """
+        new_date = previous_date
+        failed = False
+        for (entry, event_id, last_sent), delivery in zip(new_entries, deliveries):
+            try:
+                delivered = await delivery
+            except Exception:
+                self.log.exception("Error alerting on entry %s", entry.published)
+                delivered = False
+
+            if not delivered:
+                self.log.warning("Alert for entry %s not delivered, will retry next run", entry.published)
+                failed = True
+                continue
+
+            if entry.published > now:
+                self.storage.save_event(self.feed, event_id, now)
+                continue
+
+            # don't move past an entry that wasn't delivered
+            if not failed and entry.published > new_date:
+                new_date = entry.published
                 self.storage.save_date(self.feed, new_date)
-                last_sent_message_date = new_date
 
-            if should_delete_message:
+            if last_sent:
                 self.log.debug(f"Deleting stored date for message {event_id}")
                 self.storage.delete_event(self.feed, event_id)
 
         self.log.info("End processing feed %s, previous date %s", self.name, new_date)
 
 
+    async def _dispatch_once(self, entry, event_id, now):
+        """
+        Dispatch the entry, unless deduplication is on and an identical
+        entry has already been alerted on, in which case we go with the
+        delivery of that one.
+
+        Returns:
+            asyncio.Future: resolves to whether the alert was delivered
+        """
+        if not (self.dedup and self.dedup_cfg.get('enabled')):
+            return await self._dispatch(entry)
+
+        window = self.dedup_cfg.get('window', rssalertbot.RE_ALERT_DEFAULT)
+        delivery = self.dedup.check(self.dedup_scope, event_id, now, window)
+        if delivery:
+            self.log.info("Skipping entry %s, already alerted on in another feed", entry.published)
+            return delivery
+
+        # claim it before dispatching, which may have to wait
+        delivery = asyncio.get_running_loop().create_future()
+        self.dedup.claim(self.dedup_scope, event_id, now, delivery)
+
+        def on_delivery(future):
+            if not delivery.done():
+                delivery.set_result(not future.cancelled() and not future.exception() and bool(future.result()))
+
+        try:
+            (await self._dispatch(entry)).add_done_callback(on_delivery)
+        except BaseException:
+            delivery.set_result(False)
+            raise
+        return delivery
+
+
+    async def _dispatch(self, entry):
+        """
+        Hand the entry to the dispatcher, or if we don't have one,
+        alert on it right here.
+
+        Returns:
+            asyncio.Future: resolves to whether the alert was delivered
+        """
+        if self.dispatcher:
+            future = await self.dispatcher.submit(self.alert, entry, priority=self.priority)
+            self.queued.append(future)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            try:
+                future.set_result(await self.alert(entry))
+            except Exception as e:
+                future.set_exception(e)
+
+        return _follow_digest(future) if self.digests else future
+
+
     async def alert(self, entry):
         """
-        Alert with this entry.
+        Alert with this entry, to all enabled outputs at once.
+
+        Returns:
+            bool: whether all outputs delivered the alert, or if any added
+            it to a digest, an :py:class:`asyncio.Future` resolving to that
         """
 
         if self.outputs.get('log.enabled'):
-            rssalertbot.alerts.alert_log(self, self.outputs.get('log'), entry)
+            with metrics.ALERT_SECONDS.time(output='log'):
+                rssalertbot.alerts.alert_log(self, self.outputs.get('log'), entry)
+            metrics.ALERTS.inc(output='log', result='delivered')
+            self.stats.alerts_sent += 1
 
+        outputs = []
         if self.outputs.get('email.enabled'):
-            rssalertbot.alerts.alert_email(self, self.outputs.get('email'), entry)
+            outputs.append(self._timed_alert(
+                'email', rssalertbot.alerts.alert_email(self, self.outputs.get('email'), entry)))
 
         if self.outputs.get('slack.enabled'):
-            await rssalertbot.alerts.alert_slack(self, self.outputs.get('slack'), entry)
+            outputs.append(self._timed_alert(
+                'slack', rssalertbot.alerts.alert_slack(self, self.outputs.get('slack'), entry)))
+
+        results = await asyncio.gather(*outputs)
+        digests = [result for result in results if asyncio.isfuture(result)]
+        if not digests:
+            return all(results)
+        if not all(result for result in results if not asyncio.isfuture(result)):
+            return False
+        return all_sent(digests)
+
+
+    async def _timed_alert(self, output, alert):
+        """Await an alert, recording how long it took and whether it was delivered."""
+        result = 'error'
+        try:
+            with metrics.ALERT_SECONDS.time(output=output):
+                delivered = await alert
+            if asyncio.isfuture(delivered):
+                # added to a digest, we'll know once it's sent
+                result = None
+                delivered.add_done_callback(lambda sent: self._count_alert(
+                    output, 'delivered' if not sent.cancelled() and sent.result() else 'failed'))
+            else:
+                result = 'delivered' if delivered else 'failed'
+            return delivered
+        finally:
+            if result:
+                self._count_alert(output, result)
+
+
+    def _count_alert(self, output, result):
+        metrics.ALERTS.inc(output=output, result=result)
+        if result == 'delivered':
+            self.stats.alerts_sent += 1
+        else:
+            self.stats.alerts_failed += 1
 
 
     def format_timestamp_local(self, timestamp):
@@ -0,0 +1,153 @@
+"""
+Entry filtering.
+
+Groups and feeds can have ``filter`` rules saying which entries they care
+about, ex: only the services we use from a big vendor feed.  Entries the
+rules rule out are dropped as soon as they're parsed, before we look them
+up in storage or alert on them.
+"""
+
+import functools
+import json
+import re
+
+from .classify import keyword_pattern
+
+# what the rules can match on
+FILTER_RULES = ('title', 'body', 'keywords', 'category')
+
+
+class Matcher:
+    """
+    Matches entries against one set of rules.  All the rules for a field
+    are compiled into a single regular expression, so checking an entry is
+    one search of each field however many rules there are.
+
+    Args:
+        title (list):    regular expressions to look for in the title
+        body (list):     regular expressions to look for in the description
+        keywords (list): keywords to look for in either, case-insensitively
+        category (list): categories, case-insensitively
+
+    Raises:
+        re.error: if one of the regular expressions is bad
+    """
+
+    def __init__(self, title=(), body=(), keywords=(), category=()):
+        keywords = f'(?i:{keyword_pattern(keywords)})' if keywords else None
+        self.title = _compile(title, keywords)
+        self.body = _compile(body, keywords)
+        self.categories = frozenset(c.lower() for c in category)
+
+
+    def __bool__(self):
+        return bool(self.title or self.body or self.categories)
+
+
+    def matches(self, entry) -> bool:
+        """Does the entry match any of the rules?"""
+        if self.title and self.title.search(entry.get('title') or ''):
+            return True
+        if self.body and self.body.search(entry.get('description') or ''):
+            return True
+        if self.categories:
+            return any((tag.get('term') or '').lower() in self.categories
+                       for tag in entry.get('tags') or ())
+        return False
+
+
+class EntryFilter:
+    """
+    Decides which entries to alert on: those matching any of the
+    ``include`` rules, if there are any, and none of the ``exclude`` rules.
+
+    Args:
+        include (dict): rules, see :py:class:`Matcher`
+        exclude (dict): rules, see :py:class:`Matcher`
+    """
+
+    def __init__(self, include=None, exclude=None):
+        self.include = Matcher(**(include or {}))
+        self.exclude = Matcher(**(exclude or {}))
+
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+
+
+    def __call__(self, entry) -> bool:
+        """
+        Should we alert on this entry?
+
+        Args:
+            entry: the feed entry
+
+        Returns:
+            bool: whether it passes the filter
+        """
+        if self.include and not self.include.matches(entry):
+            return False
+        return not self.exclude.matches(entry)
+
+
+def _compile(patterns, keywords=None):
+    patterns = [f'(?:{p})' for p in patterns]
+    if keywords:
+        patterns.append(keywords)
+    return re.compile('|'.join(patterns)) if patterns else None
+
+
+def combine_rules(*configs) -> dict:
+    """
+    Combine filter configs, ex: a group's and a feed's, by adding their
+    rules together: entries are included by any of the ``include`` rules
+    and excluded by any of the ``exclude`` rules.
+
+    Args:
+        configs (dict): ``filter`` configs, or None
+
+    Returns:
+        dict: ``{'include': rules, 'exclude': rules}``
+
+    Raises:
+        ValueError: if there's a rule we don't know
+    """
+    combined = {'include': {}, 'exclude': {}}
+    for config in configs:
+        for side, rules in (config or {}).items():
+            if side not in combined:
+                raise ValueError(f"Unknown filter {side!r}, expected 'include' or 'exclude'")
+            for rule, values in (rules or {}).items():
+                if rule not in FILTER_RULES:
+                    raise ValueError(f"Unknown filter rule {rule!r}, expected one of {', '.join(FILTER_RULES)}")
+                if isinstance(values, str):
+                    values = [values]
+                combined[side].setdefault(rule, []).extend(values)
+    return combined
+
+
+@functools.lru_cache(maxsize=128)
+def _get_filter(rules):
+    entry_filter = EntryFilter(**json.loads(rules))
+    return entry_filter if entry_filter else None
+
+
+def get_entry_filter(*configs):
+    """
+    Get the filter for a feed, compiling it only once for each distinct
+    set of rules, ex: once for all the feeds in a group.
+
+    Args:
+        configs (dict): ``filter`` configs, or None
+
+    Returns:
+        :py:class:`EntryFilter`: the filter, or None if there are no rules
+
+    Raises:
+        ValueError: if the rules are bad
+    """
+    rules = combine_rules(*configs)
+    try:
+        return _get_filter(json.dumps(rules, sort_keys=True))
+    except re.error as e:
+        raise ValueError(f"Bad filter regex: {e}") from e
@@ -0,0 +1,131 @@
+"""
+HTTP/2 feed fetching.
+
+Lots of feeds often come from the same few hosts, ex: status.aws.amazon.com.
+Over HTTP/1.1 each fetch needs a connection of its own, and we're limited
+to so many per host; with HTTP/2 all the fetches from a host share one
+connection.  Fetching with HTTP/2 needs the ``http2`` extra
+(``httpx[http2]``), hosts which don't support it are fetched with HTTP/1.1
+as usual.
+"""
+
+import contextvars
+import logging
+
+log = logging.getLogger(__name__)
+
+HTTP2_MAX_CONNECTIONS = 100
+
+# the HTTP/2 fetcher for this run, if any
+current_fetcher = contextvars.ContextVar('current_fetcher', default=None)
+
+
+class HTTP2Fetcher:
+    """
+    Fetches feeds with one shared :py:class:`httpx.AsyncClient`, which
+    multiplexes requests to the same host over one HTTP/2 connection.
+
+    Args:
+        max_connections (int): maximum connections open at once, for
+                               hosts we fetch from with HTTP/1.1
+
+    Raises:
+        ImportError: if ``httpx`` or ``h2`` isn't installed
+    """
+
+    def __init__(self, max_connections=HTTP2_MAX_CONNECTIONS):
+        import httpx
+
+        # no timeout of its own, the feed's fetch timeout applies as usual,
+        # and follow redirects like aiohttp does
+        self.client = httpx.AsyncClient(
+            http2            = True,
+            limits           = httpx.Limits(max_connections=max_connections),
+            timeout          = None,
+            follow_redirects = True,
+        )
+
+
+    def session(self, username=None, headers=None):
+        """
+        Make a session for fetching a feed, sharing the client's connections.
+
+        Args:
+            username (str): unused, for compatibility with
+                            :py:meth:`rssalertbot.replay.Replay.session`
+            headers (dict): headers for the feed's requests
+        """
+        return HTTP2Session(self.client, headers)
+
+
+    async def close(self):
+        """Close all the connections."""
+        await self.client.aclose()
+
+
+class HTTP2Session:
+    """
+    Stands in for an :py:class:`aiohttp.ClientSession`, fetching with an
+    :py:class:`httpx.AsyncClient`.
+    """
+
+    def __init__(self, client, headers=None):
+        self.client = client
+        self.headers = headers
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+    def get(self, url):
+        return _ResponseContext(self.client, self.client.build_request('GET', url, headers=self.headers))
+
+
+class HTTP2Response:
+    """
+    Stands in for an :py:class:`aiohttp.ClientResponse`.
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.status = response.status_code
+        self.headers = response.headers
+        self.raw_headers = response.headers.raw
+
+
+    def get_encoding(self):
+        return self.response.encoding
+
+
+    async def read(self):
+        return await self.response.aread()
+
+
+    async def text(self):
+        await self.response.aread()
+        return self.response.text
+
+
+class _ResponseContext:
+    """``async with session.get(url) as response``, for httpx"""
+
+    def __init__(self, client, request):
+        self.client = client
+        self.request = request
+        self.response = None
+
+
+    async def __aenter__(self):
+        self.response = await self.client.send(self.request, stream=True)
+        log.debug("Fetched %s with %s", self.request.url, self.response.http_version)
+        return HTTP2Response(self.response)
+
+
+    async def __aexit__(self, *exc):
+        if self.response is not None:
+            await self.response.aclose()
@@ -0,0 +1,179 @@
+"""
+Event loop lag monitoring.
+
+Anything synchronous run on the event loop - a storage call, parsing a
+big feed - holds up every other feed while it runs, which can make fetches
+look like they've timed out when it's really us.  The monitor measures how
+late the loop is at waking up a sleeping task, and has a watchdog thread
+which logs what the loop is busy doing when it's blocked for too long.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+LAG_INTERVAL  = 0.05
+LAG_THRESHOLD = 0.25
+
+
+# the feed each task is working on, set from the loop thread, as the
+# watchdog can't safely look into the loop's frames or context
+_task_feeds = {}
+
+
+def set_feed(feed):
+    """
+    Say the current task is working on this feed, until :py:func:`clear_feed`.
+
+    Args:
+        feed (:py:class:`rssalertbot.feed.Feed`): the feed
+
+    Returns:
+        asyncio.Task: the task, for :py:func:`clear_feed`
+    """
+    task = asyncio.current_task()
+    _task_feeds[task] = feed
+    return task
+
+
+def clear_feed(task):
+    """Say a task is done with its feed."""
+    _task_feeds.pop(task, None)
+
+
+def find_feed(loop):
+    """
+    Find the feed that the task the loop is running is working on.  Only
+    reads what the loop thread publishes, so it's safe from other threads.
+
+    Args:
+        loop: the event loop
+
+    Returns:
+        :py:class:`rssalertbot.feed.Feed`: the feed, or None
+    """
+    return _task_feeds.get(asyncio.current_task(loop))
+
+
+def percentile(values, pct):
+    """
+    The ``pct`` percentile of already sorted ``values``, nearest-rank.
+    """
+    if not values:
+        return None
+    rank = max(int(round(pct / 100 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class LagMonitor:
+    """
+    Monitors the running event loop.
+
+    Args:
+        threshold (float):  log the stack when the loop is blocked for
+                            longer than this, in seconds; also used for
+                            asyncio's slow callback warnings
+        interval (float):   how often to measure, in seconds
+        debug (bool):       turn on asyncio's debug mode, which logs slow
+                            callbacks, at some cost in speed
+    """
+
+    def __init__(self, threshold=LAG_THRESHOLD, interval=LAG_INTERVAL, debug=False):
+        self.threshold = threshold
+        self.interval = interval
+        self.debug = debug
+
+        self.lags = []
+        self.blocks = 0
+        self.loop = None
+        self.task = None
+        self.thread = None
+        self.thread_id = None
+        self.heartbeat = None
+        self.stopped = threading.Event()
+
+
+    def start(self):
+        """Start monitoring.  Must be called from within the running event loop."""
+        self.loop = asyncio.get_running_loop()
+        if self.debug:
+            self.loop.set_debug(True)
+            self.loop.slow_callback_duration = self.threshold
+
+        self.thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.task = self.loop.create_task(self._measure())
+        self.thread = threading.Thread(target=self._watch, name='rssalertbot-lag-monitor', daemon=True)
+        self.thread.start()
+
+
+    async def _measure(self):
+        while True:
+            start = self.loop.time()
+            await asyncio.sleep(self.interval)
+            self.heartbeat = time.monotonic()
+            lag = max(self.loop.time() - start - self.interval, 0)
+            self.lags.append(lag)
+            metrics.LOOP_LAG_SECONDS.observe(lag)
+
+
+    def _watch(self):
+        reported = None
+        while not self.stopped.wait(self.interval):
+            heartbeat = self.heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked > self.threshold and heartbeat != reported:
+                # only once for each time it's blocked
+                reported = heartbeat
+                self.blocks += 1
+                self._report(blocked)
+
+
+    def _report(self, blocked):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+
+        stack = ''.join(traceback.format_stack(frame))
+        del frame
+        feed = find_feed(self.loop)
+
+        if feed:
+            feed.log.warning("Event loop blocked for %.3fs by feed %s, at:\n%s",
+                             blocked, feed.name, stack.rstrip())
+        else:
+            log.warning("Event loop blocked for %.3fs, at:\n%s", blocked, stack.rstrip())
+
+
+    async def stop(self):
+        """Stop monitoring."""
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: the lag percentiles and maximum in seconds, and how many
+            times the loop was blocked for longer than the threshold
+        """
+        lags = sorted(self.lags)
+        return {
+            'samples':  len(lags),
+            'p50':      percentile(lags, 50),
+            'p90':      percentile(lags, 90),
+            'p99':      percentile(lags, 99),
+            'max':      lags[-1] if lags else None,
+            'blocked':  self.blocks,
+        }
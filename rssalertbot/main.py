@@ -1,11 +1,25 @@
 import argparse
 import asyncio
 import logging
+import pendulum
+import time
 
 import rssalertbot
-from .config    import Config
-from .feed      import Feed
+from .          import metrics, profiling, report, senders, snapshot
+from .bloom     import BLOOM_CAPACITY, BLOOM_ERROR_RATE
+from .coalesce  import SharedFetches
+from .config    import Config, freeze
+from .deadline  import Deadline
+from .dedup     import DedupIndex, DEDUP_EXPIRE_INTERVAL
+from .dispatch  import Dispatcher, DISPATCH_QUEUE_SIZE, DISPATCH_WORKERS
+from .feed      import Feed, resolve_dedup, resolve_groups
+from .http2     import HTTP2Fetcher, current_fetcher, HTTP2_MAX_CONNECTIONS
 from .locking   import LockError
+from .logs      import JSONFormatter, LogQueue
+from .looplag   import LagMonitor, LAG_THRESHOLD
+from .outbox    import Outbox, current_outbox, OUTBOX_DRAIN_TIMEOUT, OUTBOX_MAX_AGE, OUTBOX_WORKERS
+from .replay    import Recorder, Replay, current_archive
+from .scheduler import Scheduler, run_feeds
 
 
 log = logging.getLogger(__name__)
@@ -18,8 +32,26 @@ def get_argparser():
                            help="config file (default: ./config.json)")
     argparser.add_argument('-t', '--feed_timeout', type=str, default=rssalertbot.FEED_TIMEOUT,
                            help=f"feed processing timeout in seconds (default: {rssalertbot.FEED_TIMEOUT})")
+    argparser.add_argument('--deadline', type=float, metavar='SECONDS',
+                           help="stop the run SECONDS after it starts, cancelling feeds not yet done")
     argparser.add_argument('--no-notify', action='store_true',
                            help="Disable all notifications globally")
+    argparser.add_argument('--config-cache', metavar='FILE',
+                           help="cache the loaded config in FILE, and reuse it while the config files are unchanged")
+
+    argparser.add_argument('--profile', metavar='DIR',
+                           help="profile the run, writing pstats and collapsed stack files to DIR")
+
+    argparser.add_argument('--report', metavar='FILE',
+                           help="write a JSON report of the run to FILE")
+
+    replay = argparser.add_mutually_exclusive_group()
+    replay.add_argument('--record', metavar='DIR',
+                        help="record every feed's response to an archive in DIR")
+    replay.add_argument('--replay', metavar='DIR',
+                        help="fetch feeds from the archive in DIR, recorded with --record, not the network")
+    argparser.add_argument('--replay-latency', action='store_true',
+                           help="with --replay, take as long as each fetch did when recorded")
 
     argparser.add_argument('-v', action='count',
                            help="Verbose - repeat for increased debugging")
@@ -70,6 +102,50 @@ def setup_locking(config):
     return FileLocker()
 
 
+def setup_outbox(config):
+    if not config.get('enabled'):
+        return None
+
+    log.info("Using an outbox for alerts")
+    return Outbox(
+        path    = config.get('path', '/var/run/rss_state'),
+        workers = config.get('workers', OUTBOX_WORKERS),
+        max_age = config.get('max_age', OUTBOX_MAX_AGE),
+        fsync   = config.get('fsync', True),
+    )
+
+
+def setup_fetcher(config):
+    if not config.get('http2'):
+        return None
+
+    try:
+        fetcher = HTTP2Fetcher(
+            max_connections = config.get('max_connections', HTTP2_MAX_CONNECTIONS),
+        )
+    except ImportError:
+        log.error("Python package 'httpx[http2]' not installed, fetching with HTTP/1.1")
+        return None
+
+    log.info("Fetching with HTTP/2 where supported")
+    return fetcher
+
+
+def setup_logging(config):
+    if config.get('format') == 'json':
+        formatter = JSONFormatter()
+        for handler in logging.getLogger().handlers:
+            handler.setFormatter(formatter)
+
+    if not config.get('queue'):
+        return None
+
+    log_queue = LogQueue()
+    log_queue.start()
+    log.info("Logging from a background thread")
+    return log_queue
+
+
 def main():
 
     argparser = get_argparser()
@@ -82,58 +158,282 @@ def main():
     logging.getLogger('urllib3').setLevel(logging.WARNING)
     logging.getLogger('chardet').setLevel(logging.WARNING)
 
-    # load the config
-    cfg = Config()
-    for cfgfile in opts.config:
-        cfg.load(cfgfile)
-    if cfg.get('loglevel'):
-        log.setLevel(logging.getLevelName(cfg.get('loglevel')))
-
-    # override log level if specified on command-line
-    if opts.v:
-        if opts.v >= 3:
-            log.setLevel(logging.DEBUG)
-        elif opts.v == 2:
-            log.setLevel(logging.INFO)
-        elif opts.v == 1:
-            log.setLevel(logging.WARNING)
-
-    # set some global options
+    # global options from the command line
+    overrides = {}
     if opts.feed_timeout:
-        cfg.set('timeout', int(opts.feed_timeout if opts.feed_timeout else 0))
+        overrides['timeout'] = int(opts.feed_timeout if opts.feed_timeout else 0)
+    if opts.deadline:
+        overrides['deadline.seconds'] = opts.deadline
     if opts.no_notify:
-        cfg.set('no_notify', False)
+        overrides['no_notify'] = False
 
-    # here we go
-    asyncio.run(run(opts, cfg))
+    profiler = None
+    log_queue = None
+    if opts.profile:
+        profiler = profiling.Profiler(opts.profile)
+        profiling.current_profiler.set(profiler)
+        profiler.start()
 
+    try:
+        # load the config
+        with profiling.phase('config'):
+            cfg, groups = load_config(opts.config, overrides, opts.config_cache)
+        log_queue = setup_logging(cfg.get('logging', {}))
+        if cfg.get('loglevel'):
+            log.setLevel(logging.getLevelName(cfg.get('loglevel')))
+
+        # override log level if specified on command-line
+        if opts.v:
+            if opts.v >= 3:
+                log.setLevel(logging.DEBUG)
+            elif opts.v == 2:
+                log.setLevel(logging.INFO)
+            elif opts.v == 1:
+                log.setLevel(logging.WARNING)
+
+        # here we go
+        asyncio.run(run(opts, cfg, groups))
+    finally:
+        if profiler:
+            profiler.stop()
+        if log_queue:
+            log_queue.stop()
+
+
+def load_config(cfgfiles, overrides=None, cache=None):
+    """
+    Load the config and resolve the feed groups - or, with ``cache``, load
+    them from the snapshot there if the config files haven't changed.
+
+    Args:
+        cfgfiles (list):  config file or directory paths
+        overrides (dict): config values set on the command line
+        cache (str):      config snapshot file
+
+    Returns:
+        tuple: ``(cfg, groups)``, the read-only config and the
+        ``(group, outputs)`` for each feed group
+    """
+    if cache:
+        fp = snapshot.fingerprint(cfgfiles, overrides)
+        loaded = snapshot.load_snapshot(cache, fp)
+        if loaded:
+            return loaded
+
+    cfg = Config.from_files(cfgfiles)
+    for key, value in (overrides or {}).items():
+        cfg.set(key, value)
+    cfg = freeze(cfg)
+    groups = resolve_groups(cfg)
+
+    if cache:
+        snapshot.save_snapshot(cache, fp, cfg, groups)
+    return cfg, groups
+
+
+async def run(opts, cfg, groups=None):
+
+    metrics_cfg = cfg.get('metrics', {})
+    server = None
+    if metrics_cfg.get('port'):
+        server = await metrics.REGISTRY.start_server(
+            port = metrics_cfg.get('port'),
+            host = metrics_cfg.get('host', '127.0.0.1'),
+        )
+
+    monitor = None
+    if cfg.get('loop_monitor.enabled'):
+        monitor = LagMonitor(
+            threshold = cfg.get('loop_monitor.threshold', LAG_THRESHOLD),
+            debug     = cfg.get('loop_monitor.debug', False),
+        )
+        monitor.start()
+
+    archive = None
+    if opts.record:
+        archive = Recorder(opts.record)
+    elif opts.replay:
+        archive = Replay(opts.replay, latency=opts.replay_latency)
+    current_archive.set(archive)
+
+    deadline = Deadline(
+        seconds  = cfg.get('deadline.seconds'),
+        delivery = cfg.get('deadline.delivery'),
+    )
+
+    started = pendulum.now('UTC')
+    start = time.perf_counter()
+    feeds = []
+    try:
+        feeds = await process_feeds(cfg, groups, deadline)
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.RUN_SECONDS.set(seconds)
+        metrics.LAST_RUN.set(time.time())
+        if archive:
+            archive.close()
+
+        extra = {}
+        if monitor:
+            await monitor.stop()
+            extra['loop_lag'] = monitor.summary()
+
+        summary = report.build_report(feeds, started, seconds, **extra)
+        log.info("Run finished in %.1fs: %s", seconds, ', '.join(
+            f'{k} {v}' for k, v in summary['totals'].items() if k in report.SUMMARY_TOTALS))
+        if monitor:
+            lag = extra['loop_lag']
+            log.info("Event loop lag: p50 %s, p90 %s, p99 %s, max %s, blocked %d times",
+                     *(_ms(lag[k]) for k in ('p50', 'p90', 'p99', 'max')), lag['blocked'])
+        if opts.report:
+            try:
+                report.write_report(opts.report, summary)
+            except OSError as e:
+                log.error("Can't write run report to %s: %s", opts.report, e)
+        if server:
+            await server.cleanup()
+        if metrics_cfg.get('textfile'):
+            try:
+                metrics.REGISTRY.write_textfile(metrics_cfg.get('textfile'))
+            except OSError as e:
+                log.error("Can't write metrics to %s: %s", metrics_cfg.get('textfile'), e)
+
+
+def _ms(seconds):
+    return 'n/a' if seconds is None else f'{seconds * 1000:.1f}ms'
+
+
+async def _close_senders(deadline):
+    try:
+        await asyncio.wait_for(senders.close_all(), deadline.remaining())
+    except asyncio.TimeoutError:
+        log.warning("Alerts still being sent at the run deadline were cancelled")
 
-async def run(opts, cfg):
 
-    storage = setup_storage(cfg.get('storage', {}))
-    locker = setup_locking(cfg.get('locking', {}))
+async def _save_progress(feeds, deadline):
+    """Wait for feeds saving their progress once their alerts are sent."""
+    tasks = [feed.progress for feed in feeds if feed.progress]
+    if not tasks:
+        return
 
-    tasks = []
-    for group in cfg.get('feedgroups', []):
+    done, pending = await asyncio.wait(tasks, timeout=deadline.remaining())
+    if pending:
+        # they'll pick up the same entries again next run
+        log.warning("Run deadline reached, not saving the progress of %d feeds", len(pending))
+        for task in pending:
+            task.cancel()
+    for task in done:
+        if not task.cancelled() and task.exception():
+            log.error("Error saving feed progress", exc_info=task.exception())
+
+
+async def process_feeds(cfg, groups=None, deadline=None):
+    """
+    Process all the feeds.
+
+    Args:
+        cfg (dict):          the config
+        groups (list):       the resolved feed groups, from :py:func:`resolve_groups`
+        deadline (Deadline): the run deadline, if any
+
+    Returns:
+        list: the :py:class:`rssalertbot.feed.Feed` objects
+    """
+    if groups is None:
+        groups = resolve_groups(cfg)
+    if deadline is None:
+        deadline = Deadline()
+
+    with profiling.phase('storage'):
+        storage = setup_storage(cfg.get('storage', {}))
+        locker = setup_locking(cfg.get('locking', {}))
+    dispatcher = Dispatcher(
+        workers    = cfg.get('dispatch.workers', DISPATCH_WORKERS),
+        queue_size = cfg.get('dispatch.queue_size', DISPATCH_QUEUE_SIZE),
+    )
+
+    outbox = setup_outbox(cfg.get('outbox', {}))
+    dedup = DedupIndex(storage)
+    fetches = SharedFetches()
+
+    feeds = []
+    for group, outputs in groups:
+        dedup_cfg = resolve_dedup(cfg, group)
         for f in group['feeds']:
-            feed = Feed(
-                cfg      = cfg,
-                storage  = storage,
-                group    = group,
-                name     = f['name'],
-                url      = f['url'])
-
-            # create the async task
-            tasks.append(feed.process(timeout = cfg.get('timeout')))
+            feeds.append(Feed(
+                cfg        = cfg,
+                storage    = storage,
+                group      = group,
+                name       = f['name'],
+                url        = f['url'],
+                dispatcher = dispatcher,
+                dedup      = dedup,
+                outputs    = outputs,
+                priority   = f.get('priority'),
+                fetches    = fetches,
+                filters    = f.get('filter'),
+                dedup_cfg  = dedup_cfg))
 
     try:
-        lock = locker.acquire_lock('rssalertbot-main', 'rssalertbot')
+        with metrics.LOCK_WAIT_SECONDS.time(backend=type(locker).__name__):
+            lock = locker.acquire_lock('rssalertbot-main', 'rssalertbot')
     except LockError:
         log.warning("Lock not acquired, skipping this run.")
-        return
+        return feeds
 
     # now we wait for the tasks to finish
     try:
-        await asyncio.wait(tasks)
+        if cfg.get('storage.event_filter.enabled'):
+            with profiling.phase('storage'):
+                storage.open_event_filter(
+                    capacity   = cfg.get('storage.event_filter.capacity', BLOOM_CAPACITY),
+                    error_rate = cfg.get('storage.event_filter.error_rate', BLOOM_ERROR_RATE),
+                )
+
+        fetcher = setup_fetcher(cfg.get('fetch', {}))
+        current_fetcher.set(fetcher)
+
+        if outbox:
+            for feed in feeds:
+                outbox.add_token(feed.outputs.get('slack.token'))
+            outbox.open()
+            current_outbox.set(outbox)
+
+        try:
+            await run_feeds(feeds, cfg.get('timeout'), deadline,
+                            Scheduler(concurrency = cfg.get('scheduler.concurrency')))
+        finally:
+            if fetcher:
+                await fetcher.close()
+
+        # deliver anything still queued
+        await dispatcher.close(timeout = deadline.remaining())
+        await _close_senders(deadline)
+
+        # now the alerts and digests are sent, the feeds waiting on them can save their progress
+        await _save_progress(feeds, deadline)
+        if outbox:
+            drain_timeout = cfg.get('outbox.drain_timeout', OUTBOX_DRAIN_TIMEOUT)
+            if deadline.end is not None:
+                drain_timeout = min(drain_timeout, deadline.remaining())
+            await outbox.close(timeout = drain_timeout)
+            await _close_senders(deadline)
+            await outbox.acked(timeout = deadline.remaining())
+
+        # forget deduplicated entries once they're out of their window
+        windows = {}
+        for feed in feeds:
+            if feed.dedup_cfg.get('enabled'):
+                window = feed.dedup_cfg.get('window', rssalertbot.RE_ALERT_DEFAULT)
+                windows[feed.dedup_scope] = max(window, windows.get(feed.dedup_scope, 0))
+        if windows:
+            with profiling.phase('storage'):
+                dedup.expire(pendulum.now('UTC'), windows,
+                             interval = cfg.get('dedup.expire_interval', DEDUP_EXPIRE_INTERVAL))
     finally:
-        lock.release()
+        try:
+            storage.close_event_filter()
+        finally:
+            lock.release()
+
+    return feeds
@@ -0,0 +1,277 @@
+"""
+Run metrics, in the Prometheus text format.
+
+The metrics are kept in memory for the run, and can be written out to a
+file at the end of it - ex: for node_exporter's textfile collector - or
+scraped from a local HTTP endpoint while the run is going.
+"""
+
+import bisect
+import contextlib
+import logging
+import os
+import tempfile
+import time
+
+log = logging.getLogger(__name__)
+
+# in seconds
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+# in bytes
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base class for metrics.
+
+    Args:
+        name (str):    metric name
+        help (str):    description
+        labels (list): label names
+    """
+    type = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.values = {}
+
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} needs labels {self.labelnames}, got {tuple(labels)}")
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError:
+            raise ValueError(f"{self.name} needs labels {self.labelnames}, got {tuple(labels)}") from None
+
+
+    def clear(self):
+        """Forget all the values."""
+        self.values = {}
+
+
+    def samples(self):
+        """
+        Yields:
+            tuple: ``(name, labels, value)`` for each sample
+        """
+        for key, value in sorted(self.values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+    def render(self) -> str:
+        """Render in the text format."""
+        lines = [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(Metric):
+    """A value which only goes up."""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Add ``amount`` to the counter."""
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value which can be set to anything."""
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        """Set the gauge."""
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    Counts observations into buckets.
+
+    Args:
+        name (str):       metric name
+        help (str):       description
+        labels (list):    label names
+        buckets (tuple):  upper bounds of the buckets, in order
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+
+    def observe(self, value, **labels):
+        """Record an observation."""
+        key = self._key(labels)
+        counts = self.values.get(key)
+        if counts is None:
+            # a count per bucket (and one for +Inf), then the sum
+            counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """
+        Observe how long the ``with`` block takes, in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+    def samples(self):
+        for key, counts in sorted(self.values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                total += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                yield f'{self.name}_bucket', labels, total
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum', labels, counts[-1]
+            yield f'{self.name}_count', labels, total
+
+
+class Registry:
+    """
+    A set of metrics.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+
+    def gauge(self, name, help, labels=()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+
+    def clear(self):
+        """Forget the values of all the metrics."""
+        for metric in self.metrics:
+            metric.clear()
+
+
+    def render(self) -> str:
+        """Render all the metrics in the text format."""
+        return ''.join(metric.render() for metric in self.metrics)
+
+
+    def write_textfile(self, path):
+        """
+        Write the metrics to a file.  The file is replaced atomically, so
+        a collector never sees half of it.
+
+        Args:
+            path (str): file path, should end in ``.prom`` for node_exporter
+        """
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.metrics-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.render())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+    async def start_server(self, port, host='127.0.0.1'):
+        """
+        Serve the metrics over HTTP, at ``/metrics``.
+
+        Args:
+            port (int): port to listen on
+            host (str): address to listen on
+
+        Returns:
+            :py:class:`aiohttp.web.AppRunner`: call ``cleanup()`` to stop
+        """
+        from aiohttp import web
+
+        async def handler(request):
+            return web.Response(body=self.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+        app = web.Application()
+        app.router.add_get('/metrics', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        log.info("Serving metrics on http://%s:%s/metrics", host, port)
+        return runner
+
+
+REGISTRY = Registry()
+
+FETCHES = REGISTRY.counter(
+    'rssalertbot_fetches_total', "Feed fetches, by host and HTTP status", ('host', 'status'))
+FETCH_SECONDS = REGISTRY.histogram(
+    'rssalertbot_fetch_seconds', "Time taken to fetch feeds", ('host',))
+PARSE_SECONDS = REGISTRY.histogram(
+    'rssalertbot_parse_seconds', "Time taken to parse feeds")
+PARSE_BYTES = REGISTRY.histogram(
+    'rssalertbot_parse_bytes', "Size of the feeds parsed", buckets=SIZE_BUCKETS)
+STORAGE_SECONDS = REGISTRY.histogram(
+    'rssalertbot_storage_seconds', "Time taken by storage operations", ('backend', 'op'))
+LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    'rssalertbot_lock_wait_seconds', "Time taken to acquire the run lock", ('backend',))
+ALERTS = REGISTRY.counter(
+    'rssalertbot_alerts_total', "Alerts sent, by output and result", ('output', 'result'))
+ALERT_SECONDS = REGISTRY.histogram(
+    'rssalertbot_alert_seconds', "Time taken to send alerts", ('output',))
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    'rssalertbot_loop_lag_seconds', "How late the event loop was, when monitored",
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+RUN_SECONDS = REGISTRY.gauge(
+    'rssalertbot_run_duration_seconds', "Time taken by the last run")
+LAST_RUN = REGISTRY.gauge(
+    'rssalertbot_last_run_timestamp_seconds', "When the last run finished")
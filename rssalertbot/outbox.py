@@ -0,0 +1,434 @@
+"""
+A durable outbox for alerts.
+
+Rather than being sent right away, alerts are appended to a spool file on
+disk, and delivered from there by background workers which retry failures
+with backoff.  Once an alert is in the spool, the feed can carry on - and
+if we're stopped before it's delivered, it'll be sent on the next run.
+
+On disk, the outbox is three append-only files:
+
+    ``outbox.spool``
+        the alerts, one JSON record per line
+    ``outbox.index``
+        ``<id> <offset> <length>`` of each record in the spool
+    ``outbox.acks``
+        ids of the records which have been delivered
+
+These are compacted down to only the undelivered records when the outbox
+is opened.  The index is only a shortcut: records in the spool past the
+last one indexed are found by reading it through, so compacting empties
+the index before replacing the spool, and a crash part way through never
+leaves the index pointing into the wrong spool.
+
+Writes are synced to disk in batches, off the event loop: everything
+written while a sync is starting shares it.
+"""
+
+import asyncio
+import contextvars
+import email
+import email.policy
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+log = logging.getLogger(__name__)
+
+OUTBOX_WORKERS       = 10
+OUTBOX_MAX_BACKOFF   = 300
+OUTBOX_MAX_AGE       = 24 * 3600
+OUTBOX_DRAIN_TIMEOUT = 60
+
+# the outbox for the current run, if any
+current_outbox = contextvars.ContextVar('current_outbox', default=None)
+
+
+class OutboxError(Exception):
+    """Something is wrong with an outbox record"""
+    pass
+
+
+def token_key(token) -> str:
+    """The key we store a token as, so the token itself isn't written to disk."""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+class Outbox:
+    """
+    A durable outbox.
+
+    Args:
+        path (str):          directory for the outbox files
+        workers (int):       number of alerts to deliver at once
+        max_backoff (int):   maximum time between retries, in seconds
+        max_age (int):       give up on records older than this, in seconds
+        fsync (bool):        sync the files to disk after writing
+    """
+
+    def __init__(self, path='/var/run/rss_state', workers=OUTBOX_WORKERS,
+                 max_backoff=OUTBOX_MAX_BACKOFF, max_age=OUTBOX_MAX_AGE, fsync=True):
+        self.path = path
+        self.num_workers = max(workers, 1)
+        self.max_backoff = max_backoff
+        self.max_age = max_age
+        self.fsync = fsync
+
+        self.tokens = {}
+        self.pending = {}
+        self.queue = None
+        self.workers = []
+        self.timers = set()
+        self.delivering = set()
+        self.syncing = None
+        self.closing = False
+        self.spool = None
+        self.index = None
+        self.acks = None
+
+
+    def _file(self, name):
+        return os.path.join(self.path, f'outbox.{name}')
+
+
+    def add_token(self, token):
+        """
+        Tell the outbox about a slack token, so it can deliver records for it.
+        """
+        if token:
+            self.tokens[token_key(token)] = token
+
+
+    def open(self):
+        """
+        Open the outbox, compacting the files and queueing up any records
+        left undelivered by a previous run.  Must be called from within the
+        running event loop.
+        """
+        os.makedirs(self.path, exist_ok=True)
+
+        records = self._load()
+        if records:
+            log.info("Outbox has %d undelivered alerts from a previous run", len(records))
+        self._compact(records)
+
+        self.spool = open(self._file('spool'), 'ab')
+        self.index = open(self._file('index'), 'a')
+        self.acks = open(self._file('acks'), 'a')
+
+        self.queue = asyncio.Queue()
+        self.closing = False
+        for record in records:
+            self._enqueue(record)
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+
+    def _load(self):
+        """Load the undelivered records."""
+
+        acked = set()
+        if os.path.exists(self._file('acks')):
+            with open(self._file('acks'), 'r') as f:
+                acked = set(line.strip() for line in f)
+
+        records = []
+        if not os.path.exists(self._file('spool')):
+            return records
+
+        with open(self._file('spool'), 'rb') as spool:
+            end = 0
+            if os.path.exists(self._file('index')):
+                with open(self._file('index'), 'r') as index:
+                    for line in index:
+                        try:
+                            record_id, offset, length = line.split()
+                            offset, length = int(offset), int(length)
+                        except ValueError:
+                            # partial write of the last line
+                            continue
+                        end = max(end, offset + length)
+                        if record_id in acked:
+                            continue
+                        spool.seek(offset)
+                        records.append(self._parse(spool.read(length)))
+
+            # anything written to the spool but not the index
+            spool.seek(end)
+            for line in spool:
+                record = self._parse(line)
+                if record and record['id'] not in acked:
+                    records.append(record)
+
+        return [r for r in records if r]
+
+
+    def _parse(self, data):
+        try:
+            return json.loads(data)
+        except ValueError:
+            log.warning("Skipping corrupt outbox record")
+            return None
+
+
+    def _compact(self, records):
+        """
+        Rewrite the spool with only these records.  They aren't indexed:
+        the index is emptied first, so whichever spool we're left with
+        after a crash is read through from the start.
+        """
+
+        spool_tmp = self._file('spool.tmp')
+        with open(spool_tmp, 'wb') as spool:
+            for record in records:
+                spool.write(json.dumps(record).encode() + b'\n')
+            spool.flush()
+            os.fsync(spool.fileno())
+        open(self._file('index'), 'w').close()
+        os.replace(spool_tmp, self._file('spool'))
+        open(self._file('acks'), 'w').close()
+
+
+    async def put(self, record):
+        """
+        Write a record to the outbox, and once it's on disk, queue it for
+        delivery.
+
+        Args:
+            record (dict): the record, see :py:meth:`put_slack` and
+                           :py:meth:`put_email`
+        """
+        record['id'] = uuid.uuid4().hex
+        record['created'] = time.time()
+
+        data = json.dumps(record).encode() + b'\n'
+        offset = self.spool.tell()
+        self.spool.write(data)
+        self.index.write(f"{record['id']} {offset} {len(data)}\n")
+        await self._synced()
+
+        self._enqueue(record)
+
+
+    async def put_slack(self, cfg, channel, message):
+        """
+        Put a slack message in the outbox.
+
+        Args:
+            cfg (dict):      slack output config
+            channel (str):   channel to send to
+            message (dict):  arguments for ``chat.postMessage``
+        """
+        self.add_token(cfg.get('token'))
+        await self.put({
+            'type':     'slack',
+            'sender':   {
+                'token':    token_key(cfg.get('token')),
+                'interval': cfg.get('interval'),
+                'base_url': cfg.get('base_url'),
+            },
+            'channel':  channel,
+            'message':  message,
+        })
+
+
+    async def put_email(self, cfg, message):
+        """
+        Put an email message in the outbox.
+
+        Args:
+            cfg (dict):  email output config
+            message (:py:class:`email.message.EmailMessage`): the message
+        """
+        await self.put({
+            'type':     'email',
+            'sender':   {
+                'server':      cfg['server'],
+                'port':        cfg.get('port'),
+                'connections': cfg.get('connections'),
+            },
+            'message':  message.as_string(),
+        })
+
+
+    def _synced(self):
+        """
+        Wait for what's been written so far to be synced to disk.  Shared
+        by everyone writing in the meantime, and shielded, so that one of
+        them being cancelled doesn't stop it for the others.
+        """
+        if self.syncing is None:
+            self.syncing = asyncio.ensure_future(self._sync())
+        return asyncio.shield(self.syncing)
+
+
+    async def _sync(self):
+        # let whoever else is writing right now get in on this one
+        await asyncio.sleep(0)
+        self.syncing = None
+
+        files = (self.spool, self.index, self.acks)
+        for f in files:
+            f.flush()
+        if self.fsync:
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: [os.fsync(f.fileno()) for f in files])
+
+
+    def _enqueue(self, record, attempts=0):
+        self.pending[record['id']] = attempts
+        self.queue.put_nowait(record)
+
+
+    async def _worker(self):
+        while True:
+            record = await self.queue.get()
+            try:
+                # if we're stopped part way through sending, the delivery
+                # carries on, so that it's acked once it's sent
+                delivery = asyncio.ensure_future(self._process(record))
+                self.delivering.add(delivery)
+                delivery.add_done_callback(self._delivered)
+                await asyncio.shield(delivery)
+            finally:
+                self.queue.task_done()
+
+
+    def _delivered(self, delivery):
+        self.delivering.discard(delivery)
+        if self.queue is None and not self.delivering:
+            self._close_files()
+
+
+    async def _process(self, record):
+        """Deliver a record, and ack it or retry it."""
+        try:
+            await self._deliver(record)
+
+        except OutboxError as e:
+            # we can't do anything about these this run
+            if self._expired(record):
+                log.error("Giving up on outbox record %s: %s", record['id'], e)
+                await self._ack(record)
+            else:
+                log.error("Can't deliver outbox record %s: %s", record['id'], e)
+                del self.pending[record['id']]
+
+        except Exception:
+            await self._retry(record)
+
+        else:
+            await self._ack(record)
+
+
+    def _expired(self, record) -> bool:
+        return time.time() - record['created'] > self.max_age
+
+
+    async def _ack(self, record):
+        self.acks.write(f"{record['id']}\n")
+        del self.pending[record['id']]
+        await self._synced()
+
+
+    async def _retry(self, record):
+        """Schedule a failed record to be retried, with backoff."""
+
+        attempts = self.pending[record['id']] + 1
+        if self._expired(record):
+            log.error("Giving up on outbox record %s after %d attempts", record['id'], attempts)
+            await self._ack(record)
+            return
+
+        if self.closing:
+            # it'll be retried next run
+            log.warning("Error delivering outbox record %s", record['id'], exc_info=True)
+            return
+
+        delay = min(2 ** attempts, self.max_backoff)
+        log.warning("Error delivering outbox record %s, retrying in %ss", record['id'], delay, exc_info=True)
+        self.pending[record['id']] = attempts
+
+        def requeue():
+            self.timers.discard(timer)
+            self._enqueue(record, attempts)
+
+        timer = asyncio.get_running_loop().call_later(delay, requeue)
+        self.timers.add(timer)
+
+
+    async def _deliver(self, record):
+        """Send a record with the right sender."""
+
+        # avoid the circular import
+        from .alerts import slack_sender, smtp_sender
+
+        sender = record['sender']
+        if record['type'] == 'slack':
+            token = self.tokens.get(sender['token'])
+            if not token:
+                raise OutboxError("no slack token configured for this record")
+            cfg = {'token': token}
+            for key in ('interval', 'base_url'):
+                if sender.get(key) is not None:
+                    cfg[key] = sender[key]
+            await slack_sender(cfg).send(record['channel'], **record['message'])
+
+        elif record['type'] == 'email':
+            cfg = {k: v for k, v in sender.items() if v is not None}
+            message = email.message_from_string(record['message'], policy=email.policy.default)
+            await smtp_sender(cfg).send(message)
+
+        else:
+            raise OutboxError(f"unknown record type {record['type']}")
+
+
+    async def close(self, timeout=OUTBOX_DRAIN_TIMEOUT):
+        """
+        Wait up to ``timeout`` seconds for everything to be delivered, then
+        stop.  Anything still undelivered stays in the outbox for next time,
+        except for what the senders are already sending: that carries on,
+        and is acked once :py:func:`rssalertbot.senders.close_all` sends it.
+        """
+        if self.queue is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.pending and loop.time() < deadline:
+            await asyncio.sleep(min(0.1, max(deadline - loop.time(), 0)))
+
+        self.closing = True
+        if self.pending:
+            log.warning("Outbox still has %d undelivered alerts, will retry next run", len(self.pending))
+
+        for timer in self.timers:
+            timer.cancel()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.queue = None
+
+        if self.delivering:
+            log.info("Outbox has %d alerts still being sent, acking them once they are", len(self.delivering))
+        else:
+            self._close_files()
+
+
+    async def acked(self, timeout=None):
+        """
+        Wait up to ``timeout`` seconds for the alerts still being sent when
+        we were closed to be acked, once the senders have been closed.
+        """
+        if self.delivering:
+            await asyncio.wait(list(self.delivering), timeout=timeout)
+
+
+    def _close_files(self):
+        for f in (self.spool, self.index, self.acks):
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            f.close()
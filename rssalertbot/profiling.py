@@ -0,0 +1,180 @@
+"""
+Profiling a run.
+
+Two kinds of profile are taken at once:
+
+* cProfile stats for the whole run, plus separate stats for the config
+  loading and storage setup phases, which run on their own before any
+  feeds are processed
+* samples of the main thread's stack, taken from a background thread.
+  Each sample is put down to the phase the run was in, worked out from the
+  functions on the stack, which is how fetching, parsing, processing and
+  alerting are told apart even though the feeds are all interleaved on the
+  event loop.  These are written as "collapsed stacks", one line per stack
+  with the phase at the root, for flamegraph tools.
+"""
+
+import collections
+import contextlib
+import contextvars
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+
+log = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.005
+
+# the phase a function's in: where several are on the stack, the innermost wins
+PHASE_FUNCTIONS = {
+    ('rssalertbot.main', 'load_config'):        'config',
+    ('rssalertbot.main', 'setup_storage'):      'storage',
+    ('rssalertbot.main', 'setup_locking'):      'storage',
+    ('rssalertbot.feed', 'process'):            'process',
+    ('rssalertbot.feed', '_process'):           'process',
+    ('rssalertbot.feed', 'save_progress'):      'process',
+    ('rssalertbot.feed', 'fetch_and_parse'):    'parse',
+    ('rssalertbot.feed', '_fetch_and_parse'):   'parse',
+    ('rssalertbot.feed', '_fetch'):             'fetch',
+    ('rssalertbot.feed', 'alert'):              'alert',
+}
+
+PHASE_MODULES = {
+    'rssalertbot.alerts':   'alert',
+    'rssalertbot.digest':   'alert',
+    'rssalertbot.outbox':   'alert',
+}
+
+# the profiler for the current run, if any
+current_profiler = contextvars.ContextVar('current_profiler', default=None)
+
+
+def frame_phase(frame):
+    """
+    Work out which phase a stack is in.
+
+    Args:
+        frame: the innermost frame
+
+    Returns:
+        str: the phase, or None
+    """
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        phase = PHASE_FUNCTIONS.get((module, frame.f_code.co_name)) or PHASE_MODULES.get(module)
+        if phase:
+            return phase
+        frame = frame.f_back
+    return None
+
+
+def phase(name):
+    """
+    Profile a phase of the run on its own, if we're profiling.  Only for
+    phases which don't share the event loop with anything else.
+
+    Args:
+        name (str): phase name
+
+    Returns:
+        a context manager
+    """
+    profiler = current_profiler.get()
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.phase(name)
+
+
+class Profiler:
+    """
+    Profiles a run, see the module docs.
+
+    Args:
+        path (str):       directory to write the profiles to
+        interval (float): time between stack samples, in seconds
+    """
+
+    def __init__(self, path, interval=SAMPLE_INTERVAL):
+        self.path = path
+        self.interval = interval
+
+        self.profile = cProfile.Profile()
+        self.phases = {}
+        self.samples = collections.Counter()
+        self.thread = None
+        self.thread_id = None
+        self.stopped = threading.Event()
+
+
+    def start(self):
+        """Start profiling the current thread."""
+        os.makedirs(self.path, exist_ok=True)
+        self.thread_id = threading.get_ident()
+        self.thread = threading.Thread(target=self._sample, name='rssalertbot-profiler', daemon=True)
+        self.thread.start()
+        self.profile.enable()
+
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Profile a phase separately.  Only one cProfile profile can be
+        running at once, so the run's is paused, and the phase's stats are
+        added to it at the end.
+        """
+        profile = self.phases.setdefault(name, cProfile.Profile())
+        self.profile.disable()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.profile.enable()
+
+
+    def _sample(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            name = frame_phase(frame) or 'other'
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                frame = frame.f_back
+            stack.append(name)
+            self.samples[tuple(reversed(stack))] += 1
+            del frame
+
+
+    def stop(self):
+        """Stop profiling and write everything out."""
+        self.profile.disable()
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+
+        # one profile for the whole run, and one for each phase
+        stats = pstats.Stats(self.profile)
+        for name, profile in self.phases.items():
+            profile.dump_stats(os.path.join(self.path, f'{name}.pstats'))
+            stats.add(profile)
+        stats.dump_stats(os.path.join(self.path, 'run.pstats'))
+
+        with open(os.path.join(self.path, 'stacks.collapsed'), 'w') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{';'.join(stack)} {count}\n")
+
+        total = sum(self.samples.values())
+        if total:
+            by_phase = collections.Counter()
+            for stack, count in self.samples.items():
+                by_phase[stack[0]] += count
+            log.info("Profile samples by phase: %s", ', '.join(
+                f'{name} {100 * count / total:.1f}%' for name, count in by_phase.most_common()))
+        log.info("Profile written to %s", self.path)
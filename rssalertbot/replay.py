@@ -0,0 +1,320 @@
+"""
+Recording and replaying feed fetches.
+
+With ``--record DIR``, every feed's response - status, headers and body,
+or the timeout or error - is saved to an archive in ``DIR``, and with
+``--replay DIR`` the feeds are served from the archive instead of the
+network, so a run can be reproduced, profiled and benchmarked against
+exactly the same data.
+
+The archive is an ``index.json`` with the responses and how long each one
+took, and a ``bodies.zlib`` file of zlib-compressed bodies which the index
+points into.  Identical bodies are only stored once.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+
+import pendulum
+from multidict import CIMultiDict, CIMultiDictProxy
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_VERSION = 1
+INDEX_FILE = 'index.json'
+BODIES_FILE = 'bodies.zlib'
+
+# the archive being recorded to or replayed from, if any
+current_archive = contextvars.ContextVar('current_archive', default=None)
+
+# the timeout of the fetch in progress, so a recording can tell it
+# expiring from the fetch being cancelled by something else
+current_fetch_timeout = contextvars.ContextVar('current_fetch_timeout', default=None)
+
+
+class ReplayError(Exception):
+    """A fetch that can't be replayed, or which failed when recorded."""
+
+
+def _key(url, username):
+    return (url, username or None)
+
+
+class Recorder:
+    """
+    Records feed fetches to an archive.  Anything already in the archive
+    is replaced.
+
+    Args:
+        path (str): archive directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.offsets = {}
+        os.makedirs(path, exist_ok=True)
+        self.bodies = open(os.path.join(path, BODIES_FILE), 'wb')
+
+
+    def session(self, username=None, **kwargs):
+        """
+        Make a session for fetching a feed, which records what it fetches.
+
+        Args:
+            username (str): the feed's username, which is part of the key
+            kwargs:         for :py:class:`aiohttp.ClientSession`
+        """
+        import aiohttp
+        return RecordingSession(self, aiohttp.ClientSession(**kwargs), username)
+
+
+    def record(self, url, username, status, seconds, headers=(), body=None,
+               encoding=None, error=None):
+        """
+        Record a fetch.
+
+        Args:
+            url (str):        the URL
+            username (str):   the username fetched with, if any
+            status (str):     HTTP status, or 'timeout' or 'error'
+            seconds (float):  how long it took
+            headers (list):   response headers, as ``(name, value)`` pairs
+            body (bytes):     response body
+            encoding (str):   the body's text encoding
+            error (str):      what went wrong, for errors
+        """
+        entry = {
+            'url':      url,
+            'username': username or None,
+            'status':   status,
+            'seconds':  seconds,
+            'headers':  [list(header) for header in headers],
+            'encoding': encoding,
+            'error':    error,
+        }
+        if body is not None:
+            entry['offset'], entry['length'] = self._write_body(body)
+            entry['size'] = len(body)
+        self.entries[_key(url, username)] = entry
+
+
+    def _write_body(self, body):
+        digest = hashlib.sha1(body).digest()
+        if digest not in self.offsets:
+            data = zlib.compress(body)
+            self.offsets[digest] = (self.bodies.tell(), len(data))
+            self.bodies.write(data)
+        return self.offsets[digest]
+
+
+    def close(self):
+        """Finish the archive, writing the index."""
+        self.bodies.close()
+
+        index = os.path.join(self.path, INDEX_FILE)
+        tmp = index + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({
+                'version':  ARCHIVE_VERSION,
+                'recorded': pendulum.now('UTC').to_iso8601_string(),
+                'entries':  list(self.entries.values()),
+            }, f)
+        os.replace(tmp, index)
+        log.info("Recorded %d feed fetches to %s", len(self.entries), self.path)
+
+
+class RecordingSession:
+    """
+    Wraps an :py:class:`aiohttp.ClientSession`, recording each response
+    (with its body already read) before handing it on.
+    """
+
+    def __init__(self, recorder, session, username=None):
+        self.recorder = recorder
+        self.session = session
+        self.username = username
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+
+    def get(self, url):
+        return _ResponseContext(self._get(url))
+
+
+    async def _get(self, url):
+        start = time.perf_counter()
+        try:
+            response = await self.session.get(url)
+            body = await response.read()
+        except asyncio.CancelledError:
+            # only if it's the fetch's own timeout, else ex: the run deadline
+            fetch_timeout = current_fetch_timeout.get()
+            if fetch_timeout and fetch_timeout.expired:
+                self.recorder.record(url, self.username, 'timeout', time.perf_counter() - start)
+            raise
+        except Exception as e:
+            etype = '.'.join((type(e).__module__, type(e).__name__))
+            self.recorder.record(url, self.username, 'error', time.perf_counter() - start,
+                                 error=f"{etype}: {e}")
+            raise
+
+        self.recorder.record(
+            url, self.username, str(response.status), time.perf_counter() - start,
+            headers  = [(k.decode('latin-1'), v.decode('latin-1')) for k, v in response.raw_headers],
+            body     = body,
+            encoding = response.get_encoding())
+        return response
+
+
+class Replay:
+    """
+    Replays feed fetches from an archive.
+
+    Args:
+        path (str):      archive directory
+        latency (bool):  take as long as each fetch did when it was recorded,
+                         rather than replaying at full speed
+    """
+
+    def __init__(self, path, latency=False):
+        self.path = path
+        self.latency = latency
+
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            index = json.load(f)
+        if index.get('version') != ARCHIVE_VERSION:
+            raise ValueError(f"Unknown archive version {index.get('version')} in {path}")
+        self.entries = {_key(e['url'], e['username']): e for e in index['entries']}
+        self.bodies = open(os.path.join(path, BODIES_FILE), 'rb')
+        log.info("Replaying %d feed fetches recorded %s from %s",
+                 len(self.entries), index.get('recorded'), path)
+
+
+    def session(self, username=None, **kwargs):
+        """
+        Make a session for fetching a feed from the archive.
+
+        Args:
+            username (str): the feed's username, which is part of the key
+            kwargs:         ignored, for compatibility with :py:meth:`Recorder.session`
+        """
+        return ReplaySession(self, username)
+
+
+    def body(self, entry) -> bytes:
+        """Read a recorded body."""
+        self.bodies.seek(entry['offset'])
+        return zlib.decompress(self.bodies.read(entry['length']))
+
+
+    async def fetch(self, url, username=None):
+        """
+        Replay a fetch.
+
+        Returns:
+            :py:class:`ReplayResponse`: the response
+
+        Raises:
+            asyncio.TimeoutError: if it timed out when recorded
+            ReplayError: if it failed when recorded, or wasn't recorded
+        """
+        entry = self.entries.get(_key(url, username))
+        if entry is None:
+            raise ReplayError(f"{url} is not in the archive")
+
+        if self.latency:
+            await asyncio.sleep(entry['seconds'])
+
+        if entry['status'] == 'timeout':
+            raise asyncio.TimeoutError()
+        if entry['status'] == 'error':
+            raise ReplayError(entry['error'])
+
+        body = self.body(entry) if 'offset' in entry else b''
+        return ReplayResponse(int(entry['status']), entry['headers'], body, entry['encoding'])
+
+
+    def close(self):
+        self.bodies.close()
+
+
+class ReplaySession:
+    """
+    Stands in for an :py:class:`aiohttp.ClientSession`, fetching from a
+    :py:class:`Replay`.
+    """
+
+    def __init__(self, replay, username=None):
+        self.replay = replay
+        self.username = username
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+    def get(self, url):
+        return _ResponseContext(self.replay.fetch(url, self.username))
+
+
+class ReplayResponse:
+    """
+    Stands in for an :py:class:`aiohttp.ClientResponse`.
+    """
+
+    def __init__(self, status, headers, body, encoding=None):
+        self.status = status
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self.body = body
+        self.encoding = encoding or 'utf-8'
+
+
+    def get_encoding(self):
+        return self.encoding
+
+
+    async def read(self):
+        return self.body
+
+
+    async def text(self, encoding=None, errors='strict'):
+        return self.body.decode(encoding or self.encoding, errors)
+
+
+    def release(self):
+        pass
+
+
+class _ResponseContext:
+    """``async with session.get(url) as response``, for a coroutine"""
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.response = None
+
+
+    async def __aenter__(self):
+        self.response = await self.coro
+        return self.response
+
+
+    async def __aexit__(self, *exc):
+        if self.response is not None:
+            self.response.release()
@@ -0,0 +1,149 @@
+"""
+Run reports.
+
+Each feed keeps stats on what it did during the run, which can be written
+out at the end as a JSON report, with totals for the run and the slowest
+feeds.
+"""
+
+import collections
+import contextvars
+import json
+import logging
+import os
+import tempfile
+
+log = logging.getLogger(__name__)
+
+REPORT_SLOWEST = 10
+
+# the totals to log at the end of the run
+SUMMARY_TOTALS = ('feeds', 'ok', 'failed', 'timeout', 'error', 'cancelled', 'skipped',
+                  'entries_new', 'alerts_sent')
+
+# the stats of the feed being processed, if any
+current_stats = contextvars.ContextVar('current_stats', default=None)
+
+
+class FeedStats:
+    """
+    What happened when processing a feed.
+
+    Attributes:
+        result (str):          'ok', 'failed' (the fetch failed), 'timeout'
+                               (the fetch timed out), 'error' (processing
+                               raised an exception), 'cancelled' (processing
+                               was cut short by the run deadline) or
+                               'skipped' (the feed wasn't processed)
+        status (str):          HTTP status of the fetch, or 'timeout' or 'error'
+        fetch_seconds (float): time taken to fetch the feed
+        response_bytes (int):  size of the feed
+        shared_from (str):     the feed whose fetch this one shared, if any
+        entries_parsed (int):  entries in the feed
+        entries_new (int):     entries we hadn't seen before
+        entries_filtered (int): new entries ruled out by the feed's filter
+        storage_ops (int):     storage reads, writes and deletes
+        alerts_sent (int):     alerts delivered, counting each output
+        alerts_failed (int):   alerts not delivered, counting each output
+        seconds (float):       time taken to process the feed, in total
+    """
+
+    def __init__(self):
+        self.result = 'skipped'
+        self.status = None
+        self.fetch_seconds = None
+        self.response_bytes = 0
+        self.shared_from = None
+        self.entries_parsed = 0
+        self.entries_new = 0
+        self.entries_filtered = 0
+        self.storage_ops = 0
+        self.alerts_sent = 0
+        self.alerts_failed = 0
+        self.seconds = None
+
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def count_storage_op():
+    """Count a storage operation against the feed being processed."""
+    stats = current_stats.get()
+    if stats is not None:
+        stats.storage_ops += 1
+
+
+def build_report(feeds, started, seconds, slowest=REPORT_SLOWEST, **extra) -> dict:
+    """
+    Build the report for a run.
+
+    Args:
+        feeds (list):     the :py:class:`rssalertbot.feed.Feed` objects
+        started (:py:class:`pendulum.DateTime`): when the run started
+        seconds (float):  how long the run took
+        slowest (int):    how many of the slowest feeds to list
+        extra:            anything else to put in the report
+
+    Returns:
+        dict: the report
+    """
+    results = collections.Counter(feed.stats.result for feed in feeds)
+    fetched = [feed for feed in feeds if feed.stats.status is not None and not feed.stats.shared_from]
+    totals = {
+        'feeds':    len(feeds),
+        'fetched':  len(fetched),
+        'response_bytes': sum(feed.stats.response_bytes for feed in fetched),
+    }
+    for result in ('ok', 'failed', 'timeout', 'error', 'cancelled', 'skipped'):
+        totals[result] = results[result]
+    for stat in ('entries_parsed', 'entries_new', 'entries_filtered', 'storage_ops',
+                 'alerts_sent', 'alerts_failed'):
+        totals[stat] = sum(getattr(feed.stats, stat) for feed in feeds)
+
+    feed_reports = [
+        {
+            'group':    feed.group['name'],
+            'name':     feed.name,
+            'url':      feed.url,
+            **feed.stats.to_dict(),
+        }
+        for feed in feeds
+    ]
+
+    timed = [f for f in feed_reports if f['seconds'] is not None]
+    timed.sort(key=lambda f: f['seconds'], reverse=True)
+
+    return {
+        'started':  started.to_iso8601_string(),
+        'seconds':  seconds,
+        'totals':   totals,
+        'slowest':  [
+            {k: f[k] for k in ('group', 'name', 'seconds', 'fetch_seconds')}
+            for f in timed[:slowest]
+        ],
+        **extra,
+        'feeds':    feed_reports,
+    }
+
+
+def write_report(path, report):
+    """
+    Write a report to a file, replacing it atomically.
+
+    Args:
+        path (str):     file path
+        report (dict):  the report, from :py:func:`build_report`
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.report-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    log.info("Run report written to %s", path)
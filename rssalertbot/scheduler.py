@@ -0,0 +1,110 @@
+"""
+Feed scheduling.
+
+Feeds are processed highest ``priority`` first, with at most
+``scheduler.concurrency`` at once, so that when there are more feeds than
+we can process at once the ones we care about most don't wait behind the
+rest.
+"""
+
+import asyncio
+import heapq
+import logging
+
+from .deadline import CANCEL_GRACE
+
+log = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    Runs feeds in priority order.
+
+    Args:
+        concurrency (int): how many feeds to process at once, or None for all
+    """
+
+    def __init__(self, concurrency=None):
+        self.concurrency = concurrency
+
+
+    async def run(self, feeds, timeout, until=None):
+        """
+        Process the feeds, highest priority first and in config order for
+        the same priority, until they're all done or time's up.
+
+        Args:
+            feeds (list):   the :py:class:`rssalertbot.feed.Feed` objects
+            timeout (int):  feed fetch timeout
+            until (float):  seconds to stop starting and waiting for feeds
+                            after, or None to wait for them all
+
+        Returns:
+            dict: ``{task: feed}`` for the feeds which were started
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + until if until is not None else None
+
+        queue = [(-feed.priority, n, feed) for n, feed in enumerate(feeds)]
+        heapq.heapify(queue)
+
+        tasks = {}
+        running = set()
+        while queue or running:
+            while queue and (self.concurrency is None or len(running) < self.concurrency):
+                _, _, feed = heapq.heappop(queue)
+                task = asyncio.create_task(feed.process(timeout=timeout))
+                tasks[task] = feed
+                running.add(task)
+
+            remaining = None if end is None else max(end - loop.time(), 0)
+            done, running = await asyncio.wait(running, timeout=remaining,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+
+        return tasks
+
+
+async def run_feeds(feeds, timeout, deadline=None, scheduler=None):
+    """
+    Process feeds, cancelling any that haven't finished by the deadline.
+
+    Args:
+        feeds (list):           the :py:class:`rssalertbot.feed.Feed` objects
+        timeout (int):          feed fetch timeout
+        deadline (Deadline):    when to give up on the feeds, if ever
+        scheduler (Scheduler):  what runs the feeds, by default all at once
+
+    Returns:
+        list: the feeds which were cancelled
+    """
+    if not feeds:
+        return []
+
+    scheduler = scheduler or Scheduler()
+    tasks = await scheduler.run(feeds, timeout, deadline.feeds_remaining() if deadline else None)
+
+    pending = {task for task in tasks if not task.done()}
+    if pending:
+        log.warning("Run deadline reached, cancelling %d unfinished feeds", len(pending))
+        for task in pending:
+            task.cancel()
+        _, stuck = await asyncio.wait(pending, timeout=CANCEL_GRACE)
+        if stuck:
+            log.error("%d feeds didn't stop when cancelled", len(stuck))
+
+    not_started = len(feeds) - len(tasks)
+    if not_started:
+        log.warning("Run deadline reached, skipping %d feeds not yet started", not_started)
+
+    cancelled = []
+    for task, feed in tasks.items():
+        if task in pending:
+            cancelled.append(feed)
+            feed.stats.result = 'cancelled'
+            feed.log.warning("Cancelled feed %s at the run deadline, %s", feed.name,
+                             'while fetching' if feed.stats.status is None else 'after fetching')
+        elif not task.cancelled() and task.exception():
+            log.error("Error processing feed", exc_info=task.exception())
+    return cancelled
@@ -0,0 +1,64 @@
+"""
+Senders deliver already-rendered alerts to their destinations.
+
+A sender is long-lived: it holds its client connections for the whole run
+and queues messages per destination, so that a slow or rate-limited
+destination doesn't hold up the others.  Senders are bound to the event
+loop that created them, use :py:func:`get_sender` to get a shared instance
+and :py:func:`close_all` to drain and close them at the end of the run.
+"""
+
+import asyncio
+import weakref
+from abc import ABC, abstractmethod
+
+
+# event loop -> {(sender class, key): sender}
+_senders = weakref.WeakKeyDictionary()
+
+
+class BaseSender(ABC):
+    """
+    Base class for senders.
+    """
+
+    @abstractmethod
+    async def close(self):
+        """
+        Deliver anything still queued and close all connections.
+        """
+        pass
+
+
+def get_sender(cls, key, *args, **kwargs):
+    """
+    Get the shared sender of the given class for this key, creating it
+    if needed.  Must be called from within the running event loop.
+
+    Args:
+        cls (type): :py:class:`BaseSender` subclass
+        key:        hashable key identifying the sender, ex: the API token
+        args:       passed to the constructor if a sender is created
+        kwargs:     passed to the constructor if a sender is created
+
+    Returns:
+        BaseSender: the sender
+    """
+    senders = _senders.setdefault(asyncio.get_running_loop(), {})
+    if (cls, key) not in senders:
+        senders[(cls, key)] = cls(*args, **kwargs)
+    return senders[(cls, key)]
+
+
+async def close_all():
+    """
+    Close all senders created on the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+
+    # closing a sender may send through another one, ex: a digest, so
+    # keep going until no more get created
+    while _senders.get(loop):
+        senders = _senders.pop(loop)
+        for sender in senders.values():
+            await sender.close()
@@ -0,0 +1,113 @@
+"""
+Slack sender.
+"""
+
+import aiohttp
+import asyncio
+import logging
+import slack
+from slack.errors import SlackApiError
+
+from . import BaseSender
+
+log = logging.getLogger(__name__)
+
+# Slack allows about one message per second per channel
+SLACK_INTERVAL = 1.0
+SLACK_RETRIES  = 5
+
+
+class SlackSender(BaseSender):
+    """
+    Sends messages to Slack with one client per token, and one send queue
+    per channel.
+
+    Each channel queue sends at most one message every ``interval`` seconds,
+    and a rate-limited (HTTP 429) message is retried after the delay Slack
+    asks for in ``Retry-After``.  Channels are sent to concurrently.
+
+    Args:
+        token (str):      Slack API token
+        interval (float): minimum time between messages to a channel, in seconds
+        retries (int):    how many times to retry a rate-limited message
+        base_url (str):   Slack API URL, if not the real one
+    """
+
+    def __init__(self, token, interval=SLACK_INTERVAL, retries=SLACK_RETRIES, base_url=None):
+        self.interval = interval
+        self.retries = retries
+
+        kwargs = {'base_url': base_url} if base_url else {}
+        self.session = aiohttp.ClientSession()
+        self.client = slack.WebClient(token, run_async=True, session=self.session, **kwargs)
+
+        self.queues = {}
+        self.workers = {}
+
+
+    async def send(self, channel, **message):
+        """
+        Queue a message for the channel and wait until it's been sent.
+
+        Args:
+            channel (str): channel to send to
+            message:       arguments for ``chat.postMessage``
+
+        Raises:
+            SlackApiError: Slack refused the message, or we ran out of retries
+        """
+        if channel not in self.queues:
+            self.queues[channel] = asyncio.Queue()
+            self.workers[channel] = asyncio.create_task(self._worker(channel, self.queues[channel]))
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queues[channel].put((message, future))
+        return await future
+
+
+    async def _worker(self, channel, queue):
+        """Send queued messages for one channel, pacing them out."""
+
+        loop = asyncio.get_running_loop()
+        next_send = 0
+        while True:
+            message, future = await queue.get()
+            try:
+                delay = next_send - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                result = await self._post(channel, message)
+                if not future.done():
+                    future.set_result(result)
+
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+
+            finally:
+                next_send = loop.time() + self.interval
+                queue.task_done()
+
+
+    async def _post(self, channel, message):
+        """Post a message, retrying if we're rate limited."""
+
+        for attempt in range(self.retries + 1):
+            try:
+                return await self.client.chat_postMessage(channel=channel, **message)
+
+            except SlackApiError as e:
+                if e.response.status_code != 429 or attempt >= self.retries:
+                    raise
+                delay = float(e.response.headers.get('Retry-After', self.interval))
+                log.warning("Rate limited by Slack on channel %s, retrying in %ss", channel, delay)
+                await asyncio.sleep(delay)
+
+
+    async def close(self):
+        for queue in self.queues.values():
+            await queue.join()
+        for worker in self.workers.values():
+            worker.cancel()
+        await asyncio.gather(*self.workers.values(), return_exceptions=True)
+        await self.session.close()
@@ -0,0 +1,120 @@
+"""
+SMTP sender.
+"""
+
+import aiosmtplib
+import asyncio
+import logging
+
+from . import BaseSender
+
+log = logging.getLogger(__name__)
+
+SMTP_PORT        = 25
+SMTP_CONNECTIONS = 1
+SMTP_RETRIES     = 3
+SMTP_TIMEOUT     = 30
+
+
+def _is_transient(e) -> bool:
+    """Is this an error worth retrying?"""
+    if isinstance(e, aiosmtplib.SMTPResponseException):
+        return 400 <= e.code < 500
+    return isinstance(e, (aiosmtplib.SMTPServerDisconnected, OSError))
+
+
+class SMTPSender(BaseSender):
+    """
+    Sends email through one SMTP server, keeping connections open for the
+    whole run.
+
+    Messages are queued and sent back to back over ``connections``
+    persistent connections, so we only pay for the connect and handshake
+    once.  Messages failing with a transient error (disconnects, timeouts,
+    4xx responses) are retried on a fresh connection, with backoff.
+
+    Args:
+        server (str):      SMTP server hostname
+        port (int):        SMTP server port
+        connections (int): number of connections to send over
+        retries (int):     how many times to retry a message
+        timeout (int):     connection and command timeout, in seconds
+    """
+
+    def __init__(self, server, port=SMTP_PORT, connections=SMTP_CONNECTIONS,
+                 retries=SMTP_RETRIES, timeout=SMTP_TIMEOUT):
+        self.server = server
+        self.port = port
+        self.retries = retries
+        self.timeout = timeout
+
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(max(connections, 1))]
+
+
+    async def send(self, message):
+        """
+        Queue a message and wait until it's been sent.
+
+        Args:
+            message (:py:class:`email.message.EmailMessage`): the message
+
+        Raises:
+            SMTPException: the server refused the message, or we ran out of retries
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((message, future))
+        return await future
+
+
+    def _connection(self):
+        return aiosmtplib.SMTP(hostname=self.server, port=self.port,
+                               timeout=self.timeout, start_tls=False)
+
+
+    async def _worker(self):
+        """Send queued messages over one connection."""
+
+        smtp = self._connection()
+        try:
+            while True:
+                message, future = await self.queue.get()
+                try:
+                    for attempt in range(self.retries + 1):
+                        try:
+                            if not smtp.is_connected:
+                                await smtp.connect()
+                            result = await smtp.send_message(message)
+                            break
+
+                        except Exception as e:
+                            if not _is_transient(e) or attempt >= self.retries:
+                                raise
+                            log.warning("Error sending mail via %s, retrying: %s", self.server, e)
+                            smtp.close()
+                            smtp = self._connection()
+                            await asyncio.sleep(2 ** attempt)
+
+                    if not future.done():
+                        future.set_result(result)
+
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+
+                finally:
+                    self.queue.task_done()
+
+        finally:
+            if smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except Exception:
+                    smtp.close()
+
+
+    async def close(self):
+        await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
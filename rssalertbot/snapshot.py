@@ -0,0 +1,111 @@
+"""
+Config snapshots.
+
+Most runs load exactly the same config files as the last one, so once the
+config's been loaded and the feed groups resolved, the result can be saved
+as a pickle along with a fingerprint of the files it came from.  The next
+run loads that instead of parsing and merging everything again, as long as
+none of the files have changed.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+import rssalertbot
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+def fingerprint(cfgfiles, overrides=None) -> str:
+    """
+    Fingerprint the config sources: the path, mtime and size of each file,
+    and of each entry in 'conf.d' directories, plus any overrides from the
+    command line.
+
+    Args:
+        cfgfiles (list):  config file or directory paths
+        overrides (dict): config values set on the command line
+
+    Returns:
+        str: the fingerprint
+    """
+    parts = [SNAPSHOT_VERSION, rssalertbot.__version__, sorted((overrides or {}).items())]
+
+    for path in cfgfiles:
+        path = os.path.abspath(path)
+        entries = [path]
+        if os.path.isdir(path):
+            entries.extend(os.path.join(path, f) for f in sorted(os.listdir(path)))
+
+        for entry in entries:
+            try:
+                st = os.stat(entry)
+                parts.append((entry, st.st_mtime_ns, st.st_size))
+            except OSError:
+                parts.append((entry, None, None))
+
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def load_snapshot(path, fp):
+    """
+    Load a snapshot, if there's one for this fingerprint.
+
+    Args:
+        path (str): snapshot file
+        fp (str):   fingerprint from :py:func:`fingerprint`
+
+    Returns:
+        tuple: ``(cfg, groups)`` as saved, else None
+    """
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning("Ignoring unreadable config snapshot %s: %s", path, e)
+        return None
+
+    if not isinstance(snapshot, dict) or snapshot.get('fingerprint') != fp:
+        log.debug("Config snapshot %s is out of date", path)
+        return None
+
+    log.debug("Loaded config snapshot %s", path)
+    return snapshot['config'], snapshot['groups']
+
+
+def save_snapshot(path, fp, cfg, groups):
+    """
+    Save a snapshot.  Errors are logged, a missing snapshot just means the
+    config is loaded the slow way next time.
+
+    Args:
+        path (str):     snapshot file
+        fp (str):       fingerprint from :py:func:`fingerprint`
+        cfg:            the loaded config
+        groups (list):  the resolved feed groups
+    """
+    snapshot = {
+        'fingerprint':  fp,
+        'config':       cfg,
+        'groups':       groups,
+    }
+
+    dirname = os.path.dirname(os.path.abspath(path))
+    try:
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.snapshot-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except Exception as e:
+        log.warning("Can't save config snapshot %s: %s", path, e)
@@ -1,6 +1,18 @@
+import logging
 import pendulum
 from abc import ABC, abstractmethod
 
+from ..bloom import BloomFilter, BLOOM_CAPACITY, BLOOM_ERROR_RATE
+from ..metrics import STORAGE_SECONDS
+from ..report import count_storage_op
+
+log = logging.getLogger(__name__)
+
+EVENT_FILTER = 'event-filter'
+# exists while the event filter may be missing events, ex: when a run
+# died before saving it
+EVENT_FILTER_DIRTY = 'event-filter-dirty'
+
 
 class BaseStorage(ABC):
     """
@@ -8,6 +20,9 @@ class BaseStorage(ABC):
     """
     not_found_exception_class = Exception
 
+    # a Bloom filter of the stored names, once opened
+    event_filter = None
+
     @abstractmethod
     def _read(self, name):
         pass
@@ -23,13 +38,45 @@ class BaseStorage(ABC):
         pass
 
 
+    def _read_blob(self, name) -> bytes:
+        """Read binary data, for backends which support the event filter"""
+        raise NotImplementedError
+
+
+    def _write_blob(self, name, data: bytes):
+        """Write binary data, for backends which support the event filter"""
+        raise NotImplementedError
+
+
+    def _list(self):
+        """Yield all the stored names, for backends which support the event filter"""
+        raise NotImplementedError
+
+
+    def list_names(self) -> list:
+        """
+        List all the stored names.
+
+        Raises:
+            NotImplementedError: if the backend doesn't support it
+        """
+        with self._timed('list'):
+            return list(self._list())
+
+
     def _event_name(self, feed, event_id):
         return '-'.join((feed, event_id))
 
 
+    def _timed(self, op):
+        count_storage_op()
+        return STORAGE_SECONDS.time(backend=type(self).__name__, op=op)
+
+
     def _read_or_none(self, name):
         try:
-            return self._read(name)
+            with self._timed('read'):
+                return self._read(name)
         except self.not_found_exception_class:
             return None
 
@@ -45,25 +92,113 @@ class BaseStorage(ABC):
         """
         Save the last updated date for the given feed
         """
-        self._write(feed, date)
+        with self._timed('write'):
+            self._write(feed, date)
 
 
     def load_event(self, feed, event_id):
         """
         Load the last sent date for an event
         """
-        return self._read_or_none(self._event_name(feed, event_id))
+        name = self._event_name(feed, event_id)
+        if self.event_filter is not None:
+            self.filter_lookups += 1
+            if name not in self.event_filter:
+                self.filter_skipped += 1
+                return None
+        return self._read_or_none(name)
 
 
     def save_event(self, feed, event_id, date: pendulum.DateTime):
         """
         Save the last sent date for an event
         """
-        self._write(self._event_name(feed, event_id), date)
+        name = self._event_name(feed, event_id)
+        if self.event_filter is not None:
+            if not self.filter_dirty:
+                # if we don't get to save the filter, the next run
+                # needs to know it's missing this
+                with self._timed('write'):
+                    self._write(EVENT_FILTER_DIRTY, pendulum.now('UTC'))
+                self.filter_dirty = True
+            self.event_filter.add(name)
+        with self._timed('write'):
+            self._write(name, date)
 
 
     def delete_event(self, feed, event_id):
         """
         Delete an event
         """
-        self._delete(self._event_name(feed, event_id))
+        with self._timed('delete'):
+            self._delete(self._event_name(feed, event_id))
+
+
+    def open_event_filter(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        """
+        Load the Bloom filter of stored events, so that looking up events
+        which were never saved doesn't need a call to the backend.  If
+        there isn't one we can trust, it's rebuilt from everything stored.
+
+        Call :py:meth:`close_event_filter` at the end of the run to save it.
+
+        Args:
+            capacity (int):     how many events to size the filter for
+            error_rate (float): false positive rate at capacity
+
+        Returns:
+            bool: whether the filter is in use, which it's not if the
+            backend doesn't support it
+        """
+        self.filter_lookups = self.filter_skipped = 0
+        self.filter_dirty = False
+        try:
+            with self._timed('read'):
+                data = self._read_blob(EVENT_FILTER)
+        except NotImplementedError:
+            log.warning("%s doesn't support an event filter", type(self).__name__)
+            return False
+        except self.not_found_exception_class:
+            data = None
+
+        bloom = None
+        if data:
+            bloom = BloomFilter.from_bytes(data, capacity, error_rate)
+        if bloom is None:
+            reason = "no event filter saved" if data is None else "event filter resized"
+        elif bloom.full:
+            reason = "event filter full"
+        elif self._read_or_none(EVENT_FILTER_DIRTY) is not None:
+            reason = "event filter not saved by the last run"
+        else:
+            self.event_filter = bloom
+            return True
+
+        log.info("Rebuilding the event filter: %s", reason)
+        bloom = BloomFilter(capacity, error_rate)
+        with self._timed('list'):
+            for name in self._list():
+                bloom.add(name)
+        self.event_filter = bloom
+        self.filter_dirty = True
+        return True
+
+
+    def close_event_filter(self):
+        """
+        Save the event filter, if it's changed, and stop using it.
+        """
+        if self.event_filter is None:
+            return
+
+        log.info("Event filter skipped %d of %d event lookups",
+                 self.filter_skipped, self.filter_lookups)
+        if self.filter_dirty:
+            with self._timed('write'):
+                self._write_blob(EVENT_FILTER, self.event_filter.to_bytes())
+            try:
+                with self._timed('delete'):
+                    self._delete(EVENT_FILTER_DIRTY)
+            except self.not_found_exception_class:
+                pass
+        self.event_filter = None
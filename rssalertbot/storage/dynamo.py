@@ -1,7 +1,7 @@
 import logging
 import pendulum
 
-from pynamodb.attributes import (UnicodeAttribute, UTCDateTimeAttribute)
+from pynamodb.attributes import (BinaryAttribute, UnicodeAttribute, UTCDateTimeAttribute)
 from pynamodb.exceptions import DoesNotExist
 from pynamodb.models     import Model
 
@@ -19,6 +19,7 @@ class FeedState(Model):
 
     name     = UnicodeAttribute(hash_key=True)
     last_run = UTCDateTimeAttribute()
+    data     = BinaryAttribute(null=True, legacy_encoding=False)
 
 
 class DynamoStorage(BaseStorage):
@@ -76,3 +77,17 @@ class DynamoStorage(BaseStorage):
     def _delete(self, name):
         obj = FeedState.get(name)
         obj.delete()
+
+
+    def _read_blob(self, name):
+        return FeedState.get(name).data
+
+
+    def _write_blob(self, name, data):
+        FeedState(name=name, last_run=pendulum.now('UTC'), data=data).save()
+        log.debug("Saved data for '%s'", name)
+
+
+    def _list(self):
+        for obj in FeedState.scan(attributes_to_get=['name']):
+            yield obj.name
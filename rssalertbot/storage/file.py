@@ -22,6 +22,10 @@ class FileStorage(BaseStorage):
         return os.path.join(self.basepath, f'last.{filename}.dat')
 
 
+    def _blobfile(self, filename):
+        return os.path.join(self.basepath, f'{filename}.bin')
+
+
     def _read(self, name):
         with open(self._datafile(name), 'r') as f:
             return pendulum.parse(f.read().strip())
@@ -37,3 +41,22 @@ class FileStorage(BaseStorage):
 
     def _delete(self, name):
         os.remove(self._datafile(name))
+
+
+    def _read_blob(self, name):
+        with open(self._blobfile(name), 'rb') as f:
+            return f.read()
+
+
+    def _write_blob(self, name, data):
+        # write it whole or not at all
+        tmp = self._blobfile(name) + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self._blobfile(name))
+
+
+    def _list(self):
+        for filename in os.listdir(self.basepath):
+            if filename.startswith('last.') and filename.endswith('.dat'):
+                yield filename[len('last.'):-len('.dat')]
@@ -2,10 +2,16 @@
 Miscellaneous utilities.
 """
 
+import collections
 import copy
+import functools
+import hashlib
+import html2text
 from html.parser import HTMLParser
 
-import rssalertbot
+from .classify import DEFAULT_CLASSIFIER
+
+CONVERSION_CACHE_SIZE = 1024
 
 
 class HTMLStripper(HTMLParser):
@@ -37,6 +43,88 @@ def strip_html(html):
     return s.get_data()
 
 
+class LRUCache:
+    """
+    A dictionary-ish cache of limited size, which drops the least
+    recently used items first.
+
+    Args:
+        maxsize (int): maximum number of items to keep
+    """
+
+    def __init__(self, maxsize=CONVERSION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.data = collections.OrderedDict()
+
+
+    def __len__(self):
+        return len(self.data)
+
+
+    def get(self, key, default=None):
+        """Get an item, marking it as recently used."""
+        try:
+            self.data.move_to_end(key)
+        except KeyError:
+            return default
+        return self.data[key]
+
+
+    def set(self, key, value):
+        """Store an item, dropping the oldest if we're full."""
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+
+def cached_conversion(func):
+    """
+    Decorator to cache the results of a text conversion function in an
+    :py:class:`LRUCache`, keyed on a digest of the text, so the same
+    description only gets converted once however many feeds, groups and
+    outputs it's sent to.  The cache is available as ``func.cache``.
+    """
+    cache = LRUCache()
+
+    @functools.wraps(func)
+    def wrapper(text):
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        result = cache.get(key)
+        if result is None:
+            result = func(text)
+            cache.set(key, result)
+        return result
+
+    wrapper.cache = cache
+    return wrapper
+
+
+html_to_text = cached_conversion(strip_html)
+
+
+@cached_conversion
+def html_to_mrkdwn(html):
+    """
+    Convert HTML to Slack's "mrkdwn".
+
+    Args:
+        html (str): HTML string
+
+    Returns:
+        str: mrkdwn text
+    """
+    # cleanup description to get it supported by slack - might figure out
+    # something more elegant later
+    desc = html2text.html2text(html)
+    desc = desc.replace('**', '*')
+    desc = desc.replace('\\', '')
+    desc = desc.replace('<', '&lt;')
+    desc = desc.replace('>', '&gt;')
+    desc = desc.replace('&', '&amp;')
+    return desc
+
+
 def guess_level(message) -> str:
     """
     Try to guess the alert level of the message.
@@ -48,15 +136,7 @@ def guess_level(message) -> str:
         str: one of 'good', 'warning', 'alert'
 
     """
-    teststring = message.lower()
-
-    if any(key in teststring for key in rssalertbot.KEYS_GREEN):
-        return "good"
-
-    if any(key in teststring for key in rssalertbot.KEYS_YELLOW):
-        return "warning"
-
-    return "alert"
+    return DEFAULT_CLASSIFIER.classify(message)
 
 
 def deepmerge(a, b):
@@ -88,3 +168,27 @@ def deepmerge(a, b):
         else:
             merge[key] = copy.deepcopy(val)
     return merge
+
+
+def deepmerge_into(a, b):
+    """Deeply merge nested dictionary `b` into `a`, in place.
+
+      Works like :py:func:`deepmerge`, but without copying either
+      dictionary, so merging many dictionaries is linear in their total
+      size.  `b` shouldn't be used afterwards, as parts of it may now
+      belong to `a`.
+
+      Args:
+          a (dict): Base dictionary, which is updated
+          b (dict): Dictionary that will be merged on top of `a`
+
+      Returns:
+          dict: `a`
+    """
+
+    for key, val in b.items():
+        if isinstance(val, dict) and isinstance(a.get(key), dict):
+            deepmerge_into(a[key], val)
+        else:
+            a[key] = val
+    return a
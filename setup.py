@@ -19,8 +19,8 @@ except Exception:
 
 install_requires = [
     'aiohttp',
+    'aiosmtplib',
     'feedparser~=6.0.0',
-    'mailer',
     'pendulum~=2.0',
     'html2text',
     'python-box~=4.2',
@@ -30,7 +30,7 @@ install_requires = [
 tests_require = install_requires + [
     'coverage',
     'parameterized',
-    'pynamodb',
+    'pynamodb>=5.3',
     "pytest",
     'slackclient~=2.5',
     'testfixtures',
@@ -54,7 +54,10 @@ setup(
     tests_require    = tests_require,
     extras_require   = {
         'dynamo': [
-            'pynamodb',
+            'pynamodb>=5.3',
+        ],
+        'http2': [
+            'httpx[http2]',
         ],
         'slack': [
             'slackclient~=2.5',
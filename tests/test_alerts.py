@@ -1,4 +1,5 @@
 
+import feedparser
 import pendulum
 import testfixtures
 import unittest
@@ -7,6 +8,7 @@ from box import Box
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import rssalertbot.alerts
+import rssalertbot.senders
 
 
 class Feed:
@@ -16,13 +18,6 @@ class Feed:
     }
 
 
-class MockMailer:
-    send = MagicMock()
-
-    def __init__(self, *args, **kwargs):
-        pass
-
-
 class AlertsTest(unittest.IsolatedAsyncioTestCase):
 
     alertmsg = Box({
@@ -48,7 +43,7 @@ class AlertsTest(unittest.IsolatedAsyncioTestCase):
             )
 
 
-    def test_alert_email(self):
+    async def test_alert_email(self):
         config = {
             'server': 'localhost',
             'from':   'test@nothing.test',
@@ -57,12 +52,19 @@ class AlertsTest(unittest.IsolatedAsyncioTestCase):
         feed = Feed()
 
         # mock :allthethings:
-        rssalertbot.alerts.Mailer = MockMailer
-        rssalertbot.alerts.Mailer.send = MagicMock()
-        rssalertbot.alerts.alert_email(feed, config, self.alertmsg)
+        with patch('aiosmtplib.SMTP') as smtp:
+            smtp.return_value.is_connected = False
+            smtp.return_value.connect = AsyncMock()
+            smtp.return_value.send_message = AsyncMock()
+
+            await rssalertbot.alerts.alert_email(feed, config, self.alertmsg)
+            await rssalertbot.senders.close_all()
 
-        # just make sure we've called this
-        rssalertbot.alerts.Mailer.send.assert_called()
+            # just make sure we've called this
+            smtp.return_value.send_message.assert_awaited()
+            message = smtp.return_value.send_message.call_args.args[0]
+            self.assertEqual(message['X-Mailer'], 'rssalertbot')
+            self.assertIn(self.alertmsg.description, message.get_content())
 
 
     async def test_alert_slack(self):
@@ -84,5 +86,87 @@ class AlertsTest(unittest.IsolatedAsyncioTestCase):
             slackclient.chat_postMessage = AsyncMock()
 
             await rssalertbot.alerts.alert_slack(feed, config, self.alertmsg)
+            await rssalertbot.senders.close_all()
 
             slackclient.chat_postMessage.assert_awaited()
+
+
+    async def test_alert_slack_classified(self):
+        entries = feedparser.parse("""<rss version="2.0"><channel><title>Status</title>
+            <item><title>Investigating outage</title><description>Trouble!</description></item>
+            <item><title>Issue resolved</title><description>All good</description></item>
+            <item><title>Major outage</title><description>Everything is down</description></item>
+            </channel></rss>""").entries
+        config = {
+            'channel': '#foo',
+            'token':   'monkeys',
+        }
+
+        rssalertbot.alerts.classify_entries(config, entries)
+        self.assertEqual(['warning', 'good', 'alert'], [e.get('level') for e in entries])
+
+        feed = Feed()
+        with patch('slack.WebClient', new=MagicMock()) as slackclient, \
+             patch('rssalertbot.alerts.get_classifier') as get_classifier:
+            slackclient.return_value.chat_postMessage = AsyncMock()
+
+            for entry in entries:
+                entry.datestring = self.alertmsg.datestring
+                await rssalertbot.alerts.alert_slack(feed, config, entry)
+            await rssalertbot.senders.close_all()
+
+            # the batch levels are used, not worked out again
+            get_classifier.assert_not_called()
+            colors = [c.kwargs['attachments'][0]['color']
+                      for c in slackclient.return_value.chat_postMessage.await_args_list]
+            self.assertEqual([rssalertbot.alerts.SLACK_COLORS[level] for level in ('warning', 'good', 'alert')],
+                             colors)
+
+
+    async def test_alert_slack_digest(self):
+
+        config = {
+            'channel': ['#foo', '#bar'],
+            'token':   'monkeys',
+            'digest':  {
+                'enabled': True,
+            },
+        }
+
+        feed = Feed()
+
+        with patch('slack.WebClient', new=MagicMock()) as slackclient:
+            slackclient.return_value.chat_postMessage = AsyncMock()
+
+            await rssalertbot.alerts.alert_slack(feed, config, self.alertmsg)
+            await rssalertbot.alerts.alert_slack(feed, config, self.alertmsg)
+            slackclient.return_value.chat_postMessage.assert_not_awaited()
+
+            await rssalertbot.senders.close_all()
+
+            # one message per channel, with both entries in it
+            calls = slackclient.return_value.chat_postMessage.await_args_list
+            self.assertEqual({'#foo', '#bar'}, {c.kwargs['channel'] for c in calls})
+            for c in calls:
+                self.assertEqual(2, len(c.kwargs['attachments']))
+
+
+    async def test_alert_email_digest_per_sender(self):
+        send = AsyncMock()
+        other = Feed()
+        other.group = {'name': 'othergroup'}
+
+        with patch('rssalertbot.alerts._send_email', send):
+            for feed, sender in ((Feed(), 'testgroup@example.com'), (other, 'othergroup@example.com')):
+                config = {
+                    'server':  'localhost',
+                    'from':    sender,
+                    'to':      'ops@example.com',
+                    'digest':  {'enabled': True},
+                }
+                await rssalertbot.alerts.alert_email(feed, config, self.alertmsg)
+            await rssalertbot.senders.close_all()
+
+        # each group's alerts are sent from that group
+        self.assertEqual({'testgroup@example.com', 'othergroup@example.com'},
+                         {c.args[1]['From'] for c in send.await_args_list})
@@ -0,0 +1,106 @@
+
+import pendulum
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from rssalertbot.bloom        import BloomFilter
+from rssalertbot.storage      import EVENT_FILTER_DIRTY
+from rssalertbot.storage.file import FileStorage
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_contains(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'feed-{i}')
+
+        # never a false negative
+        self.assertTrue(all(f'feed-{i}' in bloom for i in range(1000)))
+
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+        self.assertFalse(bloom.full)
+        bloom.add('one too many')
+        self.assertTrue(bloom.full)
+
+
+    def test_serialize(self):
+        bloom = BloomFilter(capacity=1000)
+        bloom.add('monkeys')
+
+        loaded = BloomFilter.from_bytes(bloom.to_bytes(), capacity=1000)
+        self.assertIn('monkeys', loaded)
+        self.assertNotIn('bananas', loaded)
+        self.assertEqual(1, loaded.count)
+
+        # sized differently
+        self.assertIsNone(BloomFilter.from_bytes(bloom.to_bytes(), capacity=2000))
+
+
+class EventFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.now = pendulum.now('UTC')
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def storage(self):
+        storage = FileStorage(path=self.tmpdir.name)
+        self.assertTrue(storage.open_event_filter(capacity=1000))
+        return storage
+
+
+    def test_skips_lookups(self):
+        storage = FileStorage(path=self.tmpdir.name)
+        storage.save_event('feed', 'old', self.now)
+
+        # the first time, it's built from what's stored
+        storage = self.storage()
+        with patch.object(storage, '_read', wraps=storage._read) as read:
+            self.assertIsNone(storage.load_event('feed', 'new'))
+            read.assert_not_called()
+            self.assertEqual(self.now, storage.load_event('feed', 'old'))
+            read.assert_called_once()
+        self.assertEqual((2, 1), (storage.filter_lookups, storage.filter_skipped))
+
+
+    def test_persisted(self):
+        storage = self.storage()
+        storage.save_event('feed', 'event', self.now)
+        storage.close_event_filter()
+        self.assertIsNone(storage._read_or_none(EVENT_FILTER_DIRTY))
+
+        storage = self.storage()
+        with patch.object(storage, '_list') as list_:
+            self.assertEqual(self.now, storage.load_event('feed', 'event'))
+            list_.assert_not_called()
+
+
+    def test_rebuilt_if_not_saved(self):
+        storage = self.storage()
+        storage.close_event_filter()
+
+        # a run that dies before saving the filter
+        storage = self.storage()
+        storage.save_event('feed', 'event', self.now)
+        self.assertIsNotNone(storage._read_or_none(EVENT_FILTER_DIRTY))
+
+        storage = self.storage()
+        self.assertEqual(self.now, storage.load_event('feed', 'event'))
+
+
+    def test_not_supported(self):
+        class Storage(FileStorage):
+            def _read_blob(self, name):
+                raise NotImplementedError
+
+        storage = Storage(path=self.tmpdir.name)
+        with self.assertLogs('rssalertbot.storage', 'WARNING'):
+            self.assertFalse(storage.open_event_filter())
+        self.assertIsNone(storage.event_filter)
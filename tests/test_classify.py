@@ -0,0 +1,83 @@
+
+import re
+import unittest
+from box import Box
+
+from rssalertbot.classify import Classifier, get_classifier, keyword_pattern
+
+
+class ClassifierTest(unittest.TestCase):
+
+    levels = {
+        'Degraded': 'warning',
+        'Outage':   'alert',
+        'Resolved': 'good',
+    }
+
+    entries = [
+        Box(title='Degraded performance',           description='Now Resolved'),
+        Box(title='Major Outage',                   description='We are investigating'),
+        Box(title='Maintenance scheduled',          description='Outage expected'),
+        Box(title='Something happened',             description='We are monitoring'),
+        Box(title='Something happened',             description='Resolved'),
+        Box(title='',                               description=''),
+        Box(title='Investigating - issue resolved', description=''),
+    ]
+
+
+    def test_levels_first_match(self):
+        classifier = Classifier(self.levels)
+        self.assertEqual('warning', classifier.classify('Degraded performance, Outage later'))
+        self.assertEqual('alert', classifier.classify('Outage, now Degraded'))
+
+
+    def test_levels_case_sensitive(self):
+        classifier = Classifier(self.levels)
+        # falls back to the defaults
+        self.assertEqual('good', classifier.classify('resolved'))
+
+
+    def test_levels_body(self):
+        classifier = Classifier(self.levels)
+        self.assertEqual('alert', classifier.classify('nothing here', 'Outage'))
+        self.assertEqual('good', classifier.classify('Resolved', 'Outage'))
+
+
+    def test_default_priority(self):
+        classifier = Classifier()
+        self.assertEqual('good', classifier.classify('Investigating - issue resolved'))
+        self.assertEqual('warning', classifier.classify('Investigating'))
+        self.assertEqual('warning', classifier.classify('nothing', 'MONITORING'))
+        self.assertEqual('alert', classifier.classify('nothing'))
+
+
+    def test_keywords_literal(self):
+        classifier = Classifier({'a.b': 'good'})
+        self.assertEqual('good', classifier.classify('a.b'))
+        self.assertEqual('alert', classifier.classify('axb'))
+
+
+    def test_classify_all(self):
+        for levels in (None, self.levels):
+            classifier = Classifier(levels)
+            for match_body in (False, True):
+                expected = [
+                    classifier.classify(e.title, e.description if match_body else None)
+                    for e in self.entries
+                ]
+                self.assertEqual(expected, classifier.classify_all(self.entries, match_body))
+
+
+    def test_get_classifier_cached(self):
+        self.assertIs(get_classifier(dict(self.levels)), get_classifier(dict(self.levels)))
+        self.assertIs(get_classifier(None), get_classifier({}))
+
+
+    def test_keyword_pattern(self):
+        regex = re.compile(keyword_pattern(['complete', 'completed', 'in progress', 'a.b']))
+        self.assertEqual(regex.search('it is completed').group(0), 'completed')
+        self.assertEqual(regex.search('it is complete').group(0), 'complete')
+        self.assertEqual(regex.search('in progress').group(0), 'in progress')
+        self.assertEqual(regex.search('a.b').group(0), 'a.b')
+        self.assertIsNone(regex.search('axb'))
+        self.assertIsNone(regex.search('compl'))
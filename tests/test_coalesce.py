@@ -0,0 +1,142 @@
+
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import pendulum
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from box import Box
+
+from rssalertbot.coalesce     import SharedFetches
+from rssalertbot.config       import Config
+from rssalertbot.feed         import Feed
+from rssalertbot.storage.file import FileStorage
+
+RSS = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>Status</title>
+<item><title>Investigating outage</title><description>Trouble!</description>
+<pubDate>{date}</pubDate></item>
+</channel></rss>"""
+
+ops = Box({
+    "name": "Ops",
+    "outputs": {"log": {"enabled": True}},
+    "alert_on_failure": True,
+})
+
+sales = Box({
+    "name": "Sales",
+    "outputs": {"log": {"enabled": True}},
+})
+
+
+class SharedFetchesTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.hits = 0
+        date = pendulum.now('UTC').subtract(minutes=5).to_rfc2822_string()
+
+        async def feed(request):
+            self.hits += 1
+            await asyncio.sleep(0.1)
+            return web.Response(text=RSS.format(date=date), content_type='application/rss+xml')
+
+        async def broken(request):
+            self.hits += 1
+            return web.Response(status=500, text="Oops")
+
+        app = web.Application()
+        app.router.add_get('/feed.xml', feed)
+        app.router.add_get('/broken.xml', broken)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.base = str(self.server.make_url(''))
+        self.fetches = SharedFetches()
+
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self.tmpdir.cleanup()
+
+
+    def make_feed(self, group, path, storage=None):
+        return Feed(Config({}), storage, group, 'status', self.base + path, fetches=self.fetches)
+
+
+    async def test_fetched_once(self):
+        first, second = self.make_feed(ops, '/feed.xml'), self.make_feed(sales, '/feed.xml')
+        self.assertTrue(self.fetches.is_shared(first))
+
+        entries = await asyncio.gather(first.fetch_and_parse(), second.fetch_and_parse())
+        self.assertEqual(1, self.hits)
+        self.assertEqual(entries[0], entries[1])
+
+        # each gets its own copy to change
+        entries[0][0]['level'] = 'danger'
+        self.assertNotIn('level', entries[1][0])
+
+        self.assertEqual('200', second.stats.status)
+        self.assertEqual(first.stats.response_bytes, second.stats.response_bytes)
+        self.assertIsNone(first.stats.shared_from)
+        self.assertEqual(first.feed, second.stats.shared_from)
+
+
+    async def test_not_shared(self):
+        feed = self.make_feed(ops, '/feed.xml')
+        other = Feed(Config({}), None, Box(sales, username='user', password='secret'),
+                     'status', self.base + '/feed.xml', fetches=self.fetches)
+        self.assertFalse(self.fetches.is_shared(feed))
+
+        await asyncio.gather(feed.fetch_and_parse(), other.fetch_and_parse())
+        self.assertEqual(2, self.hits)
+
+
+    async def test_failure(self):
+        first, second = self.make_feed(sales, '/broken.xml'), self.make_feed(ops, '/broken.xml')
+        with patch.object(first, 'alert', AsyncMock()) as first_alert, \
+             patch.object(second, 'alert', AsyncMock()) as second_alert:
+            await asyncio.gather(first.fetch_and_parse(), second.fetch_and_parse())
+
+        # only the group which asked to be alerted on failure is
+        self.assertEqual(1, self.hits)
+        first_alert.assert_not_called()
+        second_alert.assert_called_once()
+        self.assertEqual('HTTP error 500', second_alert.call_args.args[0].description)
+        self.assertEqual('500', second.stats.status)
+
+
+    async def test_cancelled(self):
+        first, second = self.make_feed(ops, '/feed.xml'), self.make_feed(sales, '/feed.xml')
+        task = asyncio.create_task(first.fetch_and_parse())
+        await asyncio.sleep(0.05)
+
+        fetching = asyncio.create_task(second.fetch_and_parse())
+        await asyncio.sleep(0)
+        task.cancel()
+
+        # it has a go itself
+        self.assertEqual(1, len(await fetching))
+        self.assertEqual(2, self.hits)
+        self.assertIsNone(second.stats.shared_from)
+
+
+    async def test_process(self):
+        storage = FileStorage(path=self.tmpdir.name)
+        first = self.make_feed(ops, '/feed.xml', storage)
+        second = self.make_feed(sales, '/feed.xml', storage)
+
+        with patch.object(first, 'alert', AsyncMock(return_value=True)) as first_alert, \
+             patch.object(second, 'alert', AsyncMock(return_value=True)) as second_alert:
+            await asyncio.gather(first.process(), second.process())
+
+        self.assertEqual(1, self.hits)
+        first_alert.assert_called_once()
+        second_alert.assert_called_once()
+        self.assertEqual(('ok', 'ok'), (first.stats.result, second.stats.result))
+
+        # each keeps its own progress
+        self.assertIsNotNone(storage.last_update(first.feed))
+        self.assertEqual(storage.last_update(first.feed), storage.last_update(second.feed))
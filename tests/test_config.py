@@ -1,9 +1,12 @@
 
+import copy
 import os
+import pickle
+import shutil
 import tempfile
 import unittest
 
-from rssalertbot.config import Config, dict_from_dotted_key
+from rssalertbot.config import Config, FrozenConfig, dict_from_dotted_key, freeze
 
 
 class ConfigTest(unittest.TestCase):
@@ -82,3 +85,83 @@ foo:
 
         # cleanup
         os.unlink(filename)
+
+
+    def test_config_from_files(self):
+        """
+        In which we load a conf.d directory and a file on top of it.
+        """
+        cfgdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cfgdir)
+
+        files = {
+            '10-first.yaml':    'foo:\n    bar: 32\n    baz: [1, 2]\n',
+            '20-second.yaml':   'foo:\n    bar: 96\n    qux: 1\n',
+            '.hidden.yaml':     'foo:\n    bar: 0\n',
+            'README':           'not config',
+        }
+        for name, data in files.items():
+            with open(os.path.join(cfgdir, name), 'w') as f:
+                f.write(data)
+
+        override = os.path.join(cfgdir, 'override.yml')
+        with open(override, 'w') as f:
+            f.write('foo:\n    baz: 3\n')
+
+        c = Config.from_files([cfgdir, override])
+        self.assertIsInstance(c, Config)
+        self.assertEqual(c.get('foo.bar'), 96)
+        self.assertEqual(c.get('foo.qux'), 1)
+        self.assertEqual(c.get('foo.baz'), 3)
+        self.assertEqual(c.foo.bar, 96)
+
+        # and the same, loading one at a time
+        c2 = Config()
+        c2.load(cfgdir)
+        c2.load(override)
+        self.assertEqual(c, c2)
+
+
+    def test_config_load_not_dict(self):
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml') as tf:
+            tf.write('- foo\n')
+            tf.flush()
+            with self.assertRaises(TypeError):
+                Config.from_files([tf.name])
+
+
+class FrozenConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.c = freeze(Config({
+            'foo': {
+                'bar': 32,
+                'baz': ['a', 'b'],
+            }
+        }))
+
+
+    def test_freeze(self):
+        self.assertIsInstance(self.c, FrozenConfig)
+        self.assertIsInstance(self.c['foo'], FrozenConfig)
+        self.assertEqual(('a', 'b'), self.c['foo']['baz'])
+        self.assertEqual(32, self.c.get('foo.bar'))
+        self.assertIsNone(self.c.get('foo.monkeys'))
+        self.assertEqual(32, self.c.foo.bar)
+        self.assertEqual({'foo': {'bar': 32, 'baz': ['a', 'b']}}, self.c.to_dict())
+
+
+    def test_read_only(self):
+        with self.assertRaises(TypeError):
+            self.c['foo'] = 1
+        with self.assertRaises(TypeError):
+            self.c['foo'].update({'bar': 1})
+        with self.assertRaises(TypeError):
+            del self.c['foo']
+
+
+    def test_copy(self):
+        self.assertIs(self.c, copy.deepcopy(self.c))
+        c = pickle.loads(pickle.dumps(self.c))
+        self.assertEqual(self.c, c)
+        self.assertIsInstance(c['foo'], FrozenConfig)
@@ -0,0 +1,86 @@
+
+import asyncio
+import unittest
+from box import Box
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from rssalertbot.config    import Config
+from rssalertbot.deadline  import Deadline
+from rssalertbot.dispatch  import Dispatcher
+from rssalertbot.feed      import Feed
+from rssalertbot.scheduler import run_feeds
+
+async def hang(*args):
+    await asyncio.sleep(10)
+
+
+group = Box({
+    "name": "Test Group",
+    "outputs": {"log": {"enabled": True}},
+})
+
+
+class DeadlineTest(unittest.IsolatedAsyncioTestCase):
+
+    def make_feed(self, name, dispatcher=None):
+        return Feed(Config({}), None, group, name, f'http://localhost/{name}', dispatcher=dispatcher)
+
+
+    async def test_remaining(self):
+        deadline = Deadline(10)
+        self.assertEqual(2, deadline.delivery)
+        self.assertAlmostEqual(8, deadline.feeds_remaining(), places=1)
+        self.assertAlmostEqual(10, deadline.remaining(), places=1)
+
+        deadline = Deadline()
+        self.assertIsNone(deadline.remaining())
+        self.assertIsNone(deadline.feeds_remaining())
+
+
+    async def test_stragglers_cancelled(self):
+        fast = self.make_feed('fast')
+        slow = self.make_feed('slow')
+
+        async def process(feed, timeout):
+            await asyncio.sleep(0 if feed is fast else 10)
+
+        with patch.object(Feed, '_process', autospec=True, side_effect=process):
+            with self.assertLogs('rssalertbot.feed', 'WARNING') as logs:
+                cancelled = await run_feeds([fast, slow], 10, Deadline(0.2, delivery=0.1))
+
+        self.assertEqual([slow], cancelled)
+        self.assertEqual('ok', fast.stats.result)
+        self.assertEqual('cancelled', slow.stats.result)
+        self.assertIn("Cancelled feed slow at the run deadline, while fetching", logs.output[0])
+
+
+    async def test_queued_alerts_cancelled(self):
+        dispatcher = Dispatcher(workers=1)
+        feed = self.make_feed('feed', dispatcher)
+        feed.alert = AsyncMock(side_effect=hang)
+
+        async def process(timeout):
+            # the first alert gets stuck, so the second waits in the queue
+            deliveries = [await feed._dispatch(entry) for entry in ('one', 'two')]
+            await asyncio.gather(*deliveries)
+
+        feed._process = process
+        with self.assertLogs('rssalertbot.feed', 'WARNING'):
+            await run_feeds([feed], 10, Deadline(0.2, delivery=0.1))
+
+        self.assertEqual(2, len(feed.queued))
+        self.assertTrue(all(future.cancelled() for future in feed.queued))
+        await dispatcher.close(timeout=0)
+
+
+    async def test_fetch_cancelled(self):
+        # being cancelled from outside isn't a fetch timeout
+        feed = self.make_feed('feed')
+        session = MagicMock()
+        session.get.return_value.__aenter__ = AsyncMock(side_effect=hang)
+        task = asyncio.create_task(feed._fetch(session, timeout=5))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertIsNone(feed.stats.status)
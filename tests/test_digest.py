@@ -0,0 +1,136 @@
+
+import asyncio
+import feedparser
+import pendulum
+import tempfile
+import unittest
+from box import Box
+from unittest.mock import AsyncMock, patch
+
+import rssalertbot.senders
+from rssalertbot.config       import Config
+from rssalertbot.deadline     import Deadline
+from rssalertbot.digest       import Digest, all_sent
+from rssalertbot.dispatch     import Dispatcher
+from rssalertbot.feed         import Feed
+from rssalertbot.main         import _save_progress
+from rssalertbot.senders      import get_sender
+from rssalertbot.storage.file import FileStorage
+
+
+class DigestTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncTearDown(self):
+        await rssalertbot.senders.close_all()
+
+
+    async def test_send_on_close(self):
+        send = AsyncMock()
+        digest = get_sender(Digest, 'foo', send=send)
+        digest.add(1)
+        digest.add(2)
+        send.assert_not_awaited()
+
+        await rssalertbot.senders.close_all()
+        send.assert_awaited_once_with([1, 2])
+
+
+    async def test_window(self):
+        send = AsyncMock()
+        digest = Digest(send, window=0.01)
+        digest.add(1)
+        digest.add(2)
+
+        await asyncio.sleep(0.05)
+        send.assert_awaited_once_with([1, 2])
+
+        digest.add(3)
+        await digest.close()
+        send.assert_awaited_with([3])
+
+
+    async def test_max_entries(self):
+        send = AsyncMock()
+        digest = Digest(send, max_entries=2)
+        for i in range(5):
+            digest.add(i)
+        await digest.close()
+
+        self.assertEqual([[0, 1], [2, 3], [4]], [c.args[0] for c in send.await_args_list])
+
+
+    async def test_sent(self):
+        send = AsyncMock(side_effect=[None, Exception("nope")])
+        digest = Digest(send, max_entries=2)
+        first, second, third = digest.add(1), digest.add(2), digest.add(3)
+        self.assertFalse(third.done())
+
+        await digest.close()
+        self.assertEqual([True, True, False], [first.result(), second.result(), third.result()])
+        self.assertTrue(await all_sent([first, second]))
+        self.assertFalse(await all_sent([first, third]))
+
+
+class DigestProgressTest(unittest.IsolatedAsyncioTestCase):
+
+    group = Box({
+        "name": "Test Group",
+        "outputs": {
+            "slack": {
+                "enabled": True,
+                "channel": "#foo",
+                "token":   "monkeys",
+                "digest":  {"enabled": True},
+            },
+        },
+    })
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.storage = FileStorage(path=self.tmpdir.name)
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    async def process(self, send, dispatcher=None):
+        date = pendulum.now('UTC').subtract(minutes=5)
+        feed = Feed(Config(), self.storage, self.group, 'status', 'http://localhost:8930',
+                    dispatcher=dispatcher)
+        feed.fetch_and_parse = AsyncMock(return_value=feedparser.parse(
+            "<rss version='2.0'><channel><title>Status</title><item><title>Outage</title>"
+            f"<description>Trouble!</description><pubDate>{date.to_rss_string()}</pubDate>"
+            "</item></channel></rss>").entries)
+
+        with patch('rssalertbot.alerts._send_slack', send):
+            await feed.process()
+            self.assertEqual('ok', feed.stats.result)
+
+            # nothing's saved until the digest is sent
+            self.assertIsNotNone(feed.progress)
+            self.assertIsNone(self.storage.last_update(feed.feed))
+            send.assert_not_awaited()
+
+            if dispatcher:
+                await dispatcher.close()
+            await rssalertbot.senders.close_all()
+            await _save_progress([feed], Deadline())
+        return feed, date
+
+
+    async def test_saved_once_sent(self):
+        feed, date = await self.process(AsyncMock())
+        self.assertEqual(date.int_timestamp, self.storage.last_update(feed.feed).int_timestamp)
+        self.assertEqual(1, feed.stats.alerts_sent)
+
+
+    async def test_dispatched(self):
+        feed, date = await self.process(AsyncMock(), Dispatcher())
+        self.assertEqual(date.int_timestamp, self.storage.last_update(feed.feed).int_timestamp)
+
+
+    async def test_not_saved_if_not_sent(self):
+        feed, _ = await self.process(AsyncMock(side_effect=Exception("nope")))
+        self.assertIsNone(self.storage.last_update(feed.feed))
+        self.assertEqual(1, feed.stats.alerts_failed)
@@ -0,0 +1,106 @@
+
+import asyncio
+import unittest
+
+from rssalertbot.dispatch import Dispatcher
+
+
+class DispatcherTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_results(self):
+        async def double(x):
+            return x * 2
+
+        dispatcher = Dispatcher(workers=2)
+        futures = [await dispatcher.submit(double, i) for i in range(5)]
+        self.assertEqual([0, 2, 4, 6, 8], await asyncio.gather(*futures))
+        await dispatcher.close()
+
+
+    async def test_exception(self):
+        async def fail():
+            raise ValueError("nope")
+
+        dispatcher = Dispatcher()
+        future = await dispatcher.submit(fail)
+        with self.assertRaises(ValueError):
+            await future
+        await dispatcher.close()
+
+
+    async def test_concurrent(self):
+        running = []
+        peak = 0
+
+        async def work():
+            nonlocal peak
+            running.append(1)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+        dispatcher = Dispatcher(workers=3)
+        for _ in range(9):
+            await dispatcher.submit(work)
+        await dispatcher.close()
+        self.assertEqual(3, peak)
+
+
+    async def test_backpressure(self):
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+
+        dispatcher = Dispatcher(workers=1, queue_size=1)
+        await dispatcher.submit(blocked)
+        await asyncio.sleep(0)          # the worker picks up the first one
+        await dispatcher.submit(blocked)
+
+        # the queue is full now
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(dispatcher.submit(blocked), timeout=0.05)
+
+        release.set()
+        await dispatcher.close()
+
+
+    async def test_close_timeout(self):
+        sent = []
+
+        async def slow(x):
+            await asyncio.sleep(0.2)
+            sent.append(x)
+
+        dispatcher = Dispatcher(workers=1)
+        futures = [await dispatcher.submit(slow, i) for i in range(3)]
+        with self.assertLogs('rssalertbot.dispatch', 'WARNING'):
+            await dispatcher.close(timeout=0.1)
+        self.assertEqual([], sent)
+        self.assertTrue(all(future.cancelled() for future in futures[1:]))
+
+
+    async def test_cancelled_skipped(self):
+        sent = []
+
+        async def send(x):
+            sent.append(x)
+
+        dispatcher = Dispatcher(workers=1)
+        futures = [await dispatcher.submit(send, i) for i in range(3)]
+        futures[1].cancel()
+        await dispatcher.close()
+        self.assertEqual([0, 2], sent)
+
+
+    async def test_priority(self):
+        sent = []
+
+        async def send(x):
+            sent.append(x)
+
+        dispatcher = Dispatcher(workers=1)
+        for x, priority in (('low', 0), ('high', 10), ('low2', 0), ('mid', 5)):
+            await dispatcher.submit(send, x, priority=priority)
+        await dispatcher.close()
+        self.assertEqual(['high', 'mid', 'low', 'low2'], sent)
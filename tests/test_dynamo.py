@@ -0,0 +1,24 @@
+
+import unittest
+
+try:
+    import pynamodb
+except ImportError:
+    pynamodb = None
+
+
+@unittest.skipUnless(pynamodb, "pynamodb not installed")
+class DynamoStorageTest(unittest.TestCase):
+
+    def test_import(self):
+        from rssalertbot.storage.dynamo import DynamoStorage, FeedState
+
+        self.assertTrue(DynamoStorage.not_found_exception_class)
+        self.assertEqual('RSSAlertbotFeeds', FeedState.Meta.table_name)
+
+
+    def test_data_roundtrip(self):
+        from rssalertbot.storage.dynamo import FeedState
+
+        data = FeedState.data.serialize(b'\x00\xffblob')
+        self.assertEqual(b'\x00\xffblob', FeedState.data.deserialize(data))
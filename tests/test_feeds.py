@@ -1,5 +1,6 @@
 
 import aiohttp
+import asyncio
 import base64
 import copy
 import feedparser
@@ -12,8 +13,11 @@ from box import Box
 from hashlib import md5
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from rssalertbot.config  import Config
-from rssalertbot.feed    import Feed
+from rssalertbot          import metrics
+from rssalertbot.config   import Config
+from rssalertbot.dedup    import DedupIndex, DEDUP_EXPIRED
+from rssalertbot.dispatch import Dispatcher
+from rssalertbot.feed     import Feed, resolve_dedup, resolve_outputs
 from rssalertbot.storage import BaseStorage
 
 group = Box({
@@ -63,6 +67,9 @@ class MockStorage(BaseStorage):
     def _delete(self, name):
         del self.data[name]
 
+    def _list(self):
+        return iter(self.data)
+
 
 class TestFeeds(unittest.IsolatedAsyncioTestCase):
 
@@ -120,12 +127,12 @@ class TestFeeds(unittest.IsolatedAsyncioTestCase):
         self.assertTrue(feed.outputs.get('slack.enabled'))
 
         with patch('rssalertbot.alerts', new=AsyncMock) as alerts:
-            alerts.alert_email = MagicMock()
+            alerts.alert_email = AsyncMock()
             alerts.alert_log = MagicMock()
             alerts.alert_slack = AsyncMock()
 
             await feed.alert(self.make_entry())
-            alerts.alert_email.assert_called()
+            alerts.alert_email.assert_awaited()
             alerts.alert_log.assert_called()
             alerts.alert_slack.assert_awaited()
 
@@ -157,6 +164,35 @@ class TestFeeds(unittest.IsolatedAsyncioTestCase):
             )
 
 
+    def test_shared_outputs(self):
+        """
+        In which the feeds in a group share one read-only output config.
+        """
+        config = Config({
+            'outputs': {
+                'email': {
+                    'enabled': True,
+                    'from':    'monkey@jwplayer.test',
+                    'to':      ['monkey@jwplayer.test'],
+                },
+            },
+        })
+
+        outputs = resolve_outputs(config, group)
+        feeds = [
+            Feed(config, MockStorage(), group, name, testdata['url'], outputs=outputs)
+            for name in ('one', 'two')
+        ]
+        self.assertIs(feeds[0].outputs, feeds[1].outputs)
+        self.assertEqual('Test Group Feeds <monkey@jwplayer.test>', outputs.get('email.from'))
+        self.assertTrue(outputs.get('log.enabled'))
+
+        # and the main config wasn't touched
+        self.assertEqual('monkey@jwplayer.test', config.get('outputs.email.from'))
+        with self.assertRaises(TypeError):
+            outputs['email']['enabled'] = False
+
+
     async def test_alerts_disabled(self):
         """
         In which we make sure disabled alerts are NOT called.
@@ -186,12 +222,12 @@ class TestFeeds(unittest.IsolatedAsyncioTestCase):
         self.assertTrue(feed.outputs.get('log.enabled'))
 
         with patch('rssalertbot.alerts') as alerts:
-            alerts.alert_email = MagicMock()
+            alerts.alert_email = AsyncMock()
             alerts.alert_log = MagicMock()
             alerts.alert_slack = AsyncMock()
 
             await feed.alert(self.make_entry())
-            alerts.alert_email.assert_not_called()
+            alerts.alert_email.assert_not_awaited()
             alerts.alert_slack.assert_not_awaited()
 
             # again, the group overrides this!
@@ -290,6 +326,23 @@ class TestFeedProcessing(unittest.IsolatedAsyncioTestCase):
         self.assert_timestamps_equal(self.publish_date, self.feed.storage.data[self.feed.feed])
 
 
+    async def test_process_stats(self):
+        self.publish_date = self.publish_date.subtract(minutes=5)
+        await self.process_feed()
+        self.assertEqual('ok', self.feed.stats.result)
+        self.assertEqual(1, self.feed.stats.entries_new)
+        # last update, the event, then the new date
+        self.assertEqual(3, self.feed.stats.storage_ops)
+        self.assertIsNotNone(self.feed.stats.seconds)
+
+
+    async def test_process_stats_error(self):
+        self.feed.fetch_and_parse = AsyncMock(side_effect=Exception("nope"))
+        with self.assertRaises(Exception):
+            await self.feed.process()
+        self.assertEqual('error', self.feed.stats.result)
+
+
     async def test_process_new_future_event(self):
         self.publish_date = self.publish_date.add(minutes=10)
         await self.process_feed()
@@ -343,6 +396,30 @@ class TestFeedProcessing(unittest.IsolatedAsyncioTestCase):
         self.assert_timestamps_equal(self.publish_date, self.storage.data[self.feed.feed])
 
 
+    async def test_process_not_delivered(self):
+        self.publish_date = self.publish_date.subtract(minutes=5)
+        self.feed.alert.return_value = False
+        await self.process_feed()
+        self.feed.alert.assert_called()
+        self.assertNotIn(self.feed.feed, self.storage.data)
+
+
+    async def test_process_future_event_not_delivered(self):
+        self.publish_date = self.publish_date.add(minutes=10)
+        self.feed.alert.return_value = False
+        await self.process_feed()
+        self.storage.save_event.assert_not_called()
+
+
+    async def test_process_dispatcher(self):
+        self.publish_date = self.publish_date.subtract(minutes=5)
+        self.feed.dispatcher = Dispatcher()
+        await self.process_feed()
+        await self.feed.dispatcher.close()
+        self.feed.alert.assert_called()
+        self.assert_timestamps_equal(self.publish_date, self.feed.storage.data[self.feed.feed])
+
+
     async def test_process_multiple_messages(self):
         self.publish_date = self.publish_date.subtract(minutes=10)
         future_event_title = "Notice: The future is coming"
@@ -388,6 +465,170 @@ class TestFeedProcessing(unittest.IsolatedAsyncioTestCase):
         self.assert_timestamps_equal(self.publish_date, self.storage.data[self.feed.feed])
 
 
+    async def test_process_multiple_messages_not_delivered(self):
+        """
+        The date shouldn't move past an older entry that wasn't delivered,
+        even if a newer one was.
+        """
+        rss = f"""
+        <rss xmlns:dc="http://purl.org/dc/elements/1.1/" version="2.0">
+            <channel>
+                <item>
+                    <title>newer</title>
+                    <description>newer</description>
+                    <pubDate>{self.now.subtract(minutes=5).to_rss_string()}</pubDate>
+                </item>
+                <item>
+                    <title>older</title>
+                    <description>older</description>
+                    <pubDate>{self.now.subtract(minutes=10).to_rss_string()}</pubDate>
+                </item>
+            </channel>
+        </rss>
+        """
+        self.feed.alert.side_effect = lambda entry: entry.title == 'newer'
+        await self.process_feed(rss)
+        self.assertEqual(2, self.feed.alert.call_count)
+        self.assertNotIn(self.feed.feed, self.storage.data)
+
+
+class TestFeedDedup(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.publish_date = pendulum.now('UTC').subtract(minutes=5)
+        self.storage = MockStorage()
+        self.dedup = DedupIndex(self.storage)
+
+
+    def make_feed(self, name, mygroup=group, dedup=None, cfg=None):
+        mygroup = copy.deepcopy(mygroup)
+        mygroup['dedup'] = dedup if dedup is not None else {'enabled': True}
+        feed = Feed(Config(cfg or {}), self.storage, mygroup, name, testdata['url'], dedup=self.dedup)
+        feed.alert = AsyncMock(return_value=True)
+        feed.fetch_and_parse = AsyncMock(return_value=feedparser.parse(rss_data(self.publish_date)).entries)
+        return feed
+
+
+    async def process(self, feed):
+        # as main does, once the alerts have been sent
+        await feed.process()
+        if feed.progress:
+            await feed.progress
+
+
+    async def test_dedup(self):
+        feeds = [self.make_feed('one'), self.make_feed('two')]
+        for feed in feeds:
+            await self.process(feed)
+
+        self.assertEqual(1, feeds[0].alert.call_count)
+        feeds[1].alert.assert_not_called()
+        for feed in feeds:
+            self.assertIn(feed.feed, self.storage.data)
+
+        # and on the next run, too
+        self.dedup = DedupIndex(self.storage)
+        feed = self.make_feed('three')
+        await self.process(feed)
+        feed.alert.assert_not_called()
+
+
+    async def test_dedup_concurrent(self):
+        feeds = [self.make_feed('one'), self.make_feed('two')]
+        await asyncio.gather(*(feed.process() for feed in feeds))
+        self.assertEqual(1, sum(feed.alert.call_count for feed in feeds))
+
+
+    async def test_dedup_not_delivered(self):
+        feeds = [self.make_feed('one'), self.make_feed('two')]
+        feeds[0].alert.return_value = False
+        for feed in feeds:
+            await self.process(feed)
+
+        # the first one will retry next run, the second one had a go itself
+        self.assertNotIn(feeds[0].feed, self.storage.data)
+        feeds[1].alert.assert_called()
+        self.assertIn(feeds[1].feed, self.storage.data)
+
+
+    async def test_dedup_not_delivered_waiting(self):
+        feeds = [self.make_feed('one'), self.make_feed('two')]
+        release = asyncio.Event()
+
+        async def alert(entry):
+            await release.wait()
+            return False
+
+        feeds[0].alert.side_effect = alert
+        first = asyncio.create_task(feeds[0].process())
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(feeds[1].process())
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(first, second)
+
+        # the second was waiting on the first, so nobody moves on
+        feeds[1].alert.assert_not_called()
+        for feed in feeds:
+            self.assertNotIn(feed.feed, self.storage.data)
+
+
+    async def test_dedup_scope(self):
+        other_group = Box({'name': 'Other Group'})
+        feeds = [self.make_feed('one'), self.make_feed('two', other_group)]
+        for feed in feeds:
+            await self.process(feed)
+        for feed in feeds:
+            feed.alert.assert_called()
+
+
+    async def test_dedup_global(self):
+        other_group = Box({'name': 'Other Group'})
+        cfg = {'dedup': {'enabled': True, 'scope': 'global'}}
+        feeds = [self.make_feed('one', dedup={}, cfg=cfg), self.make_feed('two', other_group, dedup={}, cfg=cfg)]
+        for feed in feeds:
+            await self.process(feed)
+        self.assertEqual(1, sum(feed.alert.call_count for feed in feeds))
+
+
+    async def test_dedup_disabled(self):
+        feeds = [self.make_feed('one', dedup={}), self.make_feed('two', dedup={})]
+        for feed in feeds:
+            await self.process(feed)
+        for feed in feeds:
+            feed.alert.assert_called()
+
+
+    async def test_dedup_expire(self):
+        feed = self.make_feed('one')
+        await self.process(feed)
+        stored = [name for name in self.storage.data if name.startswith('dedup-')]
+        self.assertEqual(1, len(stored))
+
+        # still in the window
+        now = pendulum.now('UTC')
+        self.assertEqual(0, self.dedup.expire(now.add(hours=23), {feed.dedup_scope: 24}))
+        self.assertIn(stored[0], self.storage.data)
+
+        # only checked once an interval
+        self.storage.data.pop(DEDUP_EXPIRED)
+        with patch.object(self.storage, '_list', wraps=self.storage._list) as list_:
+            self.assertEqual(1, self.dedup.expire(now.add(hours=25), {feed.dedup_scope: 24}))
+            self.assertEqual(0, self.dedup.expire(now.add(hours=26), {}))
+            list_.assert_called_once()
+        self.assertNotIn(stored[0], self.storage.data)
+
+
+    def test_dedup_cfg_shared(self):
+        mygroup = Box(group, dedup={'window': 12})
+        dedup_cfg = resolve_dedup(Config({'dedup': {'enabled': True}}), mygroup)
+        self.assertEqual({'enabled': True, 'window': 12}, dedup_cfg.to_dict())
+
+        feeds = [Feed(Config(), self.storage, mygroup, name, testdata['url'], dedup_cfg=dedup_cfg)
+                 for name in ('one', 'two')]
+        self.assertIs(feeds[0].dedup_cfg, feeds[1].dedup_cfg)
+
+
 class TestFeedFetchAndParse(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
@@ -399,7 +640,8 @@ class TestFeedFetchAndParse(unittest.IsolatedAsyncioTestCase):
         # Mock a valid async http get return
         self.mock_getresp = AsyncMock()
         self.mock_getresp.status = 200
-        self.mock_getresp.text.return_value = rss_data()
+        self.mock_getresp.read.return_value = rss_data().encode('utf-8')
+        self.mock_getresp.get_encoding = MagicMock(return_value='utf-8')
 
         # Patch the get and set up contect manager mocking
         aiohttp_get_patcher = patch.object(aiohttp.ClientSession, 'get')
@@ -408,9 +650,22 @@ class TestFeedFetchAndParse(unittest.IsolatedAsyncioTestCase):
         self.addCleanup(aiohttp_get_patcher.stop)
 
     async def test_fetch(self):
-        parsed_rss = feedparser.parse(self.mock_getresp.text.return_value)
+        parsed_rss = feedparser.parse(self.mock_getresp.read.return_value)
         fetch_and_parse_entires = await self.feed.fetch_and_parse()
         self.assertListEqual(parsed_rss.entries, fetch_and_parse_entires)
+        self.assertEqual(len(self.mock_getresp.read.return_value), self.feed.stats.response_bytes)
+
+    async def test_fetch_metrics(self):
+        metrics.REGISTRY.clear()
+        self.mock_getresp.status = 500
+        await self.feed.fetch_and_parse()
+        self.mock_getresp.status = 200
+        await self.feed.fetch_and_parse()
+
+        self.assertEqual(1, metrics.FETCHES.values[('localhost', '500')])
+        self.assertEqual(1, metrics.FETCHES.values[('localhost', '200')])
+        self.assertEqual(2, sum(metrics.FETCH_SECONDS.values[('localhost',)][:-1]))
+        self.assertEqual(1, sum(metrics.PARSE_SECONDS.values[()][:-1]))
 
     async def test_fetch_auth(self):
         self.feed._fetch = AsyncMock(return_value=None)
@@ -422,10 +677,10 @@ class TestFeedFetchAndParse(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(headers, self.feed._fetch.call_args.args[0]._default_headers)
 
     async def test_fetch_not_rss(self):
-        self.mock_getresp.text.return_value = "This isn't RSS!"
+        self.mock_getresp.read.return_value = b"This isn't RSS!"
         with self.assertLogs(level=logging.ERROR) as log:
             await self.feed.fetch_and_parse()
-        parsed_bad_data = feedparser.parse(self.mock_getresp.text.return_value)
+        parsed_bad_data = feedparser.parse(self.mock_getresp.read.return_value)
         self.assertEqual(f"No valid RSS data from feed {self.feed.url}: {parsed_bad_data.bozo_exception}", log.records[0].getMessage())
 
     async def test_fetch_http_error(self):
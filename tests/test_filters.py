@@ -0,0 +1,111 @@
+
+import feedparser
+import pendulum
+import unittest
+from box import Box
+from unittest.mock import AsyncMock, MagicMock
+
+from rssalertbot.config  import Config
+from rssalertbot.feed    import Feed
+from rssalertbot.filters import EntryFilter, get_entry_filter
+from rssalertbot.storage import BaseStorage
+
+
+def rss_data(*items):
+    date = pendulum.now('UTC').to_rss_string()
+    return "<rss version='2.0'><channel><title>Status</title>" + "".join(
+        f"<item><title>{title}</title><description>{description}</description>"
+        f"<category>{category}</category><pubDate>{date}</pubDate></item>"
+        for title, description, category in items) + "</channel></rss>"
+
+
+entries = feedparser.parse(rss_data(
+    ("Amazon S3 outage",            "Increased error rates",    "us-east-1"),
+    ("EC2 degraded",                "Instances unreachable",    "us-west-2"),
+    ("Scheduled maintenance",       "Nothing to see here",      "us-east-1"),
+)).entries
+
+
+class EntryFilterTest(unittest.TestCase):
+
+    def passed(self, entry_filter):
+        return [entry.title for entry in entries if entry_filter(entry)]
+
+
+    def test_include(self):
+        self.assertEqual(['Amazon S3 outage'], self.passed(EntryFilter(include={'title': ['S3']})))
+        self.assertEqual(['EC2 degraded'], self.passed(EntryFilter(include={'body': [r'unreach\w+']})))
+        # any of the rules
+        self.assertEqual(['Amazon S3 outage', 'EC2 degraded'],
+                         self.passed(EntryFilter(include={'title': ['S3'], 'body': ['unreachable']})))
+
+
+    def test_exclude(self):
+        self.assertEqual(['Amazon S3 outage', 'EC2 degraded'],
+                         self.passed(EntryFilter(exclude={'keywords': ['MAINTENANCE']})))
+        self.assertEqual(['Amazon S3 outage'],
+                         self.passed(EntryFilter(include={'category': ['US-EAST-1']},
+                                                 exclude={'title': ['maintenance']})))
+
+
+    def test_keywords(self):
+        # in the title or body, case-insensitively
+        self.assertEqual(['Amazon S3 outage', 'Scheduled maintenance'],
+                         self.passed(EntryFilter(include={'keywords': ['outage', 'nothing']})))
+
+
+    def test_get_entry_filter(self):
+        self.assertIsNone(get_entry_filter(None, {}))
+
+        group = Box({'include': {'title': 'S3'}})
+        entry_filter = get_entry_filter(group, {'exclude': {'category': ['us-west-2']}})
+        self.assertIs(entry_filter, get_entry_filter(group, {'exclude': {'category': ['us-west-2']}}))
+        self.assertEqual(['Amazon S3 outage'], self.passed(entry_filter))
+
+        with self.assertRaises(ValueError):
+            get_entry_filter({'include': {'title': ['(']}})
+        with self.assertRaises(ValueError):
+            get_entry_filter({'include': {'link': ['x']}})
+
+
+class MockStorage(BaseStorage):
+
+    def __init__(self):
+        self.data = {}
+
+    def _read(self, name):
+        return self.data.get(name)
+
+    def _write(self, name, date):
+        self.data[name] = date
+
+    def _delete(self, name):
+        del self.data[name]
+
+
+class FeedFilterTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_process(self):
+        group = Box({
+            "name":    "Test Group",
+            "outputs": {"log": {"enabled": True}},
+            "filter":  {"include": {"category": ["us-east-1"]}},
+        })
+        storage = MockStorage()
+        storage.load_event = MagicMock(wraps=storage.load_event)
+
+        feed = Feed(Config(), storage, group, 'status', 'http://localhost:8930',
+                    filters={'exclude': {'keywords': ['maintenance']}})
+        feed.alert = AsyncMock(return_value=True)
+        feed.fetch_and_parse = AsyncMock(return_value=feedparser.parse(rss_data(
+            ("Amazon S3 outage",        "Increased error rates",    "us-east-1"),
+            ("EC2 degraded",            "Instances unreachable",    "us-west-2"),
+            ("Scheduled maintenance",   "Nothing to see here",      "us-east-1"),
+        )).entries)
+        await feed.process()
+
+        # the others never get as far as storage
+        storage.load_event.assert_called_once()
+        feed.alert.assert_called_once()
+        self.assertEqual('Amazon S3 outage', feed.alert.call_args.args[0].title)
+        self.assertEqual((1, 2), (feed.stats.entries_new, feed.stats.entries_filtered))
@@ -0,0 +1,103 @@
+
+import asyncio
+import sys
+import unittest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from box import Box
+from unittest.mock import patch
+
+from rssalertbot.config import Config
+from rssalertbot.feed   import Feed
+from rssalertbot.http2  import current_fetcher
+from rssalertbot.main   import setup_fetcher
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+RSS = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>Status</title>
+<item><title>Investigating</title><description>Trouble!</description>
+<pubDate>Tue, 14 Oct 2025 17:42:10 +0000</pubDate></item>
+</channel></rss>"""
+
+group = Box({
+    "name": "Test Group",
+    "outputs": {"log": {"enabled": True}},
+})
+
+
+class HTTP2Test(unittest.IsolatedAsyncioTestCase):
+
+    def test_disabled(self):
+        self.assertIsNone(setup_fetcher(Config({})))
+
+
+    def test_not_installed(self):
+        with patch.dict(sys.modules, {'httpx': None}):
+            with self.assertLogs('rssalertbot.main', 'ERROR'):
+                self.assertIsNone(setup_fetcher(Config({'http2': True})))
+
+
+    async def fetch(self, path, timeout=10):
+        seen = []
+
+        async def handler(request):
+            seen.append(request.headers.get('Authorization'))
+            return web.Response(text=RSS, content_type='application/rss+xml')
+
+        async def moved(request):
+            raise web.HTTPMovedPermanently('/feed.xml')
+
+        async def slow(request):
+            await asyncio.sleep(2)
+            return web.Response(text=RSS, content_type='application/rss+xml')
+
+        app = web.Application()
+        app.router.add_get('/feed.xml', handler)
+        app.router.add_get('/moved.xml', moved)
+        app.router.add_get('/slow.xml', slow)
+        server = TestServer(app)
+        await server.start_server()
+
+        # the test server only speaks HTTP/1.1, so this is the fallback
+        fetcher = setup_fetcher(Config({'http2': True}))
+        current_fetcher.set(fetcher)
+        try:
+            feed = Feed(Config({}), None, group, 'feed', str(server.make_url(path)))
+            feed.username, feed.password = 'user', 'pass'
+            entries = await feed.fetch_and_parse(timeout)
+        finally:
+            current_fetcher.set(None)
+            await fetcher.close()
+            await server.close()
+        return feed, entries, seen
+
+
+    @unittest.skipUnless(httpx, "httpx not installed")
+    async def test_fetch(self):
+        feed, entries, seen = await self.fetch('/feed.xml')
+        self.assertEqual(1, len(entries))
+        self.assertEqual('200', feed.stats.status)
+        self.assertTrue(seen[0].startswith('Basic '))
+
+
+    @unittest.skipUnless(httpx, "httpx not installed")
+    async def test_redirect(self):
+        feed, entries, _ = await self.fetch('/moved.xml')
+        self.assertEqual(1, len(entries))
+        self.assertEqual('200', feed.stats.status)
+
+
+    @unittest.skipUnless(httpx, "httpx not installed")
+    async def test_timeout(self):
+        # it's the feed's timeout, not httpx's
+        fetcher = setup_fetcher(Config({'http2': True}))
+        self.assertIsNone(fetcher.client.timeout.read)
+        await fetcher.close()
+
+        feed, entries, _ = await self.fetch('/slow.xml', timeout=0.5)
+        self.assertEqual([], entries)
+        self.assertEqual('timeout', feed.stats.status)
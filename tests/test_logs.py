@@ -0,0 +1,86 @@
+
+import io
+import json
+import logging
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import rssalertbot.alerts
+from rssalertbot.logs import JSONFormatter, LogQueue
+
+
+class Feed:
+    name = "test"
+    group = {
+        'name': 'testgroup'
+    }
+
+
+class LogsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = logging.StreamHandler(self.stream)
+        self.root = logging.getLogger()
+        self.saved = self.root.handlers[:], self.root.level
+        self.root.handlers = [self.handler]
+        self.root.setLevel(logging.INFO)
+
+
+    def tearDown(self):
+        self.root.handlers, level = self.saved
+        self.root.setLevel(level)
+
+
+    def test_json(self):
+        self.handler.setFormatter(JSONFormatter())
+        feed = Feed()
+        rssalertbot.alerts.feed_logger(feed).warning("[%s] %s", feed.name, "Outage")
+        logging.getLogger('rssalertbot.test').error("Oops", exc_info=ValueError('nope'))
+
+        alert, error = [json.loads(line) for line in self.stream.getvalue().splitlines()]
+        self.assertEqual('[test] Outage', alert['message'])
+        self.assertEqual(('WARNING', 'rssalertbot.alerts'), (alert['level'], alert['logger']))
+        self.assertEqual(('test', 'testgroup'), (alert['feed'], alert['group']))
+        self.assertTrue(alert['time'].endswith('Z'))
+        self.assertNotIn('feed', error)
+        self.assertIn('ValueError: nope', error['exception'])
+
+
+    def test_json_time_utc(self):
+        self.handler.setFormatter(JSONFormatter())
+        self.addCleanup(time.tzset)
+        with patch.dict(os.environ, {'TZ': 'America/New_York'}):
+            time.tzset()
+            record = logging.makeLogRecord({'msg': 'hello', 'created': 1760463730.5, 'msecs': 500})
+            self.assertEqual('2025-10-14T17:42:10.500Z', json.loads(self.handler.format(record))['time'])
+
+
+    def test_queue(self):
+        threads = []
+
+        class Handler(logging.Handler):
+            def emit(self, record):
+                threads.append(threading.current_thread())
+
+        handler = Handler()
+        self.root.handlers = [handler]
+
+        log_queue = LogQueue()
+        log_queue.start()
+        logging.getLogger('rssalertbot.test').warning("in the background")
+        log_queue.stop()
+
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(threading.current_thread(), threads[0])
+        self.assertEqual([handler], self.root.handlers)
+
+
+    def test_feed_logger(self):
+        feed = Feed()
+        logger = rssalertbot.alerts.feed_logger(feed)
+        self.assertIs(logger, rssalertbot.alerts.feed_logger(feed))
+        self.assertIsNot(logger, rssalertbot.alerts.feed_logger(Feed()))
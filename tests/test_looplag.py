@@ -0,0 +1,62 @@
+
+import asyncio
+import time
+import unittest
+from box import Box
+
+from rssalertbot.config  import Config
+from rssalertbot.feed    import Feed
+from rssalertbot.looplag import LagMonitor, clear_feed, percentile, set_feed
+
+
+def block(self, seconds):
+    time.sleep(seconds)
+
+
+class LagMonitorTest(unittest.IsolatedAsyncioTestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(99, percentile(values, 99))
+        self.assertEqual(1, percentile([1], 90))
+        self.assertIsNone(percentile([], 50))
+
+
+    async def test_blocked(self):
+        feed = Feed(Config(), None, Box({'name': 'Test Group'}), 'test feed', 'http://localhost')
+        monitor = LagMonitor(threshold=0.1, interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.05)
+
+        task = set_feed(feed)
+        with self.assertLogs('rssalertbot.feed', 'WARNING') as logs:
+            block(feed, 0.3)
+            await asyncio.sleep(0.05)
+        clear_feed(task)
+        await monitor.stop()
+
+        self.assertIn('Event loop blocked', logs.output[0])
+        self.assertIn('by feed test feed', logs.output[0])
+        self.assertIn('in block', logs.output[0])
+
+        summary = monitor.summary()
+        self.assertEqual(1, summary['blocked'])
+        self.assertGreater(summary['max'], 0.2)
+        self.assertLess(summary['p50'], 0.1)
+
+
+    async def test_blocked_elsewhere(self):
+        monitor = LagMonitor(threshold=0.1, interval=0.01)
+        monitor.start()
+        self.assertFalse(monitor.debug)
+        await asyncio.sleep(0.05)
+
+        # not while a feed is being processed
+        with self.assertLogs('rssalertbot.looplag', 'WARNING') as logs:
+            time.sleep(0.3)
+            await asyncio.sleep(0.05)
+        await monitor.stop()
+
+        self.assertIn('Event loop blocked', logs.output[0])
+        self.assertNotIn('by feed', logs.output[0])
@@ -0,0 +1,76 @@
+
+import aiohttp
+import os
+import shutil
+import tempfile
+import unittest
+
+from rssalertbot.metrics import Registry
+
+
+class MetricsTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.counter = self.registry.counter('test_total', "A counter", ('host', 'status'))
+        self.histogram = self.registry.histogram('test_seconds', "A histogram", buckets=(0.1, 1))
+
+
+    def test_counter(self):
+        self.counter.inc(host='example.com', status='200')
+        self.counter.inc(2, host='example.com', status='200')
+        self.counter.inc(host='a"b', status='500')
+
+        text = self.registry.render()
+        self.assertIn('# TYPE test_total counter\n', text)
+        self.assertIn('test_total{host="example.com",status="200"} 3\n', text)
+        self.assertIn('test_total{host="a\\"b",status="500"} 1\n', text)
+
+        with self.assertRaises(ValueError):
+            self.counter.inc(host='example.com')
+
+
+    def test_histogram(self):
+        for value in (0.05, 0.1, 0.5, 2):
+            self.histogram.observe(value)
+
+        self.assertEqual(
+            '# HELP test_seconds A histogram\n'
+            '# TYPE test_seconds histogram\n'
+            'test_seconds_bucket{le="0.1"} 2\n'
+            'test_seconds_bucket{le="1"} 3\n'
+            'test_seconds_bucket{le="+Inf"} 4\n'
+            'test_seconds_sum 2.65\n'
+            'test_seconds_count 4\n',
+            self.histogram.render())
+
+
+    def test_clear(self):
+        self.counter.inc(host='example.com', status='200')
+        self.registry.clear()
+        self.assertNotIn('example.com', self.registry.render())
+
+
+    def test_write_textfile(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+
+        self.counter.inc(host='example.com', status='200')
+        filename = os.path.join(path, 'rssalertbot.prom')
+        self.registry.write_textfile(filename)
+
+        with open(filename) as f:
+            self.assertEqual(self.registry.render(), f.read())
+        self.assertEqual(['rssalertbot.prom'], os.listdir(path))
+
+
+    async def test_server(self):
+        self.counter.inc(host='example.com', status='200')
+        runner = await self.registry.start_server(port=0)
+        self.addAsyncCleanup(runner.cleanup)
+        port = runner.addresses[0][1]
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+                self.assertEqual(200, response.status)
+                self.assertEqual(self.registry.render(), await response.text())
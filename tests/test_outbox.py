@@ -0,0 +1,209 @@
+
+import asyncio
+import os
+import pendulum
+import shutil
+import tempfile
+import unittest
+from box import Box
+from email.message import EmailMessage
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import rssalertbot.alerts
+from rssalertbot.outbox import Outbox, current_outbox
+
+
+class OutboxTest(unittest.IsolatedAsyncioTestCase):
+
+    slack_cfg = {
+        'token': 'monkeys',
+        'channel': '#foo',
+    }
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.sender = MagicMock()
+        self.sender.send = AsyncMock()
+        for name in ('slack_sender', 'smtp_sender'):
+            patcher = patch(f'rssalertbot.alerts.{name}', return_value=self.sender)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+    def make_outbox(self):
+        outbox = Outbox(self.path, fsync=False)
+        outbox.add_token('monkeys')
+        outbox.open()
+        return outbox
+
+
+    async def test_deliver(self):
+        outbox = self.make_outbox()
+        await outbox.put_slack(self.slack_cfg, '#foo', {'text': 'hello'})
+        await outbox.close()
+
+        self.sender.send.assert_awaited_once_with('#foo', text='hello')
+
+        # and nothing's left
+        outbox = self.make_outbox()
+        self.assertEqual({}, outbox.pending)
+        await outbox.close()
+
+
+    async def test_deliver_email(self):
+        message = EmailMessage()
+        message['Subject'] = 'hello'
+        message.set_content('test')
+
+        outbox = self.make_outbox()
+        await outbox.put_email({'server': 'localhost'}, message)
+        await outbox.close()
+
+        sent = self.sender.send.await_args.args[0]
+        self.assertEqual('hello', sent['Subject'])
+        self.assertEqual('test', sent.get_content().strip())
+
+
+    async def test_pending_survives_restart(self):
+        self.sender.send.side_effect = Exception("nope")
+        outbox = self.make_outbox()
+        await outbox.put_slack(self.slack_cfg, '#foo', {'text': 'hello'})
+        await outbox.close(timeout=0)
+        self.assertEqual(1, len(outbox.pending))
+
+        # now it works
+        self.sender.send.side_effect = None
+        outbox = self.make_outbox()
+        self.assertEqual(1, len(outbox.pending))
+        await outbox.close()
+        self.sender.send.assert_awaited_with('#foo', text='hello')
+        self.assertEqual({}, outbox.pending)
+
+
+    async def test_unindexed_record(self):
+        self.sender.send.side_effect = Exception("nope")
+        outbox = self.make_outbox()
+        await outbox.put_slack(self.slack_cfg, '#foo', {'text': 'hello'})
+        await outbox.close(timeout=0)
+
+        # as if we'd stopped between writing the spool and the index
+        open(os.path.join(self.path, 'outbox.index'), 'w').close()
+
+        outbox = self.make_outbox()
+        self.assertEqual(1, len(outbox.pending))
+        await outbox.close(timeout=0)
+
+
+    async def test_unknown_token(self):
+        outbox = self.make_outbox()
+        await outbox.put_slack({'token': 'bananas'}, '#foo', {'text': 'hello'})
+        await outbox.close(timeout=0)
+
+        # token isn't on disk, and this run doesn't know it
+        with open(os.path.join(self.path, 'outbox.spool')) as f:
+            self.assertNotIn('bananas', f.read())
+
+        outbox = self.make_outbox()
+        await outbox.close()
+        self.sender.send.assert_not_awaited()
+
+
+    async def test_unknown_token_expired(self):
+        outbox = self.make_outbox()
+        outbox.max_age = 0
+        await outbox.put_slack({'token': 'bananas'}, '#foo', {'text': 'hello'})
+        await outbox.close()
+
+        # it's given up on, rather than kept forever
+        outbox = self.make_outbox()
+        self.assertEqual({}, outbox.pending)
+        await outbox.close()
+
+
+    async def test_batched_fsync(self):
+        outbox = Outbox(self.path)
+        outbox.add_token('monkeys')
+        outbox.open()
+        with patch('rssalertbot.outbox.os.fsync') as fsync:
+            await asyncio.gather(*(
+                outbox.put_slack(self.slack_cfg, '#foo', {'text': f'hello {i}'})
+                for i in range(5)))
+
+            # one sync of each file for all of them
+            self.assertEqual(3, fsync.call_count)
+            await outbox.close()
+
+
+    async def test_compact_crash(self):
+        self.sender.send.side_effect = [None, Exception("nope")]
+        outbox = self.make_outbox()
+        await outbox.put_slack(self.slack_cfg, '#foo', {'text': 'hello'})
+        await outbox.put_slack(self.slack_cfg, '#foo', {'text': 'again'})
+        await outbox.close(timeout=0)
+
+        # stopped before the new spool replaced the old one
+        with patch('rssalertbot.outbox.os.replace', side_effect=OSError("crash")):
+            with self.assertRaises(OSError):
+                self.make_outbox()
+
+        self.sender.send.side_effect = None
+        outbox = self.make_outbox()
+        self.assertEqual(1, len(outbox.pending))
+        await outbox.close()
+        self.sender.send.assert_awaited_with('#foo', text='again')
+
+
+    async def test_close_while_sending(self):
+        sent = asyncio.Event()
+
+        async def send(channel, **message):
+            await sent.wait()
+        self.sender.send.side_effect = send
+
+        outbox = self.make_outbox()
+        await outbox.put_slack(self.slack_cfg, '#foo', {'text': 'hello'})
+        await asyncio.sleep(0)
+        await outbox.close(timeout=0)
+
+        # as the senders finish sending it
+        sent.set()
+        await outbox.acked()
+
+        outbox = self.make_outbox()
+        self.assertEqual({}, outbox.pending)
+        await outbox.close()
+        self.sender.send.assert_awaited_once()
+
+
+    async def test_expired(self):
+        self.sender.send.side_effect = Exception("nope")
+        outbox = self.make_outbox()
+        outbox.max_age = 0
+        await outbox.put_slack(self.slack_cfg, '#foo', {'text': 'hello'})
+        await outbox.close(timeout=0.1)
+        self.assertEqual({}, outbox.pending)
+
+
+    async def test_alert_slack(self):
+        outbox = self.make_outbox()
+        current_outbox.set(outbox)
+
+        feed = MagicMock()
+        feed.name = 'test'
+        feed.group = {'name': 'testgroup'}
+        entry = Box({
+            'title':        'test alert',
+            'description':  'this is a test alert',
+            'published':    pendulum.now('UTC'),
+            'datestring':   pendulum.now().to_rfc1123_string(),
+        })
+
+        self.assertTrue(await rssalertbot.alerts.alert_slack(feed, self.slack_cfg, entry))
+        await outbox.close()
+
+        # it went through the outbox
+        with open(os.path.join(self.path, 'outbox.index')) as f:
+            self.assertEqual(1, len(f.readlines()))
+        self.sender.send.assert_awaited()
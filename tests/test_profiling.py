@@ -0,0 +1,63 @@
+
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from rssalertbot import profiling
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+
+    def test_frame_phase(self):
+        with patch.dict(profiling.PHASE_FUNCTIONS, {(__name__, 'test_frame_phase'): 'test'}):
+            self.assertEqual('test', profiling.frame_phase(sys._getframe()))
+        self.assertIsNone(profiling.frame_phase(sys._getframe()))
+
+
+    def test_profile(self):
+        profiler = profiling.Profiler(self.path, interval=0.001)
+        profiler.start()
+        with patch.dict(profiling.PHASE_FUNCTIONS, {(__name__, 'busy'): 'busy'}):
+            with profiler.phase('config'):
+                busy(0.05)
+            busy(0.05)
+        profiler.stop()
+
+        self.assertEqual(
+            ['config.pstats', 'run.pstats', 'stacks.collapsed'],
+            sorted(os.listdir(self.path)))
+
+        # the phase's stats are in there on their own, and in the whole run
+        functions = {func[2] for func in pstats.Stats(os.path.join(self.path, 'config.pstats')).stats}
+        self.assertIn('busy', functions)
+        calls = pstats.Stats(os.path.join(self.path, 'run.pstats')).stats
+        self.assertEqual(2, sum(stat[1] for func, stat in calls.items() if func[2] == 'busy'))
+
+        with open(os.path.join(self.path, 'stacks.collapsed')) as f:
+            lines = f.readlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any(line.startswith('busy;') and f'{__name__}:busy' in line for line in lines))
+
+
+    def test_phase_not_profiling(self):
+        with profiling.phase('config'):
+            pass
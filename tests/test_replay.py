@@ -0,0 +1,147 @@
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from box import Box
+
+from rssalertbot.config import Config
+from rssalertbot.feed   import Feed
+from rssalertbot.replay import (Recorder, Replay, ReplayError, current_archive,
+                                BODIES_FILE, INDEX_FILE)
+
+RSS = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>Status</title>
+<item><title>Investigating café outage</title><description>Trouble!</description>
+<pubDate>Tue, 14 Oct 2025 17:42:10 +0000</pubDate></item>
+</channel></rss>"""
+
+group = Box({
+    "name": "Test Group",
+    "outputs": {"log": {"enabled": True}},
+})
+
+
+class ReplayTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+
+        async def feed(request):
+            return web.Response(text=RSS, content_type='application/rss+xml', headers={'ETag': '"abc"'})
+
+        async def broken(request):
+            return web.Response(status=500, text="Oops")
+
+        async def slow(request):
+            await asyncio.sleep(1)
+            return web.Response(text=RSS)
+
+        app = web.Application()
+        app.router.add_get('/feed.xml', feed)
+        app.router.add_get('/copy.xml', feed)
+        app.router.add_get('/broken.xml', broken)
+        app.router.add_get('/slow.xml', slow)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.base = str(self.server.make_url(''))
+
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        current_archive.set(None)
+        self.tmpdir.cleanup()
+
+
+    def make_feed(self, path):
+        return Feed(Config({}), None, group, path, self.base + path)
+
+
+    async def record(self, *paths, timeout=10):
+        recorder = Recorder(self.path)
+        current_archive.set(recorder)
+        feeds = [self.make_feed(path) for path in paths]
+        for feed in feeds:
+            await feed.fetch_and_parse(timeout)
+        recorder.close()
+        current_archive.set(None)
+        return feeds
+
+
+    async def test_record_replay(self):
+        recorded, = await self.record('/feed.xml')
+        await self.server.close()
+
+        replay = Replay(self.path)
+        current_archive.set(replay)
+        feed = self.make_feed('/feed.xml')
+        entries = await feed.fetch_and_parse()
+        response = await replay.fetch(feed.url)
+        replay.close()
+
+        self.assertEqual('"abc"', response.headers['etag'])
+
+        self.assertEqual(1, len(entries))
+        self.assertEqual("Investigating café outage", entries[0].title)
+        self.assertEqual('200', feed.stats.status)
+        self.assertEqual(recorded.stats.response_bytes, feed.stats.response_bytes)
+
+
+    async def test_failures(self):
+        await self.record('/broken.xml', '/slow.xml', timeout=0.1)
+        await self.server.close()
+
+        current_archive.set(Replay(self.path))
+        broken = self.make_feed('/broken.xml')
+        slow = self.make_feed('/slow.xml')
+        self.assertEqual([], await broken.fetch_and_parse())
+        self.assertEqual([], await slow.fetch_and_parse())
+        self.assertEqual('500', broken.stats.status)
+        self.assertEqual('timeout', slow.stats.status)
+
+
+    async def test_cancelled_not_recorded(self):
+        recorder = Recorder(self.path)
+        current_archive.set(recorder)
+
+        # cancelled by something else, not the fetch timing out
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(self.make_feed('/slow.xml').fetch_and_parse(10), 0.1)
+        self.assertEqual({}, recorder.entries)
+        recorder.close()
+
+
+    async def test_not_recorded(self):
+        await self.record('/feed.xml')
+        replay = Replay(self.path)
+
+        with self.assertRaises(ReplayError):
+            await replay.fetch(self.base + '/other.xml')
+        with self.assertRaises(ReplayError):
+            await replay.fetch(self.base + '/feed.xml', username='someone')
+
+
+    async def test_latency(self):
+        await self.record('/slow.xml')
+        replay = Replay(self.path, latency=True)
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        response = await replay.fetch(self.base + '/slow.xml')
+        self.assertGreaterEqual(loop.time() - start, 1)
+        self.assertEqual(RSS, await response.text())
+
+
+    async def test_bodies_stored_once(self):
+        await self.record('/feed.xml')
+        size = os.path.getsize(os.path.join(self.path, BODIES_FILE))
+        await self.record('/feed.xml', '/copy.xml')
+        self.assertEqual(size, os.path.getsize(os.path.join(self.path, BODIES_FILE)))
+        self.assertTrue(os.path.exists(os.path.join(self.path, INDEX_FILE)))
+
+        replay = Replay(self.path)
+        self.assertEqual(2, len(replay.entries))
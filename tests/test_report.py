@@ -0,0 +1,57 @@
+
+import json
+import os
+import pendulum
+import shutil
+import tempfile
+import unittest
+from box import Box
+
+from rssalertbot.report import FeedStats, build_report, write_report
+
+
+def make_feed(name, seconds=None, result='ok', **stats):
+    feed = Box({'group': {'name': 'Test Group'}, 'name': name, 'url': f'http://{name}'})
+    feed.stats = FeedStats()
+    feed.stats.result = result
+    feed.stats.seconds = seconds
+    for k, v in stats.items():
+        setattr(feed.stats, k, v)
+    return feed
+
+
+class ReportTest(unittest.TestCase):
+
+    def test_build_report(self):
+        feeds = [
+            make_feed('one', 1.0, status='200', entries_new=2, alerts_sent=2),
+            make_feed('two', 3.0, 'timeout', status='timeout'),
+            make_feed('three', 2.0, 'failed', status='500'),
+            make_feed('four', result='skipped'),
+        ]
+        report = build_report(feeds, pendulum.now('UTC'), 5.0, slowest=2)
+
+        totals = report['totals']
+        self.assertEqual(4, totals['feeds'])
+        self.assertEqual(3, totals['fetched'])
+        self.assertEqual(1, totals['ok'])
+        self.assertEqual(1, totals['timeout'])
+        self.assertEqual(1, totals['failed'])
+        self.assertEqual(1, totals['skipped'])
+        self.assertEqual(2, totals['entries_new'])
+        self.assertEqual(2, totals['alerts_sent'])
+
+        self.assertEqual(['two', 'three'], [f['name'] for f in report['slowest']])
+        self.assertEqual(4, len(report['feeds']))
+        self.assertEqual('Test Group', report['feeds'][0]['group'])
+
+
+    def test_write_report(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        filename = os.path.join(path, 'report.json')
+
+        report = build_report([make_feed('one', 1.0)], pendulum.now('UTC'), 1.0)
+        write_report(filename, report)
+        with open(filename) as f:
+            self.assertEqual(report, json.load(f))
@@ -0,0 +1,120 @@
+
+import asyncio
+import feedparser
+import pendulum
+import tempfile
+import unittest
+from box import Box
+from unittest.mock import AsyncMock, patch
+
+from rssalertbot.config       import Config
+from rssalertbot.deadline     import Deadline
+from rssalertbot.dispatch     import Dispatcher
+from rssalertbot.feed         import Feed
+from rssalertbot.main         import _save_progress
+from rssalertbot.scheduler    import Scheduler, run_feeds
+from rssalertbot.storage.file import FileStorage
+
+
+def make_group(name, priority=None):
+    group = Box({"name": name, "outputs": {"log": {"enabled": True}}})
+    if priority is not None:
+        group.priority = priority
+    return group
+
+
+class SchedulerTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.started = []
+        self.running = 0
+        self.peak = 0
+
+        async def process(feed, timeout):
+            self.started.append(feed.name)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            await asyncio.sleep(0.01)
+            self.running -= 1
+
+        patcher = patch.object(Feed, '_process', autospec=True, side_effect=process)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def make_feed(self, name, group, priority=None):
+        return Feed(Config({}), None, group, name, f'http://localhost/{name}', priority=priority)
+
+
+    def test_priority(self):
+        low = make_group('low')
+        high = make_group('high', priority=10)
+
+        self.assertEqual(0, self.make_feed('one', low).priority)
+        self.assertEqual(10, self.make_feed('two', high).priority)
+        self.assertEqual(5, self.make_feed('three', high, priority=5).priority)
+
+
+    async def test_order(self):
+        low = make_group('low')
+        high = make_group('high', priority=10)
+        feeds = [
+            self.make_feed('low1', low),
+            self.make_feed('low2', low),
+            self.make_feed('high1', high),
+            self.make_feed('mid', low, priority=5),
+            self.make_feed('high2', high),
+        ]
+        await run_feeds(feeds, 10, scheduler=Scheduler(concurrency=2))
+
+        self.assertEqual(['high1', 'high2', 'mid', 'low1', 'low2'], self.started)
+        self.assertEqual(2, self.peak)
+        self.assertTrue(all(feed.stats.result == 'ok' for feed in feeds))
+
+
+    async def test_unlimited(self):
+        group = make_group('group')
+        await run_feeds([self.make_feed(f'feed{n}', group) for n in range(5)], 10)
+        self.assertEqual(5, self.peak)
+
+
+class SlotTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.storage = FileStorage(path=self.tmpdir.name)
+
+
+    async def test_slot_freed_before_alerts_sent(self):
+        date = pendulum.now('UTC').subtract(minutes=5)
+        rss = ("<rss version='2.0'><channel><title>Status</title><item><title>Outage</title>"
+               f"<description>Trouble!</description><pubDate>{date.to_rss_string()}</pubDate>"
+               "</item></channel></rss>")
+
+        sent = asyncio.Event()
+
+        async def alert(entry):
+            await sent.wait()
+            return True
+
+        dispatcher = Dispatcher()
+        feeds = []
+        for name in ('one', 'two'):
+            feed = Feed(Config(), self.storage, make_group('group'), name, f'http://localhost/{name}',
+                        dispatcher=dispatcher)
+            feed.fetch_and_parse = AsyncMock(return_value=feedparser.parse(rss).entries)
+            feed.alert = AsyncMock(side_effect=alert)
+            feeds.append(feed)
+
+        # both are fetched with one slot, though neither's alert is sent yet
+        await asyncio.wait_for(run_feeds(feeds, 10, scheduler=Scheduler(concurrency=1)), 5)
+        for feed in feeds:
+            feed.fetch_and_parse.assert_awaited()
+            self.assertIsNone(self.storage.last_update(feed.feed))
+
+        sent.set()
+        await dispatcher.close()
+        await _save_progress(feeds, Deadline())
+        for feed in feeds:
+            self.assertEqual(date.int_timestamp, self.storage.last_update(feed.feed).int_timestamp)
@@ -0,0 +1,154 @@
+
+import aiosmtplib
+import asyncio
+import unittest
+from email.message import EmailMessage
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from slack.errors import SlackApiError
+
+import rssalertbot.senders
+from rssalertbot.senders       import get_sender
+from rssalertbot.senders.slack import SlackSender
+from rssalertbot.senders.smtp  import SMTPSender
+
+
+def rate_limited(retry_after):
+    response = MagicMock()
+    response.status_code = 429
+    response.headers = {'Retry-After': str(retry_after)}
+    return SlackApiError('ratelimited', response)
+
+
+class SlackSenderTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncTearDown(self):
+        await rssalertbot.senders.close_all()
+
+
+    def make_sender(self, **kwargs):
+        sender = get_sender(SlackSender, 'monkeys', token='monkeys', **kwargs)
+        sender.client = MagicMock()
+        sender.client.chat_postMessage = AsyncMock()
+        return sender
+
+
+    async def test_shared_per_token(self):
+        sender = get_sender(SlackSender, 'monkeys', token='monkeys')
+        self.assertIs(sender, get_sender(SlackSender, 'monkeys', token='monkeys'))
+        self.assertIsNot(sender, get_sender(SlackSender, 'bananas', token='bananas'))
+
+
+    async def test_base_url(self):
+        sender = SlackSender('monkeys', base_url='http://127.0.0.1:8080/api/')
+        try:
+            self.assertEqual('http://127.0.0.1:8080/api/', sender.client.base_url)
+        finally:
+            await sender.close()
+
+
+    async def test_send(self):
+        sender = self.make_sender()
+        await sender.send('#foo', text='hello')
+        sender.client.chat_postMessage.assert_awaited_with(channel='#foo', text='hello')
+
+
+    async def test_channels_concurrent(self):
+        sender = self.make_sender(interval=0.2)
+        done = []
+
+        async def send(channel, text):
+            await sender.send(channel, text=text)
+            done.append(text)
+
+        # the second message to #foo has to wait, #bar doesn't
+        await asyncio.gather(send('#foo', 'one'), send('#foo', 'two'), send('#bar', 'three'))
+        self.assertEqual(['one', 'three', 'two'], done)
+
+
+    async def test_retry_after(self):
+        sender = self.make_sender(interval=0)
+        sender.client.chat_postMessage.side_effect = [rate_limited(0.01), {'ok': True}]
+
+        result = await sender.send('#foo', text='hello')
+
+        self.assertEqual({'ok': True}, result)
+        self.assertEqual(2, sender.client.chat_postMessage.await_count)
+
+
+    async def test_retries_exhausted(self):
+        sender = self.make_sender(interval=0, retries=1)
+        sender.client.chat_postMessage.side_effect = rate_limited(0)
+
+        with self.assertRaises(SlackApiError):
+            await sender.send('#foo', text='hello')
+        self.assertEqual(2, sender.client.chat_postMessage.await_count)
+
+
+class MockSMTP:
+    """Just enough of :py:class:`aiosmtplib.SMTP`"""
+
+    connects = 0
+
+    def __init__(self, *args, **kwargs):
+        self.is_connected = False
+        self.send_message = AsyncMock()
+
+    async def connect(self):
+        MockSMTP.connects += 1
+        self.is_connected = True
+
+    async def quit(self):
+        self.is_connected = False
+
+    def close(self):
+        self.is_connected = False
+
+
+class SMTPSenderTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        MockSMTP.connects = 0
+        patcher = patch('aiosmtplib.SMTP', new=MockSMTP)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    async def asyncTearDown(self):
+        await rssalertbot.senders.close_all()
+
+
+    async def test_connection_reused(self):
+        sender = get_sender(SMTPSender, 'localhost', server='localhost')
+        await asyncio.gather(*(sender.send(EmailMessage()) for _ in range(5)))
+        self.assertEqual(1, MockSMTP.connects)
+
+
+    async def test_retry_disconnected(self):
+        sender = get_sender(SMTPSender, 'localhost', server='localhost')
+        send_message = AsyncMock(side_effect=[aiosmtplib.SMTPServerDisconnected('bye'), None])
+
+        with patch('asyncio.sleep', new=AsyncMock()), \
+                patch.object(sender, '_connection', side_effect=lambda: self.smtp(send_message)):
+            await sender.send(EmailMessage())
+
+        # and we reconnected to retry
+        self.assertEqual(2, send_message.await_count)
+        self.assertEqual(2, MockSMTP.connects)
+
+
+    async def test_permanent_error(self):
+        sender = get_sender(SMTPSender, 'localhost', server='localhost')
+        send_message = AsyncMock(side_effect=aiosmtplib.SMTPResponseException(550, 'no such user'))
+
+        with patch.object(sender, '_connection', side_effect=lambda: self.smtp(send_message)):
+            with self.assertRaises(aiosmtplib.SMTPResponseException):
+                await sender.send(EmailMessage())
+
+        self.assertEqual(1, send_message.await_count)
+
+
+    def smtp(self, send_message):
+        smtp = MockSMTP()
+        smtp.send_message = send_message
+        return smtp
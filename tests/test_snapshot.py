@@ -0,0 +1,80 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from rssalertbot import snapshot
+from rssalertbot.config import Config, FrozenConfig
+from rssalertbot.main import load_config
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.cfgdir = os.path.join(self.path, 'conf.d')
+        os.mkdir(self.cfgdir)
+        self.write('10-outputs.yaml', 'outputs:\n    log:\n        enabled: true\n')
+        self.write('20-feeds.yaml', (
+            'feedgroups:\n'
+            '  - name: test\n'
+            '    feeds:\n'
+            '      - name: feed\n'
+            '        url: http://localhost:8930\n'
+        ))
+        self.cache = os.path.join(self.path, 'config.pickle')
+
+
+    def write(self, name, data):
+        with open(os.path.join(self.cfgdir, name), 'w') as f:
+            f.write(data)
+
+
+    def test_fingerprint(self):
+        fp = snapshot.fingerprint([self.cfgdir])
+        self.assertEqual(fp, snapshot.fingerprint([self.cfgdir]))
+        self.assertNotEqual(fp, snapshot.fingerprint([self.cfgdir], {'timeout': 5}))
+
+        # a changed file
+        self.write('10-outputs.yaml', 'outputs:\n    log:\n        enabled: false\n')
+        self.assertNotEqual(fp, snapshot.fingerprint([self.cfgdir]))
+
+        # a new file
+        fp = snapshot.fingerprint([self.cfgdir])
+        self.write('30-more.yaml', 'timeout: 5\n')
+        self.assertNotEqual(fp, snapshot.fingerprint([self.cfgdir]))
+
+
+    def test_load_config(self):
+        cfg, groups = load_config([self.cfgdir], {'timeout': 5}, self.cache)
+        self.assertIsInstance(cfg, FrozenConfig)
+        self.assertEqual(5, cfg.get('timeout'))
+        self.assertEqual(1, len(groups))
+        group, outputs = groups[0]
+        self.assertEqual('test', group.name)
+        self.assertTrue(outputs.get('log.enabled'))
+
+        # the second time it comes from the snapshot
+        with patch.object(Config, 'from_files') as from_files:
+            cached_cfg, cached_groups = load_config([self.cfgdir], {'timeout': 5}, self.cache)
+            from_files.assert_not_called()
+        self.assertEqual(cfg, cached_cfg)
+        self.assertEqual(groups, cached_groups)
+        self.assertIs(cached_groups[0][0], cached_cfg['feedgroups'][0])
+
+        # until the config changes
+        self.write('30-more.yaml', 'timeout: 10\n')
+        cfg, groups = load_config([self.cfgdir], None, self.cache)
+        self.assertEqual(10, cfg.get('timeout'))
+
+
+    def test_corrupt_snapshot(self):
+        with open(self.cache, 'wb') as f:
+            f.write(b'monkeys')
+
+        cfg, groups = load_config([self.cfgdir], None, self.cache)
+        self.assertEqual(1, len(groups))
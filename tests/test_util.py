@@ -1,6 +1,7 @@
 
 import unittest
 from parameterized import parameterized
+from unittest.mock import MagicMock
 
 import rssalertbot
 import rssalertbot.util as util
@@ -23,6 +24,35 @@ class UtilTest(unittest.TestCase):
         self.assertIn('Hello world!', stripped)
 
 
+    def test_html_to_mrkdwn(self):
+        mrkdwn = util.html_to_mrkdwn("<p><b>Hello</b> world!</p>")
+        self.assertEqual(mrkdwn.strip(), "*Hello* world!")
+
+
+    def test_lru_cache(self):
+        cache = util.LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+
+        # 'b' is the least recently used now
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+
+    def test_cached_conversion(self):
+        convert = MagicMock(side_effect=str.upper)
+        cached = util.cached_conversion(convert)
+
+        self.assertEqual(cached('hello'), 'HELLO')
+        self.assertEqual(cached('hello'), 'HELLO')
+        self.assertEqual(cached('world'), 'WORLD')
+        self.assertEqual(convert.call_count, 2)
+
+
     @parameterized.expand(rssalertbot.KEYS_GREEN)
     def test_guess_level_good(self, text):
         result = util.guess_level(text)
@@ -37,3 +67,11 @@ class UtilTest(unittest.TestCase):
     def test_guess_level_alert(self, text):
         result = util.guess_level(text)
         self.assertEqual(result, 'alert')
+
+    def test_deepmerge_into(self):
+        a = {'foo': {'bar': 1, 'baz': {'x': 1}}, 'keep': True}
+        b = {'foo': {'bar': 2, 'baz': 'replaced'}, 'new': [1]}
+        expected = util.deepmerge(a, b)
+
+        self.assertIs(a, util.deepmerge_into(a, b))
+        self.assertEqual(expected, a)